@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Write the similar-movies feature vectors to the pgvector movie_vectors table.
+Requests never write the table; run this after importing or editing movies,
+or periodically from cron:
+
+    30 * * * * cd /path/to/backend && python build_movie_vectors.py
+
+Every vector is recomputed from the whole catalog and written in one
+transaction (rows whose vector did not change are skipped). Needs PostgreSQL with the
+vector extension installed; without it lookups use the in-memory index and
+there is nothing to do.
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app
+from models import db
+from extensions import similar_movies
+
+def build_movie_vectors():
+    """Create movie_vectors if needed and store every movie's vector"""
+
+    with app.app_context():
+        if not similar_movies.ensure_index(db):
+            print("⚠️  pgvector is not available, nothing to store")
+            return
+
+        written = similar_movies.store_vectors()
+        print(f"✅ Stored {written} changed movie vectors")
+
+if __name__ == '__main__':
+    build_movie_vectors()
@@ -0,0 +1,78 @@
+"""Pytest fixtures: the app against a scratch SQLite database.
+
+``DATABASE_URL`` is set before ``app`` is imported, so ``db.create_all()``
+at import time creates the tables there instead of in PostgreSQL. Every test
+empties the tables, so point ``TEST_DATABASE_URL`` only at a scratch
+database.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+_DATABASE_DIR = tempfile.mkdtemp(prefix="movie_rating_tests_")
+os.environ["DATABASE_URL"] = os.environ.get(
+    "TEST_DATABASE_URL", f"sqlite:///{os.path.join(_DATABASE_DIR, 'test.db')}"
+)
+
+from passlib.hash import bcrypt
+
+from app import app as flask_app
+from extensions import like_counter, membership, rate_limiter, recommender, user_cache
+from models import Movie, User, db
+from services import movie_events
+
+
+@pytest.fixture
+def app():
+    """The app with empty tables and every in-process cache reset"""
+    rate_limiter.enabled = False
+    recommender.state_path = None
+    # Tests flush like counts themselves
+    like_counter.flush_interval = 3600
+    with flask_app.app_context():
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
+    movie_events.publish()
+    user_cache.invalidate()
+    membership.invalidate()
+    recommender.invalidate()
+    recommender._pending.clear()
+    like_counter._pending.clear()
+    yield flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def add_movies(app):
+    """Insert movies from keyword dicts; return their ids"""
+    def add(*rows):
+        with app.app_context():
+            movies = [Movie(**{"title": f"Movie {index}", **row}) for index, row in enumerate(rows)]
+            db.session.add_all(movies)
+            db.session.commit()
+            return [movie.id for movie in movies]
+    return add
+
+
+@pytest.fixture
+def login(app, client):
+    """Create a user and return Authorization headers for it"""
+    def create(username):
+        with app.app_context():
+            # Cheap rounds; the hasher upgrades the hash on login
+            db.session.add(User(username=username, email=f"{username}@example.com",
+                                password_hash=bcrypt.using(rounds=4).hash("secret")))
+            db.session.commit()
+        response = client.post("/auth/login", json={"email": f"{username}@example.com", "password": "secret"})
+        return {"Authorization": f"Bearer {response.get_json()['token']}"}
+    return create
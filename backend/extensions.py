@@ -1,3 +1,32 @@
+
 # Import the db instance from models to ensure we use the same instance
 from models import db
 
+from services.catalog import CatalogEngine
+from services.facets import FacetStore
+from services.leaderboards import Leaderboards
+from services.likes import LikeCounter
+from services.membership import WatchlistMembership
+from services.passwords import PasswordHasher
+from services.rate_limit import RateLimiter
+from services.recommender import Recommender
+from services.response_cache import ResponseCache
+from services.serialization import FragmentCache
+from services.search import TitleSearch
+from services.similar import SimilarMovies
+from services.users import UserCache
+
+# In-process caches; bound to the app in app.py via init_app()
+catalog = CatalogEngine()
+title_search = TitleSearch()
+facets = FacetStore()
+response_cache = ResponseCache()
+fragments = FragmentCache()
+membership = WatchlistMembership()
+recommender = Recommender()
+similar_movies = SimilarMovies()
+like_counter = LikeCounter()
+leaderboards = Leaderboards()
+password_hasher = PasswordHasher()
+user_cache = UserCache()
+rate_limiter = RateLimiter()
@@ -4,6 +4,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from flask import Flask
 from models import db, User
+from services.passwords import PasswordHasher
 import os
 
 def init_db():
@@ -19,6 +20,7 @@ def init_db():
     
     # Initialize database
     db.init_app(app)
+    password_hasher = PasswordHasher(app)
     
     with app.app_context():
         # Create all tables
@@ -31,7 +33,7 @@ def init_db():
                 username='admin',
                 email='admin@example.com'
             )
-            admin.set_password('admin123')
+            admin.password_hash = password_hasher.hash('admin123')
             db.session.add(admin)
             db.session.commit()
             print("Created default admin user:")
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Add likes to an existing database: the likes table, the movies like_count
+column and its sort index. Run once after upgrading, and again whenever the
+counters need to be recomputed from the likes table (e.g. after a server was
+killed with unflushed like deltas).
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import inspect, text
+
+from app import app
+from models import db, Movie
+from services import likes
+
+def migrate_likes():
+    """Add like_count, create likes and recompute the counters"""
+
+    with app.app_context():
+        columns = {column["name"] for column in inspect(db.engine).get_columns("movies")}
+        if "like_count" not in columns:
+            print("Adding column: like_count")
+            with db.engine.begin() as connection:
+                connection.execute(text("ALTER TABLE movies ADD COLUMN like_count INTEGER NOT NULL DEFAULT 0"))
+        else:
+            print("Column like_count already exists")
+
+        db.create_all()
+        for index in Movie.__table__.indexes:
+            if index.name == "ix_movies_like_count_id":
+                index.create(db.engine, checkfirst=True)
+
+        updated = likes.reconcile_like_counts()
+        db.session.commit()
+
+        print(f"✅ Corrected like counts for {updated} movies")
+
+if __name__ == '__main__':
+    migrate_likes()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Backfill the normalized movie_genres table from the free-form movies.genre
+column. New and updated movies keep movie_genres in sync automatically; run
+this once after upgrading, and again after loading movies outside the ORM
+(e.g. the pgvector notebook's DataFrame.to_sql).
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app
+from models import db, Movie, MovieGenre, parse_genres
+
+def migrate_movie_genres():
+    """Rebuild movie_genres rows for every movie"""
+
+    with app.app_context():
+        db.create_all()
+
+        movies = Movie.query.all()
+        changed = 0
+        for movie in movies:
+            current = sorted(link.genre for link in movie.genre_links)
+            if current != sorted(parse_genres(movie.genre)):
+                # Re-assigning the column re-runs the genre parser
+                movie.genre = movie.genre
+                changed += 1
+
+        db.session.commit()
+
+        print(f"✅ Synced genres for {changed} of {len(movies)} movies")
+
+        genres = db.session.query(MovieGenre.genre).distinct().order_by(MovieGenre.genre).all()
+        print(f"📊 Distinct genres: {', '.join(genre for (genre,) in genres)}")
+
+if __name__ == '__main__':
+    migrate_movie_genres()
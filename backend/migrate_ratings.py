@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Add user ratings to an existing database: the ratings table, the movies
+rating aggregate columns and the community score index. Run once after
+upgrading, and again whenever the aggregates need to be recomputed from the
+ratings table (e.g. after deleting users).
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import inspect, text
+
+from app import app
+from models import db, Movie, RATING_PRIOR_MEAN
+from services import ratings
+
+def migrate_ratings():
+    """Add the aggregate columns, create ratings and recompute aggregates"""
+
+    with app.app_context():
+        new_columns = {
+            'rating_count': 'INTEGER NOT NULL DEFAULT 0',
+            'rating_sum': 'FLOAT NOT NULL DEFAULT 0',
+            'rating_mean': 'FLOAT',
+            'community_score': f'FLOAT NOT NULL DEFAULT {RATING_PRIOR_MEAN}',
+        }
+        columns = {column["name"] for column in inspect(db.engine).get_columns("movies")}
+        with db.engine.begin() as connection:
+            for col_name, col_type in new_columns.items():
+                if col_name not in columns:
+                    print(f"Adding column: {col_name}")
+                    connection.execute(text(f"ALTER TABLE movies ADD COLUMN {col_name} {col_type}"))
+                else:
+                    print(f"Column {col_name} already exists")
+
+        db.create_all()
+        for index in Movie.__table__.indexes:
+            if index.name == "ix_movies_community_score_id":
+                index.create(db.engine, checkfirst=True)
+
+        updated = ratings.reconcile_rating_aggregates()
+        db.session.commit()
+
+        print(f"✅ Recomputed rating aggregates for {updated} movies")
+
+if __name__ == '__main__':
+    migrate_ratings()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Add users.watchlist_version and the watchlist_changes log used by
+GET /watchlist/changes to an existing database. Run once after upgrading;
+new databases get both from db.create_all().
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import inspect, text
+
+from app import app
+from models import db
+
+def migrate_watchlist_changes():
+    """Add the watchlist version column and create the change log table"""
+
+    with app.app_context():
+        columns = {column["name"] for column in inspect(db.engine).get_columns("users")}
+        if "watchlist_version" not in columns:
+            print("Adding column: users.watchlist_version")
+            with db.engine.begin() as connection:
+                connection.execute(text(
+                    "ALTER TABLE users ADD COLUMN watchlist_version INTEGER NOT NULL DEFAULT 0"
+                ))
+        else:
+            print("Column users.watchlist_version already exists")
+
+        db.create_all()
+
+        print("✅ Watchlist change log ready")
+
+if __name__ == '__main__':
+    migrate_watchlist_changes()
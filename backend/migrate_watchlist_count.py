@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Add movies.watchlist_count and its (watchlist_count, id) index to an existing
+database and fill it from the watchlist table. Run once after upgrading;
+new databases get both from db.create_all().
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import inspect, text
+
+from app import app
+from models import db, Movie
+from services import watchlist_ops
+
+def migrate_watchlist_count():
+    """Add the watchlist_count column and index, then backfill the counts"""
+
+    with app.app_context():
+        columns = {column["name"] for column in inspect(db.engine).get_columns("movies")}
+        if "watchlist_count" not in columns:
+            print("Adding column: movies.watchlist_count")
+            with db.engine.begin() as connection:
+                connection.execute(text(
+                    "ALTER TABLE movies ADD COLUMN watchlist_count INTEGER NOT NULL DEFAULT 0"
+                ))
+        else:
+            print("Column movies.watchlist_count already exists")
+
+        for index in Movie.__table__.indexes:
+            if index.name == "ix_movies_watchlist_count_id":
+                index.create(db.engine, checkfirst=True)
+
+        changed = watchlist_ops.reconcile_watchlist_counts()
+        db.session.commit()
+
+        print(f"✅ watchlist_count ready ({changed} movies backfilled)")
+
+if __name__ == '__main__':
+    migrate_watchlist_count()
@@ -1,10 +1,31 @@
+import re
 from datetime import datetime
-from passlib.hash import bcrypt
 from sqlalchemy import func
+from sqlalchemy.orm import validates
 from flask_sqlalchemy import SQLAlchemy
 
 db = SQLAlchemy()
 
+_GENRE_SEPARATORS = re.compile(r"[/,|]")
+
+# Bayesian prior for community scores: every movie starts with
+# RATING_PRIOR_WEIGHT votes of RATING_PRIOR_MEAN
+RATING_PRIOR_MEAN = 6.0
+RATING_PRIOR_WEIGHT = 5
+
+
+def parse_genres(value):
+    """Split a free-form genre string ("Action/Drama", "Sci-fi, Action") into
+    normalized genre names, e.g. ["Sci-Fi", "Action"]"""
+    genres = []
+    for token in _GENRE_SEPARATORS.split(value or ""):
+        # Capitalize words and hyphenated parts only; str.title() would also
+        # capitalize after apostrophes ("Children'S")
+        genre = " ".join("-".join(part.capitalize() for part in word.split("-")) for word in token.split())
+        if genre and genre not in genres:
+            genres.append(genre)
+    return genres
+
 class User(db.Model):
     __tablename__ = "users"
     id = db.Column(db.Integer, primary_key=True)
@@ -13,15 +34,11 @@ class User(db.Model):
     password_hash = db.Column(db.String(255), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_login = db.Column(db.DateTime)
+    # Bumped once per watchlist add/remove; see WatchlistChange
+    watchlist_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
 
     watchlist_items = db.relationship("Watchlist", back_populates="user", cascade="all, delete-orphan")
 
-    def set_password(self, password: str) -> None:
-        self.password_hash = bcrypt.hash(password)
-
-    def check_password(self, password: str) -> bool:
-        return bcrypt.verify(password, self.password_hash)
-
     def update_last_login(self):
         self.last_login = datetime.utcnow()
         db.session.commit()
@@ -51,14 +68,43 @@ class Movie(db.Model):
     
     # Additional fields
     language = db.Column(db.String(80), index=True)
-    synopsis = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, server_default=func.now())
+    # Number of users with the movie on their watchlist, kept by services.watchlist_ops
+    watchlist_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    # Number of likes, flushed in batches by services.likes
+    like_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    # User rating aggregates, kept by services.ratings
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    rating_sum = db.Column(db.Float, nullable=False, default=0.0, server_default="0")
+    rating_mean = db.Column(db.Float)
+    # (prior weight * prior mean + rating_sum) / (prior weight + rating_count)
+    community_score = db.Column(db.Float, nullable=False, default=RATING_PRIOR_MEAN,
+                                server_default=str(RATING_PRIOR_MEAN))
+    # Heavy / rarely returned columns are only loaded when accessed
+    synopsis = db.deferred(db.Column(db.Text))
+    created_at = db.deferred(db.Column(db.DateTime, server_default=func.now()))
     
     # Legacy field for backward compatibility
     poster_url = db.Column(db.String(500))
     
+    __table_args__ = (
+        # Serves the popular_desc keyset sort
+        db.Index("ix_movies_watchlist_count_id", "watchlist_count", "id"),
+        # Serves the community_rating_desc keyset sort
+        db.Index("ix_movies_community_score_id", "community_score", "id"),
+        # Serves the likes_desc keyset sort
+        db.Index("ix_movies_like_count_id", "like_count", "id"),
+    )
+    
     # Relationships
     watchlisted_by = db.relationship("Watchlist", back_populates="movie", cascade="all, delete-orphan")
+    genre_links = db.relationship("MovieGenre", back_populates="movie", cascade="all, delete-orphan")
+    
+    @validates("genre")
+    def _sync_genre_links(self, key, value):
+        """Keep the normalized movie_genres rows in step with the genre string"""
+        existing = {link.genre: link for link in self.genre_links}
+        self.genre_links = [existing.get(genre) or MovieGenre(genre=genre) for genre in parse_genres(value)]
+        return value
     
     # Helper properties
     @property
@@ -84,6 +130,41 @@ class Movie(db.Model):
             data['synopsis'] = self.synopsis
         return data
 
+    # to_dict() key -> columns it is computed from, for fields= projections
+    FIELD_COLUMNS = {
+        'id': ('id',),
+        'title': ('title',),
+        'release_year': ('release_year',),
+        'genre': ('genre',),
+        'budget_crores': ('budget_crores',),
+        'gross_crores': ('gross_crores',),
+        'imdb_rating': ('imdb_rating',),
+        'film_image_url': ('film_image_url',),
+        'poster_url': ('film_image_url', 'poster_url'),
+        'language': ('language',),
+        'synopsis': ('synopsis',),
+    }
+
+    @classmethod
+    def projection_columns(cls, fields, extra=()):
+        """Columns needed to build ``fields`` (plus ``extra`` column names)"""
+        names = ['id']
+        for field in fields:
+            names.extend(cls.FIELD_COLUMNS[field])
+        names.extend(extra)
+        return [getattr(cls, name) for name in dict.fromkeys(names)]
+
+    @staticmethod
+    def project(row, fields):
+        """Build the ``fields`` subset of to_dict() from a projection_columns() row"""
+        data = {}
+        for field in fields:
+            if field == 'poster_url':
+                data[field] = row.film_image_url or row.poster_url
+            else:
+                data[field] = getattr(row, field)
+        return data
+
     watchlisted_by = db.relationship("Watchlist", back_populates="movie", cascade="all, delete-orphan")
 
 
@@ -100,6 +181,90 @@ class Watchlist(db.Model):
 
     __table_args__ = (
         db.UniqueConstraint("user_id", "movie_id", name="uq_user_movie"),
+        # Serves the watchlist page seek ordered by created_at
+        db.Index("ix_watchlist_user_created", "user_id", "created_at", "id"),
+    )
+
+
+class WatchlistChange(db.Model):
+    """Append-only log of watchlist adds/removes, one row per user version"""
+    __tablename__ = "watchlist_changes"
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+    movie_id = db.Column(db.Integer, nullable=False)
+    action = db.Column(db.String(10), nullable=False)  # "add" or "remove"
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "version", name="uq_watchlist_change_version"),
+    )
+
+
+class Rating(db.Model):
+    """A user's score for a movie, from 1 to 10"""
+    __tablename__ = "ratings"
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    movie_id = db.Column(db.Integer, db.ForeignKey("movies.id", ondelete="CASCADE"), nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "movie_id", name="uq_user_movie_rating"),
+        # Serves a user's ratings newest first
+        db.Index("ix_ratings_user_updated", "user_id", "updated_at"),
     )
 
+    def to_dict(self):
+        return {
+            'movie_id': self.movie_id,
+            'score': self.score,
+            'rated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+
+class Like(db.Model):
+    """A user's like of a movie; counted into Movie.like_count by services.likes"""
+    __tablename__ = "likes"
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    movie_id = db.Column(db.Integer, db.ForeignKey("movies.id", ondelete="CASCADE"), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "movie_id", name="uq_user_movie_like"),
+        # Serves a user's likes newest first
+        db.Index("ix_likes_user_created", "user_id", "created_at"),
+    )
+
+
+class UserRecommendation(db.Model):
+    """Precomputed top-N recommendations, written by precompute_recommendations.py"""
+    __tablename__ = "user_recommendations"
+
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    movie_id = db.Column(db.Integer, db.ForeignKey("movies.id", ondelete="CASCADE"), nullable=False)
+    score = db.Column(db.Float)
+    # User.watchlist_version the row was computed from; stale once it differs
+    watchlist_version = db.Column(db.Integer, nullable=False)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class MovieGenre(db.Model):
+    """One row per (movie, genre) parsed from ``Movie.genre``"""
+    __tablename__ = "movie_genres"
+
+    movie_id = db.Column(db.Integer, db.ForeignKey("movies.id", ondelete="CASCADE"), primary_key=True)
+    genre = db.Column(db.String(60), primary_key=True)
+
+    movie = db.relationship("Movie", back_populates="genre_links")
+
+    __table_args__ = (
+        db.Index("ix_movie_genres_genre_movie", "genre", "movie_id"),
+    )
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Precompute recommendations for every user with a watchlist into the
+user_recommendations table, so GET /user/recommendations is a single indexed
+lookup for users who haven't changed their watchlist since.
+
+Users are split into shards of consecutive user_id ranges, so each shard's
+reads and deletes are primary key range scans, and the shards are spread
+over a process pool. Each worker scores its users with sparse matrix
+products against one exact item-item model built up front, then replaces
+their rows with one bulk insert. Completed shards are recorded in a
+checkpoint file, so an interrupted run picks up where it stopped:
+
+    python precompute_recommendations.py --workers 8 --shards 64
+    python precompute_recommendations.py --fresh   # ignore the checkpoint
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from multiprocessing import Pool
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import delete, func, insert
+
+from app import app
+from models import db, User, UserRecommendation, Watchlist
+from extensions import recommender
+
+# Set in each worker by _init_worker()
+_model = None
+_context = None
+
+def _init_worker(model):
+    """Give the worker the shared model and its own database connections"""
+    global _model, _context
+    _model = model
+    _context = app.app_context()
+    _context.push()
+    # Connections inherited from the parent process must not be reused
+    db.engine.dispose(close=False)
+
+def _shard_range(shard, shards, max_user_id):
+    """``(lo, hi)`` user ids of a shard; the last one has no upper bound"""
+    width = max_user_id // shards + 1
+    lo = shard * width
+    hi = None if shard == shards - 1 else lo + width - 1
+    return lo, hi
+
+def _in_range(column, lo, hi):
+    return column >= lo if hi is None else column.between(lo, hi)
+
+def _compute_shard(task):
+    """Recompute and store recommendations for the users of one shard"""
+    shard, lo, hi, limit = task
+    started = time.perf_counter()
+
+    versions = dict(
+        db.session.query(User.id, User.watchlist_version).filter(_in_range(User.id, lo, hi))
+    )
+    watchlists = {user_id: set() for user_id in versions}
+    rows = db.session.query(Watchlist.user_id, Watchlist.movie_id).filter(_in_range(Watchlist.user_id, lo, hi))
+    for user_id, movie_id in rows:
+        watchlists.setdefault(user_id, set()).add(movie_id)
+    user_ids = [user_id for user_id, saved in watchlists.items() if saved]
+
+    results = _model.recommend_many([watchlists[user_id] for user_id in user_ids], limit)
+    now = datetime.utcnow()
+    records = [
+        {
+            "user_id": user_id,
+            "rank": rank,
+            "movie_id": movie_id,
+            "score": score,
+            "watchlist_version": versions.get(user_id, 0),
+            "computed_at": now,
+        }
+        for user_id, recommendations in zip(user_ids, results)
+        for rank, (movie_id, score) in enumerate(recommendations)
+    ]
+
+    table = UserRecommendation.__table__
+    db.session.execute(delete(table).where(_in_range(table.c.user_id, lo, hi)))
+    if records:
+        db.session.execute(insert(table), records)
+    db.session.commit()
+    return shard, len(user_ids), len(records), time.perf_counter() - started
+
+def _load_checkpoint(path, shards, fresh):
+    """The run's checkpoint; ``max_user_id`` is None until the ranges are fixed"""
+    if not fresh and os.path.exists(path):
+        with open(path) as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("shards") == shards and checkpoint.get("max_user_id") is not None:
+            return checkpoint
+        print(f"⚠️ Checkpoint was written for {checkpoint.get('shards')} shards; starting over")
+    return {"shards": shards, "max_user_id": None, "completed": []}
+
+def _save_checkpoint(path, checkpoint):
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(temporary, path)
+
+def precompute_recommendations(workers, shards, limit, checkpoint_path, fresh=False):
+    """Fill user_recommendations shard by shard, resuming from the checkpoint"""
+
+    checkpoint = _load_checkpoint(checkpoint_path, shards, fresh)
+    remaining = [shard for shard in range(shards) if shard not in checkpoint["completed"]]
+    if not remaining:
+        print("✅ All shards already completed; use --fresh to recompute")
+        os.remove(checkpoint_path)
+        return
+
+    with app.app_context():
+        db.create_all()
+        model = recommender.exact_model()
+        if model is None:
+            print("❌ NumPy and SciPy are required to precompute recommendations")
+            return
+        if checkpoint["max_user_id"] is None:
+            # Shard ranges stay fixed for the run, including a resumed one
+            checkpoint["max_user_id"] = db.session.query(func.max(User.id)).scalar() or 0
+        # Don't hand open connections to forked workers
+        db.session.remove()
+        db.engine.dispose()
+
+    print(f"🚀 {len(remaining)} of {shards} shards to compute with {workers} workers "
+          f"({len(model.movie_ids)} movies in the model)")
+
+    started = time.perf_counter()
+    total_users = 0
+    total_rows = 0
+    tasks = [(shard, *_shard_range(shard, shards, checkpoint["max_user_id"]), limit) for shard in remaining]
+    with Pool(workers, initializer=_init_worker, initargs=(model,)) as pool:
+        for shard, users, rows, seconds in pool.imap_unordered(_compute_shard, tasks):
+            checkpoint["completed"].append(shard)
+            _save_checkpoint(checkpoint_path, checkpoint)
+            total_users += users
+            total_rows += rows
+            elapsed = time.perf_counter() - started
+            print(f"  shard {shard}: {users} users, {rows} rows in {seconds:.2f}s "
+                  f"({len(checkpoint['completed'])}/{shards} done, {total_users / elapsed:.0f} users/sec)")
+
+    elapsed = time.perf_counter() - started
+    os.remove(checkpoint_path)
+    print(f"✅ Precomputed {total_rows} recommendations for {total_users} users in {elapsed:.1f}s "
+          f"({total_users / elapsed:.0f} users/sec)")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--shards", type=int, default=64, help="user shards (user_id ranges)")
+    parser.add_argument("--limit", type=int, default=100, help="recommendations stored per user")
+    parser.add_argument("--checkpoint", default=os.path.join(app.instance_path, "precompute_recommendations.json"),
+                        help="file recording completed shards")
+    parser.add_argument("--fresh", action="store_true", help="ignore an existing checkpoint")
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(args.checkpoint) or ".", exist_ok=True)
+    precompute_recommendations(args.workers, args.shards, args.limit, args.checkpoint, args.fresh)
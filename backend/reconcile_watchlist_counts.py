@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Recompute movies.watchlist_count from the watchlist table. Adding and
+removing movies keeps the counters current; this corrects drift from writes
+that bypass the watchlist routes (deleted users, manual SQL). Schedule it
+periodically, e.g. hourly from cron:
+
+    0 * * * * cd /path/to/backend && python reconcile_watchlist_counts.py
+
+Databases that predate the column need migrate_watchlist_count.py first.
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app
+from models import db
+from services import watchlist_ops
+
+def reconcile_watchlist_counts():
+    """Correct every movie whose counter disagrees with the watchlist table"""
+
+    with app.app_context():
+        changed = watchlist_ops.reconcile_watchlist_counts()
+        db.session.commit()
+
+        print(f"✅ Corrected watchlist_count for {changed} movies")
+
+if __name__ == '__main__':
+    reconcile_watchlist_counts()
@@ -1,12 +1,14 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, get_jwt_identity, jwt_required
+from flask_jwt_extended import create_access_token, jwt_required
 
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from extensions import db
+from extensions import db, password_hasher
 from models import User
+from services.passwords import HasherBusy
+from services.users import admin_required, current_cached_user
 
 
 auth_bp = Blueprint("auth", __name__)
@@ -25,8 +27,12 @@ def register():
     if User.query.filter((User.username == username) | (User.email == email)).first():
         return jsonify({"message": "User already exists"}), 409
 
-    user = User(username=username, email=email)
-    user.set_password(password)
+    try:
+        password_hash = password_hasher.hash(password)
+    except HasherBusy as exc:
+        return _busy(exc)
+
+    user = User(username=username, email=email, password_hash=password_hash)
     db.session.add(user)
     db.session.commit()
 
@@ -47,8 +53,19 @@ def login():
         return jsonify({"message": "Missing credentials"}), 400
 
     user = User.query.filter_by(email=email).first()
-    if not user or not user.check_password(password):
+    if not user:
+        return jsonify({"message": "Invalid email or password"}), 401
+
+    try:
+        valid, new_hash = password_hasher.verify(password, user.password_hash)
+    except HasherBusy as exc:
+        return _busy(exc)
+    if not valid:
         return jsonify({"message": "Invalid email or password"}), 401
+    if new_hash is not None:
+        # Stored with other bcrypt rounds than BCRYPT_ROUNDS
+        user.password_hash = new_hash
+        db.session.commit()
 
     token = create_access_token(identity=str(user.id))
     return jsonify({
@@ -60,8 +77,22 @@ def login():
 @auth_bp.get("/me")
 @jwt_required()
 def me():
-    user_id = get_jwt_identity()
-    user = User.query.get_or_404(user_id)
+    # Served from the user cache
+    user = current_cached_user()
+    if user is None:
+        return jsonify({"message": "User not found"}), 404
     return jsonify({"id": user.id, "username": user.username, "email": user.email})
 
 
+@auth_bp.get("/stats")
+@admin_required
+def hasher_stats():
+    """GET /auth/stats - Password hashing queue and latency metrics (admins only)"""
+    return jsonify(password_hasher.stats())
+
+
+def _busy(exc):
+    """503 for a request turned away by the password hashing queue"""
+    response = jsonify({"message": "Too many sign-in attempts, please retry shortly"})
+    response.headers["Retry-After"] = str(exc.retry_after)
+    return response, 503
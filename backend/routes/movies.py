@@ -1,14 +1,51 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, abort, current_app, request, jsonify
 from sqlalchemy import func
+from sqlalchemy.orm import undefer
 
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from models import Movie, db
+from models import Movie, MovieGenre, db, parse_genres
+from extensions import catalog, facets, fragments, leaderboards, response_cache, similar_movies, title_search
+from services import movie_events
+from services.catalog import SORT_FIELDS as SNAPSHOT_SORTS
+from services.response_cache import exempt as cache_exempt, skip as cache_skip
+from services.serialization import dumps, extend_fragment, json_response, list_body, parse_fields
+from services.facets import format_facet_counts, parse_facet_names, sql_facet_counts
+from services.leaderboards import LEADERBOARD_NAMES
+from services.pagination import decode_cursor, encode_cursor, keyset_after, keyset_order
+from services.users import admin_required
 
 
 movies_bp = Blueprint("movies", __name__)
+response_cache.register(movies_bp)
+
+
+# Sort option -> (column, descending) for keyset pagination
+SORT_COLUMNS = {
+    "rating_desc": (Movie.imdb_rating, True),
+    "rating_asc": (Movie.imdb_rating, False),
+    "year_desc": (Movie.release_year, True),
+    "year_asc": (Movie.release_year, False),
+    "title_asc": (Movie.title, False),
+    "popular_desc": (Movie.watchlist_count, True),
+    "likes_desc": (Movie.like_count, True),
+    "community_rating_desc": (Movie.community_score, True),
+}
+
+MAX_PAGE_SIZE = 500
+
+MAX_BATCH_IDS = 300
+
+DEFAULT_SIMILAR = 10
+MAX_SIMILAR = 50
+
+DEFAULT_TOP = 10
+
+# Fields selectable with fields= on list and detail responses
+LIST_FIELDS = tuple(field for field in Movie.FIELD_COLUMNS if field != "synopsis")
+DETAIL_FIELDS = tuple(Movie.FIELD_COLUMNS)
 
 
 @movies_bp.get("")
@@ -16,39 +53,113 @@ def list_movies():
     """GET /movies - Browse movies with search and filter options
     
     Query parameters:
-    - search: Search movie titles (Film)
+    - search: Search movie titles (Film), tolerant of small typos
     - year: Filter by release year (Year) 
-    - genre: Filter by genre (Genre)
+    - genre: Filter by genre (Genre); several may be given, e.g. Action,Drama
+    - genre_mode: all (default) requires every listed genre, any requires one
+    - language: Filter by language
     - min_rating: Minimum IMDb rating (IMDb Rating)
     - max_rating: Maximum IMDb rating (IMDb Rating)
-    - sort: Sort order (rating_desc, rating_asc, year_desc, year_asc, title_asc)
-    - limit: Number of results (default 60)
+    - sort: Sort order (rating_desc, rating_asc, year_desc, year_asc, title_asc,
+      popular_desc, likes_desc, community_rating_desc, relevance). Defaults to
+      relevance when searching, otherwise rating_desc. popular_desc ranks by
+      watchlist saves, likes_desc by likes, community_rating_desc by the
+      Bayesian average of user ratings
+    - limit: Number of results (default 60, max 500)
+    - cursor: Opaque token from a previous response's next_cursor
+    - facets: Comma separated facets to count over all matches
+      (genre, year, language, rating_bucket)
+    - fields: Comma separated movie fields to return, e.g.
+      id,title,imdb_rating,film_image_url (default: all)
     """
     
     # Get query parameters
     search = request.args.get("search", "").strip()
     year = request.args.get("year", type=int)
     genre = request.args.get("genre", "").strip()
+    genre_mode = request.args.get("genre_mode", "all").strip().lower()
+    language = request.args.get("language", "").strip()
     min_rating = request.args.get("min_rating", type=float)
     max_rating = request.args.get("max_rating", type=float)
-    sort = request.args.get("sort", "rating_desc")
+    sort = request.args.get("sort", "relevance" if search else "rating_desc")
     limit = request.args.get("limit", 60, type=int)
+    cursor = request.args.get("cursor", "").strip()
+    facet_names = parse_facet_names(request.args.get("facets", ""))
+    
+    if sort not in SORT_COLUMNS and not (sort == "relevance" and search):
+        # Default to rating descending
+        sort = "rating_desc"
+    if genre_mode not in ("all", "any"):
+        genre_mode = "all"
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    genres = parse_genres(genre)
+    
+    try:
+        fields = parse_fields(request.args.get("fields"), LIST_FIELDS)
+        after = decode_cursor(cursor, sort) if cursor else None
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    
+    # Echoed in normalized form: the response cache folds the case of search
+    # and genre, so the body must not depend on the caller's spelling
+    filters_applied = {
+        "search": search.lower(),
+        "year": year,
+        "genre": ", ".join(genres),
+        "genre_mode": genre_mode,
+        "language": language,
+        "min_rating": min_rating,
+        "max_rating": max_rating,
+        "sort": sort
+    }
+    
+    # Answer from the in-memory catalog snapshot when it is enabled and
+    # holds the sort key (popularity, likes and ratings change too often to snapshot)
+    snapshot = catalog.snapshot() if sort in SNAPSHOT_SORTS or sort == "relevance" else None
+    if snapshot is not None:
+        if snapshot.version != catalog.version:
+            # Served while another request rebuilds it; don't cache the answer
+            cache_skip()
+        movies_data, total_count, next_after, facet_counts = snapshot.query(
+            search=search,
+            year=year,
+            genres=genres,
+            genre_mode=genre_mode,
+            language=language,
+            min_rating=min_rating,
+            max_rating=max_rating,
+            sort=sort,
+            limit=limit,
+            after=after,
+            facets=facet_names,
+        )
+        next_cursor = encode_cursor(sort, *next_after) if next_after else None
+        if fields:
+            movie_fragments = [dumps({field: row[field] for field in fields}) for row in movies_data]
+        else:
+            movie_fragments = fragments.for_rows(movies_data, snapshot.sequence)
+        return _movie_list_response(movie_fragments, total_count, next_cursor, filters_applied, facet_counts)
     
     # Build query
+    sequence = movie_events.sequence()
     query = Movie.query
     
     # Apply filters
     if search:
-        # Search in movie title (Film)
-        query = query.filter(Movie.title.ilike(f"%{search}%"))
+        # Search in movie title (Film) using the trigram index when available
+        query = query.filter(title_search.filter(search))
     
     if year:
         # Filter by release year (Year)
         query = query.filter(Movie.release_year == year)
     
-    if genre:
-        # Filter by genre (Genre)
-        query = query.filter(Movie.genre.ilike(f"%{genre}%"))
+    if genres:
+        # Filter by genre (Genre) through the normalized movie_genres index
+        query = query.filter(Movie.id.in_(_genre_movie_ids(genres, genre_mode)))
+    
+    if language:
+        # Filter by language
+        query = query.filter(Movie.language == language)
     
     if min_rating is not None:
         # Filter by minimum IMDb rating
@@ -58,82 +169,185 @@ def list_movies():
         # Filter by maximum IMDb rating
         query = query.filter(Movie.imdb_rating <= max_rating)
     
-    # Apply sorting
-    if sort == "rating_desc":
-        query = query.order_by(Movie.imdb_rating.desc())
-    elif sort == "rating_asc":
-        query = query.order_by(Movie.imdb_rating.asc())
-    elif sort == "year_desc":
-        query = query.order_by(Movie.release_year.desc())
-    elif sort == "year_asc":
-        query = query.order_by(Movie.release_year.asc())
-    elif sort == "title_asc":
-        query = query.order_by(Movie.title.asc())
+    total_count = query.order_by(None).count()
+    facet_counts = sql_facet_counts(query, facet_names)
+    
+    # Apply sorting, seeking past the cursor row with id as the tiebreaker
+    offset = 0
+    if sort == "relevance":
+        # Search results are small, so relevance pages use an offset
+        query = query.order_by(*title_search.order_by(search))
+        if after is not None:
+            offset = int(after[0])
+            query = query.offset(offset)
     else:
-        # Default to rating descending
-        query = query.order_by(Movie.imdb_rating.desc())
-    
-    # Execute query with limit
-    movies = query.limit(limit).all()
-    
-    # Convert to response format
-    movies_data = [movie.to_dict() for movie in movies]
-    
-    return jsonify({
-        "movies": movies_data,
-        "total_count": len(movies_data),
-        "filters_applied": {
-            "search": search,
-            "year": year,
-            "genre": genre,
-            "min_rating": min_rating,
-            "max_rating": max_rating,
-            "sort": sort
-        }
-    })
+        column, descending = SORT_COLUMNS[sort]
+        if after is not None:
+            query = query.filter(keyset_after(column, Movie.id, *after, descending=descending))
+        query = query.order_by(*keyset_order(column, Movie.id, descending))
+    
+    if fields:
+        # Select only the requested columns (plus the cursor's sort column)
+        sort_column = [] if sort == "relevance" else [SORT_COLUMNS[sort][0].key]
+        query = query.with_entities(*Movie.projection_columns(fields, extra=sort_column))
+    
+    # Fetch one extra row to learn whether another page exists
+    movies = query.limit(limit + 1).all()
+    has_more = len(movies) > limit
+    movies = movies[:limit]
+    
+    next_cursor = None
+    if has_more and movies:
+        last = movies[-1]
+        if sort == "relevance":
+            next_cursor = encode_cursor(sort, offset + len(movies), last.id)
+        else:
+            next_cursor = encode_cursor(sort, getattr(last, SORT_COLUMNS[sort][0].key), last.id)
+    
+    # Convert to response format (cached, pre-encoded JSON per movie)
+    if fields:
+        movie_fragments = [dumps(Movie.project(row, fields)) for row in movies]
+    else:
+        movie_fragments = fragments.for_movies(movies, sequence)
+    
+    return _movie_list_response(movie_fragments, total_count, next_cursor, filters_applied, facet_counts)
+
+
+def _genre_movie_ids(genres, mode):
+    """Subquery of movie ids tagged with all/any of ``genres``"""
+    movie_ids = db.session.query(MovieGenre.movie_id).filter(MovieGenre.genre.in_(genres))
+    if mode == "all" and len(genres) > 1:
+        movie_ids = movie_ids.group_by(MovieGenre.movie_id).having(func.count() == len(genres))
+    return movie_ids
+
+
+def _movie_list_response(movie_fragments, total_count, next_cursor, filters_applied, facet_counts):
+    data = {
+        "total_count": total_count,
+        "next_cursor": next_cursor,
+        "filters_applied": filters_applied
+    }
+    if facet_counts:
+        data["facets"] = format_facet_counts(facet_counts)
+    return json_response(list_body("movies", movie_fragments, data))
 
 
 @movies_bp.get("/filters")
 def get_filter_options():
-    """GET /movies/filters - Get available filter options"""
-    
-    # Get unique genres
-    genres_query = db.session.query(Movie.genre).filter(Movie.genre.isnot(None)).distinct().all()
-    genres = sorted([genre[0] for genre in genres_query if genre[0]])
-    
-    # Get available years
-    years_query = db.session.query(Movie.release_year).filter(Movie.release_year.isnot(None)).distinct().all()
-    years = sorted([year[0] for year in years_query if year[0]], reverse=True)
-    
-    # Get rating range
-    rating_stats = db.session.query(
-        func.min(Movie.imdb_rating),
-        func.max(Movie.imdb_rating)
-    ).filter(Movie.imdb_rating.isnot(None)).first()
-    
-    min_rating = rating_stats[0] or 0.0
-    max_rating = rating_stats[1] or 10.0
-    
-    return jsonify({
-        "genres": genres,
-        "years": years,
-        "rating_range": {
-            "min": round(min_rating, 1),
-            "max": round(max_rating, 1)
-        },
-        "sort_options": [
-            {"value": "rating_desc", "label": "Rating: High to Low"},
-            {"value": "rating_asc", "label": "Rating: Low to High"},
-            {"value": "year_desc", "label": "Year: Newest First"},
-            {"value": "year_asc", "label": "Year: Oldest First"},
-            {"value": "title_asc", "label": "Title: A to Z"}
-        ]
-    })
+    """GET /movies/filters - Get available filter options
+    
+    Served from the precomputed facet store; supports If-None-Match.
+    """
+    body, etag = facets.payload()
+    
+    response = current_app.response_class(body, mimetype="application/json")
+    response.set_etag(etag)
+    # Let browsers keep the body but revalidate it with the ETag every time
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+@movies_bp.get("/top")
+def get_top_movies():
+    """GET /movies/top - Best rated movies of a genre, language or year
+    
+    Query parameters:
+    - by: genre, language or year
+    - value: The genre, language or release year, e.g. by=genre&value=Action
+    - n: Number of movies (default 10, max LEADERBOARD_SIZE)
+    
+    Served from incrementally maintained leaderboards in rating_desc order;
+    movies without a rating are not ranked.
+    """
+    by = request.args.get("by", "").strip().lower()
+    value = request.args.get("value", "").strip()
+    n = max(1, request.args.get("n", DEFAULT_TOP, type=int))
+    
+    if by not in LEADERBOARD_NAMES:
+        return jsonify({"error": f"by must be one of: {', '.join(LEADERBOARD_NAMES)}"}), 400
+    if by == "genre":
+        genres = parse_genres(value)
+        value = genres[0] if len(genres) == 1 else None
+    elif by == "year":
+        value = int(value) if value.isdigit() else None
+    if not value:
+        return jsonify({"error": f"A single {by} value is required"}), 400
+    
+    ranked = leaderboards.top(by, value, n)
+    found = fragments.for_ids([movie_id for movie_id, _ in ranked], catalog.warm_snapshot())
+    movie_fragments = [found[movie_id] for movie_id, _ in ranked if movie_id in found]
+    return json_response(list_body("movies", movie_fragments, {
+        "by": by,
+        "value": value,
+        "total_count": len(movie_fragments)
+    }))
+
+
+@movies_bp.get("/batch")
+def get_movies_batch():
+    """GET /movies/batch?ids=1,2,3 - Look up several movies in one request
+    
+    Query parameters:
+    - ids: Comma separated movie ids (at most 300)
+    - fields: Comma separated movie fields to return (default: all)
+    
+    Movies are returned in the requested order; unknown ids are listed
+    under "missing".
+    """
+    try:
+        movie_ids = [int(id.strip()) for id in request.args.get("ids", "").split(",") if id.strip()]
+    except ValueError:
+        return jsonify({"error": "Invalid ids format"}), 400
+    
+    try:
+        fields = parse_fields(request.args.get("fields"), LIST_FIELDS)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    
+    movie_ids = list(dict.fromkeys(movie_ids))
+    if len(movie_ids) > MAX_BATCH_IDS:
+        return jsonify({"error": f"At most {MAX_BATCH_IDS} ids per request"}), 400
+    
+    found = {}
+    if fields:
+        rows = db.session.query(*Movie.projection_columns(fields)).filter(Movie.id.in_(movie_ids))
+        for row in rows:
+            found[row.id] = dumps(Movie.project(row, fields))
+    else:
+        # Cached fragments first, then a warm catalog snapshot, then one IN query
+        found = fragments.for_ids(movie_ids, catalog.warm_snapshot())
+    
+    movie_fragments = [found[movie_id] for movie_id in movie_ids if movie_id in found]
+    missing = [movie_id for movie_id in movie_ids if movie_id not in found]
+    return json_response(list_body("movies", movie_fragments, {
+        "missing": missing,
+        "total_count": len(movie_fragments)
+    }))
 
 
 @movies_bp.get("/<int:movie_id>")
 def get_movie(movie_id: int):
-    m = Movie.query.get_or_404(movie_id)
+    """GET /movies/{movie_id} - Movie details
+    
+    Query parameters:
+    - fields: Comma separated fields to return (default: all, with synopsis)
+    """
+    try:
+        fields = parse_fields(request.args.get("fields"), DETAIL_FIELDS)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    
+    if fields:
+        row = (
+            db.session.query(*Movie.projection_columns(fields))
+            .filter(Movie.id == movie_id)
+            .first()
+        )
+        if row is None:
+            abort(404)
+        return jsonify(Movie.project(row, fields))
+    
+    m = Movie.query.options(undefer(Movie.synopsis)).get_or_404(movie_id)
     return jsonify(
         {
             "id": m.id,
@@ -147,7 +361,54 @@ def get_movie(movie_id: int):
             "poster_url": m.film_image_url or m.poster_url,
             "film_image_url": m.film_image_url,
             "synopsis": m.synopsis,
+            "community_rating": m.rating_mean,
+            "rating_count": m.rating_count,
+            "like_count": m.like_count,
         }
     )
 
 
+@movies_bp.get("/<int:movie_id>/similar")
+def get_similar_movies(movie_id: int):
+    """GET /movies/{movie_id}/similar - Movies with similar content
+    
+    Query parameters:
+    - k: Number of movies (default 10, max 50)
+    
+    Ranked by cosine similarity of genre, language, year, rating,
+    budget/gross and synopsis feature vectors.
+    """
+    k = request.args.get("k", DEFAULT_SIMILAR, type=int)
+    k = max(1, min(k, MAX_SIMILAR))
+    
+    movie = db.session.get(Movie, movie_id)
+    if movie is None:
+        abort(404)
+    
+    scored = similar_movies.similar(movie_id, k)
+    if scored is None:
+        # No vector index: best rated movies sharing a genre
+        genres = parse_genres(movie.genre)
+        query = Movie.query.with_entities(Movie.id).filter(Movie.id != movie_id)
+        if genres:
+            query = query.filter(Movie.id.in_(_genre_movie_ids(genres, "any")))
+        rows = query.order_by(*keyset_order(Movie.imdb_rating, Movie.id, True)).limit(k)
+        scored = [(row.id, None) for row in rows]
+    
+    found = fragments.for_ids([similar_id for similar_id, _ in scored], catalog.warm_snapshot())
+    movie_fragments = [
+        extend_fragment(found[similar_id], {"similarity": round(score, 4)} if score is not None else None)
+        for similar_id, score in scored if similar_id in found
+    ]
+    return json_response(list_body("movies", movie_fragments, {
+        "movie_id": movie_id,
+        "total_count": len(movie_fragments)
+    }))
+
+
+@movies_bp.get("/cache/stats")
+@cache_exempt
+@admin_required
+def get_cache_stats():
+    """GET /movies/cache/stats - Response cache hit/miss counters (admins only)"""
+    return jsonify(response_cache.stats())
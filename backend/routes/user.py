@@ -0,0 +1,247 @@
+from flask import Blueprint, jsonify, request
+from flask_jwt_extended import jwt_required, get_jwt_identity
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extensions import catalog, db, fragments, membership, recommender
+from models import Like, Movie, Rating, User, UserRecommendation
+from services import likes, ratings
+from services.serialization import extend_fragment, json_response, list_body
+
+
+user_bp = Blueprint("user", __name__)
+
+DEFAULT_RECOMMENDATIONS = 20
+MAX_RECOMMENDATIONS = 100
+
+DEFAULT_RATINGS_PAGE = 100
+MAX_RATINGS_PAGE = 500
+
+DEFAULT_LIKES_PAGE = 100
+MAX_LIKES_PAGE = 500
+
+
+@user_bp.get("/recommendations")
+@jwt_required()
+def get_recommendations():
+    """GET /user/recommendations - Movies similar to the user's watchlist
+
+    Query parameters:
+    - limit: Number of movies (default 20, max 100)
+
+    Scores each movie by its item-item similarity to the movies on the
+    user's watchlist, excluding those already saved. Users with an empty
+    watchlist get the most saved movies ("strategy": "popular").
+
+    Results precomputed by precompute_recommendations.py are served with one
+    indexed lookup while the user's watchlist is unchanged since
+    ("strategy": "precomputed").
+    """
+    user_id = int(get_jwt_identity())
+    limit = request.args.get("limit", DEFAULT_RECOMMENDATIONS, type=int)
+    limit = max(1, min(limit, MAX_RECOMMENDATIONS))
+
+    scored = (
+        db.session.query(UserRecommendation.movie_id, UserRecommendation.score)
+        .join(User, User.id == UserRecommendation.user_id)
+        .filter(
+            UserRecommendation.user_id == user_id,
+            UserRecommendation.watchlist_version == User.watchlist_version,
+        )
+        .order_by(UserRecommendation.rank)
+        .limit(limit)
+        .all()
+    )
+    if scored:
+        strategy = "precomputed"
+    else:
+        saved_ids = membership.movie_ids(user_id)
+        strategy, scored = recommender.recommend(saved_ids, limit)
+
+    found = fragments.for_ids([movie_id for movie_id, _ in scored], catalog.warm_snapshot())
+    movie_fragments = [
+        extend_fragment(found[movie_id], {"recommendation_score": round(score, 4)} if score is not None else None)
+        for movie_id, score in scored if movie_id in found
+    ]
+
+    return json_response(list_body("movies", movie_fragments, {
+        "strategy": strategy,
+        "total_count": len(movie_fragments)
+    }))
+
+
+@user_bp.get("/ratings")
+@jwt_required()
+def get_ratings():
+    """GET /user/ratings - The user's ratings, most recent first
+
+    Query parameters:
+    - limit: Number of ratings (default 100, max 500)
+    """
+    user_id = int(get_jwt_identity())
+    limit = request.args.get("limit", DEFAULT_RATINGS_PAGE, type=int)
+    limit = max(1, min(limit, MAX_RATINGS_PAGE))
+
+    user_ratings = (
+        Rating.query.filter_by(user_id=user_id)
+        .order_by(Rating.updated_at.desc(), Rating.id.desc())
+        .limit(limit)
+        .all()
+    )
+    return jsonify({
+        "ratings": [rating.to_dict() for rating in user_ratings],
+        "total_count": Rating.query.filter_by(user_id=user_id).count()
+    })
+
+
+@user_bp.put("/ratings/<int:movie_id>")
+@jwt_required()
+def rate_movie(movie_id):
+    """PUT /user/ratings/{movie_id} - Rate a movie from 1 to 10
+
+    Body: {"score": 8}
+    """
+    user_id = int(get_jwt_identity())
+    data = request.get_json(silent=True) or {}
+    try:
+        score = ratings.validate_score(data.get("score"))
+    except ValueError as exc:
+        return jsonify({
+            "success": False,
+            "message": str(exc)
+        }), 400
+
+    if db.session.get(Movie, movie_id) is None:
+        return jsonify({
+            "success": False,
+            "message": "Movie not found"
+        }), 404
+
+    previous = ratings.rate_movie(user_id, movie_id, score)
+    db.session.commit()
+
+    return jsonify({
+        "success": True,
+        "message": "Rating saved" if previous is None else "Rating updated",
+        "rating": {"movie_id": movie_id, "score": score},
+        "movie": _rating_summary(movie_id)
+    }), 201 if previous is None else 200
+
+
+@user_bp.delete("/ratings/<int:movie_id>")
+@jwt_required()
+def remove_rating(movie_id):
+    """DELETE /user/ratings/{movie_id} - Remove the user's rating"""
+    user_id = int(get_jwt_identity())
+
+    previous = ratings.remove_rating(user_id, movie_id)
+    if previous is None:
+        return jsonify({
+            "success": False,
+            "message": "Movie not rated"
+        }), 404
+    db.session.commit()
+
+    return jsonify({
+        "success": True,
+        "message": "Rating removed",
+        "movie": _rating_summary(movie_id)
+    }), 200
+
+
+def _rating_summary(movie_id):
+    """The movie's rating aggregates after a write"""
+    row = (
+        db.session.query(Movie.id, Movie.rating_mean, Movie.rating_count, Movie.community_score)
+        .filter(Movie.id == movie_id)
+        .first()
+    )
+    return {
+        "id": row.id,
+        "community_rating": row.rating_mean,
+        "rating_count": row.rating_count,
+        "community_score": row.community_score
+    }
+
+
+@user_bp.get("/likes")
+@jwt_required()
+def get_likes():
+    """GET /user/likes - Movies the user liked, most recent first
+
+    Query parameters:
+    - limit: Number of likes (default 100, max 500)
+    """
+    user_id = int(get_jwt_identity())
+    limit = request.args.get("limit", DEFAULT_LIKES_PAGE, type=int)
+    limit = max(1, min(limit, MAX_LIKES_PAGE))
+
+    user_likes = (
+        db.session.query(Like.movie_id, Like.created_at)
+        .filter(Like.user_id == user_id)
+        .order_by(Like.created_at.desc(), Like.id.desc())
+        .limit(limit)
+        .all()
+    )
+    return jsonify({
+        "likes": [
+            {"movie_id": movie_id, "liked_at": created_at.isoformat() if created_at else None}
+            for movie_id, created_at in user_likes
+        ],
+        "total_count": Like.query.filter_by(user_id=user_id).count()
+    })
+
+
+@user_bp.post("/likes")
+@jwt_required()
+def like_movie():
+    """POST /user/likes - Like a movie
+
+    Body: {"movie_id": 42}
+
+    The movie's like_count is updated in batches and may lag by up to
+    LIKE_FLUSH_INTERVAL seconds.
+    """
+    user_id = int(get_jwt_identity())
+    data = request.get_json(silent=True) or {}
+    movie_id = data.get("movie_id")
+    if isinstance(movie_id, bool) or not isinstance(movie_id, int):
+        return jsonify({
+            "success": False,
+            "message": "movie_id is required"
+        }), 400
+
+    if db.session.get(Movie, movie_id) is None:
+        return jsonify({
+            "success": False,
+            "message": "Movie not found"
+        }), 404
+
+    added = likes.like_movie(user_id, movie_id)
+    db.session.commit()
+
+    return jsonify({
+        "success": True,
+        "message": "Movie liked" if added else "Movie already liked"
+    }), 201 if added else 200
+
+
+@user_bp.delete("/likes/<int:movie_id>")
+@jwt_required()
+def unlike_movie(movie_id):
+    """DELETE /user/likes/{movie_id} - Remove the user's like"""
+    user_id = int(get_jwt_identity())
+
+    if not likes.unlike_movie(user_id, movie_id):
+        return jsonify({
+            "success": False,
+            "message": "Movie not liked"
+        }), 404
+    db.session.commit()
+
+    return jsonify({
+        "success": True,
+        "message": "Like removed"
+    }), 200
@@ -1,41 +1,158 @@
+from datetime import datetime
+
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import func
+from sqlalchemy.orm import aliased, contains_eager
 
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from extensions import db
-from models import Watchlist, Movie
+from extensions import db, fragments, membership
+from models import User, Watchlist, WatchlistChange, Movie
+from services import movie_events, watchlist_ops
+from services.pagination import decode_cursor, encode_cursor, keyset_after, keyset_order
+from services.serialization import dumps, extend_fragment, json_response, list_body, parse_fields
 
 
 watchlist_bp = Blueprint("watchlist", __name__)
 
+# Movie fields selectable with fields= (everything to_dict() returns)
+WATCHLIST_FIELDS = tuple(field for field in Movie.FIELD_COLUMNS if field != "synopsis")
+
+# Sort option -> (column, descending); Watchlist.id breaks ties
+WATCHLIST_SORTS = {
+    "added_desc": (Watchlist.created_at, True),
+    "added_asc": (Watchlist.created_at, False),
+    "title_asc": (Movie.title, False),
+    "rating_desc": (Movie.imdb_rating, True),
+}
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+MAX_BATCH_SIZE = 500
+
 
 @watchlist_bp.get("")
 @jwt_required()
 def get_watchlist():
-    """GET /watchlist - Get user's watchlist with complete movie data"""
+    """GET /watchlist - Get user's watchlist with complete movie data
+    
+    Query parameters:
+    - sort: added_desc (default), added_asc, title_asc, rating_desc
+    - limit: Page size (default 100, max 500)
+    - cursor: Opaque token from a previous response's next_cursor
+    - fields: Comma separated movie fields to return (default: all)
+    
+    Each page is loaded with a single statement: watchlist rows, their
+    movies, the total count and the watchlist version to pass to
+    /watchlist/changes.
+    """
     user_id = int(get_jwt_identity())
+    sort = request.args.get("sort", "added_desc")
+    limit = request.args.get("limit", DEFAULT_PAGE_SIZE, type=int)
+    cursor = request.args.get("cursor", "").strip()
     
-    # Get all movies in user's watchlist
-    watchlist_items = (
-        Watchlist.query.filter_by(user_id=user_id)
-        .join(Movie, Watchlist.movie_id == Movie.id)
-        .all()
+    if sort not in WATCHLIST_SORTS:
+        sort = "added_desc"
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    column, descending = WATCHLIST_SORTS[sort]
+    
+    try:
+        fields = parse_fields(request.args.get("fields"), WATCHLIST_FIELDS)
+        after = decode_cursor(cursor, sort) if cursor else None
+        if after is not None and sort.startswith("added_") and after[0] is not None:
+            after = (datetime.fromisoformat(after[0]), after[1])
+    except (TypeError, ValueError) as exc:
+        return jsonify({"error": str(exc)}), 400
+    
+    # Total size of the list, computed inside the same statement
+    counted = aliased(Watchlist)
+    total = (
+        db.session.query(func.count(counted.id))
+        .filter(counted.user_id == user_id)
+        .scalar_subquery()
+        .label("total_count")
+    )
+    version = (
+        db.session.query(User.watchlist_version)
+        .filter(User.id == user_id)
+        .scalar_subquery()
+        .label("watchlist_version")
     )
     
-    movies_data = []
-    for item in watchlist_items:
-        movie_data = item.movie.to_dict()
-        movie_data['added_to_watchlist'] = item.created_at.isoformat() if item.created_at else None
-        movie_data['in_watchlist'] = True  # Flag for frontend
-        movies_data.append(movie_data)
+    sequence = movie_events.sequence()
+    if fields:
+        # Select only the requested movie columns
+        sort_column = [] if sort.startswith("added_") else [column.key]
+        query = db.session.query(
+            Watchlist.id.label("watchlist_id"),
+            Watchlist.created_at.label("added_at"),
+            total,
+            version,
+            *Movie.projection_columns(fields, extra=sort_column)
+        )
+    else:
+        # Load each movie through the join instead of one lazy SELECT per item
+        query = db.session.query(Watchlist, total, version).options(contains_eager(Watchlist.movie))
     
-    return jsonify({
-        "watchlist": movies_data,
-        "total_count": len(movies_data)
-    })
+    query = query.select_from(Watchlist).join(Movie, Watchlist.movie_id == Movie.id)
+    query = query.filter(Watchlist.user_id == user_id)
+    if after is not None:
+        query = query.filter(keyset_after(column, Watchlist.id, *after, descending=descending))
+    query = query.order_by(*keyset_order(column, Watchlist.id, descending))
+    
+    # Fetch one extra row to learn whether another page exists
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if rows:
+        total_count, watchlist_version = rows[0].total_count, rows[0].watchlist_version
+    else:
+        total_count, watchlist_version = _count_watchlist(user_id, after), _watchlist_version(user_id)
+    
+    movie_fragments = []
+    cursor_keys = []
+    for row in rows:
+        if fields:
+            added_at = row.added_at
+            movie_fragment = dumps(Movie.project(row, fields))
+            cursor_keys.append((added_at if sort.startswith("added_") else getattr(row, column.key), row.watchlist_id))
+        else:
+            item = row.Watchlist
+            added_at = item.created_at
+            movie_fragment = fragments.get(item.movie_id, item.movie.to_dict, sequence)
+            cursor_keys.append((added_at if sort.startswith("added_") else getattr(item.movie, column.key), item.id))
+        # Splice the per-item fields into the movie's JSON fragment
+        movie_fragments.append(extend_fragment(movie_fragment, {
+            'added_to_watchlist': added_at.isoformat() if added_at else None,
+            'in_watchlist': True  # Flag for frontend
+        }))
+    
+    next_cursor = None
+    if has_more and cursor_keys:
+        value, row_id = cursor_keys[-1]
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        next_cursor = encode_cursor(sort, value, row_id)
+    
+    return json_response(list_body("watchlist", movie_fragments, {
+        "total_count": total_count,
+        "next_cursor": next_cursor,
+        "version": watchlist_version
+    }))
+
+
+def _watchlist_version(user_id):
+    return db.session.query(User.watchlist_version).filter(User.id == user_id).scalar() or 0
+
+
+def _count_watchlist(user_id, after):
+    """Watchlist size for an empty page (nothing to read the count from)"""
+    if after is None:
+        return 0
+    return Watchlist.query.filter_by(user_id=user_id).count()
 
 
 @watchlist_bp.post("/<int:movie_id>")
@@ -52,20 +169,16 @@ def add_movie_to_watchlist(movie_id):
             "message": "Movie not found"
         }), 404
     
-    # Check if already in watchlist
-    existing_item = Watchlist.query.filter_by(user_id=user_id, movie_id=movie_id).first()
-    if existing_item:
+    # Insert unless already present (ON CONFLICT DO NOTHING)
+    outcome = watchlist_ops.add_movies(user_id, [movie_id], known_movie_ids={movie_id})[movie_id]
+    db.session.commit()
+    if outcome == watchlist_ops.ALREADY_IN_WATCHLIST:
         return jsonify({
             "success": False,
             "message": "Movie already in watchlist",
             "in_watchlist": True
         }), 200
     
-    # Add to watchlist
-    watchlist_item = Watchlist(user_id=user_id, movie_id=movie_id)
-    db.session.add(watchlist_item)
-    db.session.commit()
-    
     return jsonify({
         "success": True,
         "message": f"'{movie.title}' added to watchlist",
@@ -88,17 +201,14 @@ def remove_movie_from_watchlist(movie_id):
             "message": "Movie not found"
         }), 404
     
-    # Find watchlist item
-    watchlist_item = Watchlist.query.filter_by(user_id=user_id, movie_id=movie_id).first()
-    if not watchlist_item:
+    # Remove from watchlist (DELETE ... RETURNING tells us if it was there)
+    outcome = watchlist_ops.remove_movies(user_id, [movie_id])[movie_id]
+    if outcome == watchlist_ops.NOT_IN_WATCHLIST:
         return jsonify({
             "success": False,
             "message": "Movie not in watchlist",
             "in_watchlist": False
         }), 404
-    
-    # Remove from watchlist
-    db.session.delete(watchlist_item)
     db.session.commit()
     
     return jsonify({
@@ -109,11 +219,63 @@ def remove_movie_from_watchlist(movie_id):
     }), 200
 
 
+@watchlist_bp.post("/batch")
+@jwt_required()
+def batch_update_watchlist():
+    """POST /watchlist/batch - Add and remove several movies in one transaction
+    
+    Body: {"add": [movie_id, ...], "remove": [movie_id, ...]}
+    
+    Responds with the outcome for every id: added, already_in_watchlist or
+    not_found for adds; removed or not_in_watchlist for removes.
+    """
+    user_id = int(get_jwt_identity())
+    data = request.get_json(silent=True) or {}
+    add_ids = data.get("add") or []
+    remove_ids = data.get("remove") or []
+    
+    if not isinstance(add_ids, list) or not isinstance(remove_ids, list) or not all(
+            isinstance(movie_id, int) and not isinstance(movie_id, bool) for movie_id in add_ids + remove_ids):
+        return jsonify({
+            "success": False,
+            "message": "add and remove must be lists of movie ids"
+        }), 400
+    
+    if len(add_ids) + len(remove_ids) > MAX_BATCH_SIZE:
+        return jsonify({
+            "success": False,
+            "message": f"At most {MAX_BATCH_SIZE} movie ids per batch"
+        }), 400
+    
+    if set(add_ids) & set(remove_ids):
+        return jsonify({
+            "success": False,
+            "message": "A movie id cannot be both added and removed"
+        }), 400
+    
+    removed = watchlist_ops.remove_movies(user_id, remove_ids)
+    added = watchlist_ops.add_movies(user_id, add_ids)
+    db.session.commit()
+    
+    return jsonify({
+        "success": True,
+        "added": sum(outcome == watchlist_ops.ADDED for outcome in added.values()),
+        "removed": sum(outcome == watchlist_ops.REMOVED for outcome in removed.values()),
+        "results": {
+            "add": {str(movie_id): outcome for movie_id, outcome in added.items()},
+            "remove": {str(movie_id): outcome for movie_id, outcome in removed.items()}
+        }
+    })
+
+
 @watchlist_bp.get("/status")
 @jwt_required()
 def get_watchlist_status():
-    """GET /watchlist/status?movie_ids=1,2,3 - Check watchlist status for multiple movies"""
-    user_id = get_jwt_identity()
+    """GET /watchlist/status?movie_ids=1,2,3 - Check watchlist status for multiple movies
+    
+    Answered from the in-memory membership cache after the user's first check.
+    """
+    user_id = int(get_jwt_identity())
     movie_ids_param = request.args.get('movie_ids', '')
     
     if not movie_ids_param:
@@ -124,17 +286,82 @@ def get_watchlist_status():
     except ValueError:
         return jsonify({"error": "Invalid movie_ids format"}), 400
     
-    # Get watchlist status for requested movies
-    watchlist_items = Watchlist.query.filter(
-        Watchlist.user_id == user_id,
-        Watchlist.movie_id.in_(movie_ids)
-    ).all()
-    
-    # Create status dictionary
-    status = {movie_id: False for movie_id in movie_ids}
-    for item in watchlist_items:
-        status[item.movie_id] = True
+    # Look the movies up in the user's cached watchlist set
+    status = membership.status(user_id, movie_ids)
     
     return jsonify({"status": status})
 
 
+@watchlist_bp.get("/changes")
+@jwt_required()
+def get_watchlist_changes():
+    """GET /watchlist/changes?since=<version> - Watchlist changes after a version
+    
+    Query parameters:
+    - since: The version from a previous /watchlist or /watchlist/changes response
+    
+    Returns the net change per movie since that version in version order;
+    adds carry the movie as /watchlist returns it. "reset": true means the
+    changes are no longer available and the client should refetch /watchlist.
+    """
+    user_id = int(get_jwt_identity())
+    since = request.args.get("since", type=int)
+    if since is None:
+        return jsonify({"error": "since must be a version number"}), 400
+    
+    version = _watchlist_version(user_id)
+    if since == version:
+        # Up to date: one primary key lookup
+        return json_response(list_body("changes", [], {"version": version, "reset": False}))
+    
+    rows = []
+    if 0 <= since < version:
+        rows = (
+            db.session.query(WatchlistChange.version, WatchlistChange.movie_id, WatchlistChange.action)
+            .filter(
+                WatchlistChange.user_id == user_id,
+                WatchlistChange.version > since,
+                WatchlistChange.version <= version,
+            )
+            .order_by(WatchlistChange.version)
+            .all()
+        )
+    if not rows or rows[0].version != since + 1:
+        # Compacted away (or a version from the future)
+        return json_response(list_body("changes", [], {"version": version, "reset": True}))
+    
+    # Keep the last change per movie
+    latest = {}
+    for row in rows:
+        latest.pop(row.movie_id, None)
+        latest[row.movie_id] = row
+    
+    added_ids = [movie_id for movie_id, row in latest.items() if row.action == "add"]
+    items = {}
+    sequence = movie_events.sequence()
+    if added_ids:
+        items = {
+            item.movie_id: item
+            for item in db.session.query(Watchlist)
+            .join(Movie, Watchlist.movie_id == Movie.id)
+            .options(contains_eager(Watchlist.movie))
+            .filter(Watchlist.user_id == user_id, Watchlist.movie_id.in_(added_ids))
+        }
+    
+    change_fragments = []
+    for movie_id, row in latest.items():
+        item = items.get(movie_id)
+        if row.action == "add" and item is not None:
+            movie_fragment = extend_fragment(fragments.get(movie_id, item.movie.to_dict, sequence), {
+                'added_to_watchlist': item.created_at.isoformat() if item.created_at else None,
+                'in_watchlist': True
+            })
+            change_fragments.append(
+                dumps({"movie_id": movie_id, "action": "add", "version": row.version})[:-1]
+                + b',"movie":' + movie_fragment + b"}"
+            )
+        else:
+            # Removed, or added and removed again after this version
+            change_fragments.append(dumps({"movie_id": movie_id, "action": "remove", "version": row.version}))
+    
+    return json_response(list_body("changes", change_fragments, {"version": version, "reset": False}))
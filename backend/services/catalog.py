@@ -0,0 +1,340 @@
+"""In-memory columnar snapshot of the movies table.
+
+The movies table is read far more often than it is written, so instead of
+running a SQL query per ``GET /movies`` we keep an immutable, versioned
+snapshot of the catalog in NumPy arrays and answer browse queries from it:
+
+- ``imdb_rating``, ``release_year``, ``budget_crores`` and ``gross_crores`` are
+  float64 columns (NaN for NULL).
+- Each genre (parsed with ``models.parse_genres``) and language gets one
+  boolean bitmap.
+- Every supported sort order is a precomputed permutation of row positions.
+- Titles are indexed by trigram (``services.search.TitleIndex``).
+
+A query becomes a handful of vectorized mask operations followed by one
+fancy-indexing pass over the sort permutation.
+
+Writes to ``Movie`` (via ``services.movie_events``) bump the engine version;
+the next reader rebuilds the snapshot and swaps it in with a single reference
+assignment, so concurrent readers always see a complete snapshot.
+
+NumPy is optional. Without it, or with ``CATALOG_SNAPSHOT_ENABLED = False``,
+``CatalogEngine.snapshot()`` returns ``None`` and callers use SQL.
+"""
+
+import threading
+import time
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+from sqlalchemy.orm import defer
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from collections import Counter
+
+from models import Movie, parse_genres
+from services import movie_events
+from services.search import DEFAULT_SIMILARITY_THRESHOLD, TitleIndex
+
+
+# Row field holding the sort key of each keyset-paginated sort
+SORT_FIELDS = {
+    "rating_desc": "imdb_rating",
+    "rating_asc": "imdb_rating",
+    "year_desc": "release_year",
+    "year_asc": "release_year",
+    "title_asc": "title",
+}
+
+# Columns the snapshot does not hold; changes to them alone do not stale it
+_IGNORED_FIELDS = frozenset({
+    "synopsis", "created_at", "watchlisted_by", "watchlist_count",
+    "rating_count", "rating_sum", "rating_mean", "community_score", "like_count",
+})
+
+
+def _float_column(values):
+    return np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+
+
+def _sort_keys(values, descending=False):
+    """Ascending sort keys for a float column.
+
+    NULLs (NaN) sort as larger than any value, matching PostgreSQL's default
+    (NULLS LAST for ASC, NULLS FIRST for DESC).
+    """
+    keys = np.where(np.isnan(values), np.inf, values)
+    return -keys if descending else keys
+
+
+def _cursor_key(value, descending=False):
+    key = np.inf if value is None else float(value)
+    return -key if descending else key
+
+
+def _bitmaps(values_per_row):
+    """Map each distinct value to a boolean mask of the rows that have it"""
+    positions = {}
+    for row, values in enumerate(values_per_row):
+        for value in values:
+            positions.setdefault(value, []).append(row)
+
+    size = len(values_per_row)
+    bitmaps = {}
+    for value, rows in positions.items():
+        bitmap = np.zeros(size, dtype=bool)
+        bitmap[rows] = True
+        bitmaps[value] = bitmap
+    return bitmaps
+
+
+class CatalogSnapshot:
+    """Immutable columnar copy of the movies table at one version"""
+
+    def __init__(self, movies, version, sequence, search_threshold=DEFAULT_SIMILARITY_THRESHOLD):
+        self.version = version
+        # movie_events.sequence() read before the rows were loaded
+        self.sequence = sequence
+        self.built_at = time.monotonic()
+        self.size = len(movies)
+
+        self.rows = [movie.to_dict() for movie in movies]
+        self.ids = np.array([movie.id for movie in movies], dtype=np.int64)
+        self.position = {movie.id: row for row, movie in enumerate(movies)}
+
+        self.imdb_rating = _float_column(m.imdb_rating for m in movies)
+        self.release_year = _float_column(m.release_year for m in movies)
+        self.budget_crores = _float_column(m.budget_crores for m in movies)
+        self.gross_crores = _float_column(m.gross_crores for m in movies)
+        self.titles = np.array([m.title or "" for m in movies], dtype=str)
+        self.title_index = TitleIndex([m.title for m in movies], search_threshold)
+
+        self.genre_bitmaps = _bitmaps([parse_genres(m.genre) for m in movies])
+        self.language_bitmaps = _bitmaps([[m.language] if m.language else [] for m in movies])
+
+        # Ascending keys per sort; rows are ordered by (key, id)
+        self.sort_keys = {
+            "rating_desc": _sort_keys(self.imdb_rating, descending=True),
+            "rating_asc": _sort_keys(self.imdb_rating),
+            "year_desc": _sort_keys(self.release_year, descending=True),
+            "year_asc": _sort_keys(self.release_year),
+            "title_asc": self.titles,
+        }
+        self.orders = {
+            sort: np.lexsort((self.ids, keys)) for sort, keys in self.sort_keys.items()
+        }
+
+    def genre_mask(self, genres, mode="all"):
+        """Rows tagged with all (or, for ``mode="any"``, any) of ``genres``"""
+        empty = np.zeros(self.size, dtype=bool)
+        bitmaps = [self.genre_bitmaps.get(genre, empty) for genre in genres]
+        if mode == "any":
+            return np.logical_or.reduce(bitmaps)
+        return np.logical_and.reduce(bitmaps)
+
+    def filter_mask(self, search="", year=None, genres=(), genre_mode="all", language="",
+                    min_rating=None, max_rating=None):
+        """Boolean mask of rows matching the ``list_movies`` filters.
+
+        Returns ``(mask, search_matches)``; ``search_matches`` is the
+        ``TitleIndex.search()`` result, or ``None`` unless a search term was
+        applied.
+        """
+        search_matches = self.title_index.search(search) if search else None
+        if search_matches is not None:
+            mask = np.zeros(self.size, dtype=bool)
+            mask[search_matches[0]] = True
+        else:
+            mask = np.ones(self.size, dtype=bool)
+
+        if year:
+            mask &= self.release_year == year
+
+        if genres:
+            mask &= self.genre_mask(genres, genre_mode)
+
+        if language:
+            bitmap = self.language_bitmaps.get(language)
+            mask &= bitmap if bitmap is not None else False
+
+        if min_rating is not None:
+            mask &= self.imdb_rating >= min_rating
+
+        if max_rating is not None:
+            mask &= self.imdb_rating <= max_rating
+
+        return mask, search_matches
+
+    def _seek(self, matches, sort, after):
+        """Drop the rows of ``matches`` at or before the cursor ``after``"""
+        value, row_id = after
+        keys = self.sort_keys[sort][matches]
+        if sort == "title_asc":
+            key = value or ""
+        else:
+            key = _cursor_key(value, descending=sort.endswith("_desc"))
+        ids = self.ids[matches]
+        # Matches are sorted by (key, id), so the rows past the cursor are a suffix
+        past = (keys > key) | ((keys == key) & (ids > row_id))
+        return matches[past.size - np.count_nonzero(past):]
+
+    def facet_counts(self, mask, names):
+        """Facet name -> Counter over the rows selected by ``mask``"""
+        counters = {}
+        for name in names:
+            if name in ("genre", "language"):
+                bitmaps = self.genre_bitmaps if name == "genre" else self.language_bitmaps
+                counts = {value: int(np.count_nonzero(mask & bitmap)) for value, bitmap in bitmaps.items()}
+                counters[name] = Counter({value: count for value, count in counts.items() if count})
+            else:
+                column = self.release_year if name == "year" else self.imdb_rating
+                values = column[mask & ~np.isnan(column)]
+                if name == "rating_bucket":
+                    values = np.floor(values)
+                keys, counts = np.unique(values, return_counts=True)
+                counters[name] = Counter({int(key): int(count) for key, count in zip(keys, counts)})
+        return counters
+
+    def query(self, search="", year=None, genres=(), genre_mode="all", language="",
+              min_rating=None, max_rating=None, sort="rating_desc", limit=60, after=None,
+              facets=()):
+        """Answer a ``list_movies`` request.
+
+        ``after`` is the decoded cursor ``(value, id)`` of the previous page's
+        last row (for ``relevance`` the value is the number of rows already
+        returned). Returns ``(rows, total_count, next_after, facet_counts)``
+        where ``next_after`` is ``None`` on the last page and
+        ``facet_counts`` maps each requested facet to a Counter over all
+        matching rows.
+        """
+        mask, search_matches = self.filter_mask(
+            search, year, genres, genre_mode, language, min_rating, max_rating
+        )
+        facet_counts = self.facet_counts(mask, facets)
+        if sort == "relevance":
+            matches = np.flatnonzero(mask)
+            if search_matches is not None:
+                rows, scores = search_matches
+                scores = scores[np.searchsorted(rows, matches)]
+                matches = matches[np.lexsort((self.ids[matches], -scores))]
+        else:
+            order = self.orders[sort]
+            matches = order[mask[order]]
+        total_count = int(matches.size)
+
+        offset = 0
+        if after is not None:
+            if sort == "relevance":
+                offset = int(after[0])
+                matches = matches[offset:]
+            else:
+                matches = self._seek(matches, sort, after)
+
+        page = matches[:limit]
+        rows = [self.rows[row] for row in page]
+
+        next_after = None
+        if matches.size > limit and rows:
+            last = rows[-1]
+            if sort == "relevance":
+                next_after = (offset + len(rows), last["id"])
+            else:
+                next_after = (last[SORT_FIELDS[sort]], last["id"])
+        return rows, total_count, next_after, facet_counts
+
+
+class CatalogEngine:
+    """Owns the current ``CatalogSnapshot`` and rebuilds it when stale"""
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.max_age = None
+        self.search_threshold = DEFAULT_SIMILARITY_THRESHOLD
+        self._version = 0
+        self._snapshot = None
+        self._lock = threading.Lock()
+        # Held by the one request rebuilding the snapshot
+        self._build_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("CATALOG_SNAPSHOT_ENABLED", True)
+        # Upper bound on staleness for writes made by other processes
+        app.config.setdefault("CATALOG_SNAPSHOT_MAX_AGE", 300)
+
+        self.enabled = bool(app.config["CATALOG_SNAPSHOT_ENABLED"]) and np is not None
+        self.max_age = app.config["CATALOG_SNAPSHOT_MAX_AGE"]
+        self.search_threshold = app.config.get("SEARCH_SIMILARITY_THRESHOLD", DEFAULT_SIMILARITY_THRESHOLD)
+
+        movie_events.install()
+        movie_events.subscribe(self._on_movies_changed)
+        app.extensions["catalog"] = self
+
+    @property
+    def version(self):
+        return self._version
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+
+    def _on_movies_changed(self, ids, fields):
+        if fields is not None and fields <= _IGNORED_FIELDS:
+            return
+        self.invalidate()
+
+    def _is_fresh(self, snapshot):
+        if snapshot is None or snapshot.version != self._version:
+            return False
+        if self.max_age is not None and time.monotonic() - snapshot.built_at > self.max_age:
+            return False
+        return True
+
+    def warm_snapshot(self):
+        """Return the current snapshot only if it is fresh; never rebuilds"""
+        snapshot = self._snapshot
+        if self.enabled and self._is_fresh(snapshot):
+            return snapshot
+        return None
+
+    def snapshot(self):
+        """Return the current snapshot, rebuilding it first if it is stale.
+
+        One request rebuilds at a time; the others keep answering from the
+        previous snapshot until it is replaced, and only wait when there is
+        none yet. Such a snapshot's ``version`` is behind ``self.version``, so
+        callers can tell their answer is stale. Must be called inside an application context. Returns
+        ``None`` when the engine is disabled.
+        """
+        if not self.enabled:
+            return None
+
+        snapshot = self._snapshot
+        if self._is_fresh(snapshot):
+            return snapshot
+
+        if not self._build_lock.acquire(blocking=snapshot is None):
+            return snapshot  # another request is rebuilding
+        try:
+            with self._lock:
+                snapshot = self._snapshot
+                if self._is_fresh(snapshot):
+                    return snapshot
+                version = self._version
+            sequence = movie_events.sequence()
+
+            movies = Movie.query.options(defer(Movie.synopsis)).order_by(Movie.id).all()
+            snapshot = CatalogSnapshot(movies, version, sequence, self.search_threshold)
+
+            with self._lock:
+                self._snapshot = snapshot
+            return snapshot
+        finally:
+            self._build_lock.release()
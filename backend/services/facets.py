@@ -0,0 +1,223 @@
+"""Precomputed filter facets for ``GET /movies/filters``.
+
+The store keeps per-value counts for genre, release year and language, plus a
+count per rating value (so the rating range survives deletes), and the
+encoded ``/movies/filters`` response body with its ETag.
+
+It is maintained incrementally: ``services.movie_events`` reports which
+movies changed, and on the next read only those rows are re-read and their
+old contribution swapped for the new one. Changes that don't touch a faceted
+column are ignored. Reads with nothing pending return the cached body as-is.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy import Integer, case, cast, func
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Movie, db, parse_genres
+from services import movie_events
+
+
+# Facets list_movies can count alongside its results
+FACET_NAMES = ("genre", "year", "language", "rating_bucket")
+
+FACET_FIELDS = frozenset({"genre", "genre_links", "release_year", "language", "imdb_rating"})
+
+SORT_OPTIONS = [
+    {"value": "rating_desc", "label": "Rating: High to Low"},
+    {"value": "rating_asc", "label": "Rating: Low to High"},
+    {"value": "year_desc", "label": "Year: Newest First"},
+    {"value": "year_asc", "label": "Year: Oldest First"},
+    {"value": "title_asc", "label": "Title: A to Z"},
+    {"value": "popular_desc", "label": "Most Saved"},
+    {"value": "likes_desc", "label": "Most Liked"},
+    {"value": "community_rating_desc", "label": "Community Rating"}
+]
+
+_COLUMNS = (Movie.id, Movie.genre, Movie.release_year, Movie.language, Movie.imdb_rating)
+
+
+def _facet_values(row):
+    """(genres, year, language, rating) contributed by one movie row"""
+    return (tuple(parse_genres(row.genre)), row.release_year, row.language or None, row.imdb_rating)
+
+
+def _counted(counter, reverse=False):
+    return [{"value": value, "count": count} for value, count in sorted(counter.items(), reverse=reverse)]
+
+
+def parse_facet_names(value):
+    """Known facet names from a comma separated ``facets=`` parameter"""
+    names = [name.strip().lower() for name in (value or "").split(",")]
+    return [name for name in FACET_NAMES if name in names]
+
+
+def format_facet_counts(counters):
+    """Facet name -> Counter, as the ``facets`` object of a response.
+
+    Years and rating buckets (the integer part of the rating) are listed
+    highest first, genres and languages alphabetically.
+    """
+    return {
+        name: _counted(counter, reverse=name in ("year", "rating_bucket"))
+        for name, counter in counters.items()
+    }
+
+
+def sql_facet_counts(query, names):
+    """Count ``names`` facets over a filtered ``Movie`` query in one grouped pass"""
+    columns = {
+        "genre": Movie.genre,
+        "year": Movie.release_year,
+        "language": Movie.language,
+        # Rounded down like the snapshot's buckets (a plain cast rounds on
+        # PostgreSQL); NULLs skip floor(), which SQLAlchemy's SQLite shim rejects
+        "rating_bucket": case(
+            (Movie.imdb_rating.isnot(None), cast(func.floor(Movie.imdb_rating), Integer))
+        ),
+    }
+    group = [columns[name] for name in names]
+    counters = {name: Counter() for name in names}
+    if not group:
+        return counters
+
+    rows = query.order_by(None).with_entities(*group, func.count()).group_by(*group).all()
+    for row in rows:
+        count = row[-1]
+        for name, value in zip(names, row):
+            if value is None or value == "":
+                continue
+            if name == "genre":
+                for genre in parse_genres(value):
+                    counters[name][genre] += count
+            else:
+                counters[name][value] += count
+    return counters
+
+
+class FacetStore:
+    """Incrementally maintained facet counts and the encoded filters payload"""
+
+    def __init__(self, app=None):
+        self.max_age = None
+        self._lock = threading.Lock()
+        self._rows = None
+        self._pending = set()
+        self._rebuild = True
+        self._built_at = 0.0
+        self._payload = None
+        self.genres = Counter()
+        self.years = Counter()
+        self.languages = Counter()
+        self.ratings = Counter()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # Upper bound on staleness for writes made by other processes
+        app.config.setdefault("FACETS_MAX_AGE", 300)
+        self.max_age = app.config["FACETS_MAX_AGE"]
+
+        movie_events.install()
+        movie_events.subscribe(self._on_movies_changed)
+        app.extensions["facets"] = self
+
+    def _on_movies_changed(self, ids, fields):
+        if fields is not None and not (fields & FACET_FIELDS):
+            return
+        with self._lock:
+            if ids is None:
+                self._rebuild = True
+            else:
+                self._pending.update(ids)
+
+    def _apply(self, values, sign):
+        genres, year, language, rating = values
+        for genre in genres:
+            self.genres[genre] += sign
+        if year:
+            self.years[year] += sign
+        if language:
+            self.languages[language] += sign
+        if rating is not None:
+            self.ratings[rating] += sign
+
+    def _load_all(self):
+        self._rows = {}
+        self.genres, self.years, self.languages, self.ratings = Counter(), Counter(), Counter(), Counter()
+        for row in db.session.query(*_COLUMNS):
+            values = _facet_values(row)
+            self._rows[row.id] = values
+            self._apply(values, 1)
+        self._built_at = time.monotonic()
+
+    def _load_changed(self, ids):
+        current = {row.id: row for row in db.session.query(*_COLUMNS).filter(Movie.id.in_(ids))}
+        for movie_id in ids:
+            old = self._rows.pop(movie_id, None)
+            if old is not None:
+                self._apply(old, -1)
+            if movie_id in current:
+                values = _facet_values(current[movie_id])
+                self._rows[movie_id] = values
+                self._apply(values, 1)
+
+        # Drop values whose count fell to zero
+        for counter in (self.genres, self.years, self.languages, self.ratings):
+            for value in [value for value, count in counter.items() if count <= 0]:
+                del counter[value]
+
+    def _encode(self):
+        ratings = list(self.ratings)
+        min_rating = min(ratings) if ratings else 0.0
+        max_rating = max(ratings) if ratings else 10.0
+        data = {
+            "genres": sorted(self.genres),
+            "years": sorted(self.years, reverse=True),
+            "languages": sorted(self.languages),
+            "rating_range": {
+                "min": round(min_rating, 1),
+                "max": round(max_rating, 1)
+            },
+            "facets": {
+                "genre": _counted(self.genres),
+                "year": _counted(self.years, reverse=True),
+                "language": _counted(self.languages),
+            },
+            "sort_options": SORT_OPTIONS
+        }
+        body = json.dumps(data, separators=(",", ":")).encode()
+        return body, hashlib.sha1(body).hexdigest()
+
+    def _is_stale(self):
+        if self._rebuild or self._pending or self._payload is None:
+            return True
+        return self.max_age is not None and time.monotonic() - self._built_at > self.max_age
+
+    def payload(self):
+        """Return ``(body, etag)`` for ``/movies/filters``.
+
+        Must be called inside an application context.
+        """
+        if not self._is_stale():
+            return self._payload
+
+        with self._lock:
+            if self._rebuild or self._rows is None or (
+                    self.max_age is not None and time.monotonic() - self._built_at > self.max_age):
+                self._rebuild = False
+                self._pending.clear()
+                self._load_all()
+            elif self._pending:
+                ids, self._pending = self._pending, set()
+                self._load_changed(ids)
+            self._payload = self._encode()
+            return self._payload
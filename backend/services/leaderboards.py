@@ -0,0 +1,246 @@
+"""Top-N leaderboards per genre, language and release year for ``GET /movies/top``.
+
+Each board holds the best rated movies of one genre, language or year, in
+``rating_desc`` order (IMDb rating, then id), capped at ``LEADERBOARD_SIZE``
+entries. Serving a board is a slice of an in-memory list, so its cost depends
+on ``n`` and not on the size of the catalog. Movies without a rating are not
+ranked.
+
+Boards are built with one scan of the movies table on first use and then
+maintained incrementally like ``services.facets``: ``services.movie_events``
+reports changed movies, and on the next read only those rows are re-read, so
+a new or re-rated movie moves within, enters or leaves its boards without a
+rebuild. A board that held every movie of its value is exact at any length;
+one that was truncated may shrink below ``n`` when members leave it, and is
+then refilled with one indexed query.
+
+Full rebuilds (bulk changes, ``LEADERBOARD_MAX_AGE``) scan outside the lock on
+one request thread at a time and swap the new boards in when done; other
+requests keep serving the previous boards meanwhile.
+"""
+
+import threading
+import time
+from bisect import bisect_left, insort
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Movie, MovieGenre, db, parse_genres
+from services import movie_events
+from services.pagination import keyset_order
+
+
+LEADERBOARD_NAMES = ("genre", "language", "year")
+
+LEADERBOARD_FIELDS = frozenset({"genre", "genre_links", "release_year", "language", "imdb_rating"})
+
+_COLUMNS = (Movie.id, Movie.genre, Movie.release_year, Movie.language, Movie.imdb_rating)
+
+
+def _board_keys(row):
+    """(name, value) of every board a movie row belongs on"""
+    keys = [("genre", genre) for genre in parse_genres(row.genre)]
+    if row.language:
+        keys.append(("language", row.language))
+    if row.release_year:
+        keys.append(("year", row.release_year))
+    return keys
+
+
+def _entry(row):
+    """Sort key of a movie on its boards, best first"""
+    return (-row.imdb_rating, row.id)
+
+
+class _Board:
+    """Sorted entries of one board; ``complete`` if no qualifying movie is left out"""
+
+    __slots__ = ("entries", "complete")
+
+    def __init__(self, entries, complete):
+        self.entries = entries
+        self.complete = complete
+
+
+class Leaderboards:
+    """Bounded, incrementally maintained top-N boards"""
+
+    def __init__(self, app=None):
+        self.size = 100
+        self.max_age = None
+        self._lock = threading.Lock()
+        # Held by the one request rebuilding every board
+        self._build_lock = threading.Lock()
+        self._building = False
+        self._boards = None
+        # Movie id -> (entry, keys of the boards it is on)
+        self._members = {}
+        self._pending = set()
+        self._rebuild = True
+        self._built_at = 0.0
+        self.refills = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # Entries kept per board, and so the largest n served
+        app.config.setdefault("LEADERBOARD_SIZE", 100)
+        # Upper bound on staleness for writes made by other processes
+        app.config.setdefault("LEADERBOARD_MAX_AGE", 300)
+        self.size = app.config["LEADERBOARD_SIZE"]
+        self.max_age = app.config["LEADERBOARD_MAX_AGE"]
+
+        movie_events.install()
+        movie_events.subscribe(self._on_movies_changed)
+        app.extensions["leaderboards"] = self
+
+    def _on_movies_changed(self, ids, fields):
+        if fields is not None and not (fields & LEADERBOARD_FIELDS):
+            return
+        with self._lock:
+            if ids is None:
+                self._rebuild = True
+            else:
+                self._pending.update(ids)
+
+    def _add_member(self, key, entry):
+        movie_id = entry[1]
+        self._members.setdefault(movie_id, (entry, set()))[1].add(key)
+
+    def _drop_member(self, key, entry):
+        movie_id = entry[1]
+        keys = self._members[movie_id][1]
+        keys.discard(key)
+        if not keys:
+            del self._members[movie_id]
+
+    def _load_all(self):
+        """Every board from one scan; returns ``(boards, members)``"""
+        grouped = {}
+        for row in db.session.query(*_COLUMNS).filter(Movie.imdb_rating.isnot(None)):
+            entry = _entry(row)
+            for key in _board_keys(row):
+                grouped.setdefault(key, []).append(entry)
+
+        boards = {}
+        members = {}
+        for key, entries in grouped.items():
+            entries.sort()
+            board = boards[key] = _Board(entries[:self.size], len(entries) <= self.size)
+            for entry in board.entries:
+                members.setdefault(entry[1], (entry, set()))[1].add(key)
+        return boards, members
+
+    def _insert(self, key, entry):
+        board = self._boards.get(key)
+        if board is None:
+            # No rated movie had this value, so the new one is the whole board
+            self._boards[key] = _Board([entry], True)
+            self._add_member(key, entry)
+            return
+        if not board.complete and (not board.entries or entry > board.entries[-1]):
+            # Ranks below the truncated part of the board, which isn't loaded
+            return
+        insort(board.entries, entry)
+        self._add_member(key, entry)
+        if len(board.entries) > self.size:
+            self._drop_member(key, board.entries.pop())
+            board.complete = False
+
+    def _load_changed(self, ids):
+        current = {
+            row.id: row
+            for row in db.session.query(*_COLUMNS).filter(Movie.id.in_(ids), Movie.imdb_rating.isnot(None))
+        }
+        for movie_id in ids:
+            old = self._members.pop(movie_id, None)
+            if old is not None:
+                entry, keys = old
+                for key in keys:
+                    entries = self._boards[key].entries
+                    del entries[bisect_left(entries, entry)]
+            if movie_id in current:
+                row = current[movie_id]
+                for key in _board_keys(row):
+                    self._insert(key, _entry(row))
+
+    def _refill(self, key):
+        """Reload a truncated board that shrank below the requested length"""
+        name, value = key
+        query = db.session.query(Movie.id, Movie.imdb_rating).filter(Movie.imdb_rating.isnot(None))
+        if name == "genre":
+            query = query.filter(Movie.id.in_(db.session.query(MovieGenre.movie_id).filter(MovieGenre.genre == value)))
+        elif name == "language":
+            query = query.filter(Movie.language == value)
+        else:
+            query = query.filter(Movie.release_year == value)
+        rows = query.order_by(*keyset_order(Movie.imdb_rating, Movie.id, True)).limit(self.size + 1).all()
+
+        board = self._boards[key]
+        for entry in board.entries:
+            self._drop_member(key, entry)
+        board.entries = [_entry(row) for row in rows[:self.size]]
+        board.complete = len(rows) <= self.size
+        for entry in board.entries:
+            self._add_member(key, entry)
+        self.refills += 1
+
+    def _needs_rebuild(self):
+        if self._rebuild or self._boards is None:
+            return True
+        return self.max_age is not None and time.monotonic() - self._built_at > self.max_age
+
+    def _rebuild_if_needed(self):
+        """Rebuild every board outside the lock if due, then swap them in"""
+        with self._lock:
+            if not self._needs_rebuild():
+                return
+            # Without boards there is nothing to serve meanwhile, so wait
+            wait = self._boards is None
+        if not self._build_lock.acquire(blocking=wait):
+            return  # another request is rebuilding
+        try:
+            with self._lock:
+                if not self._needs_rebuild():
+                    return
+                self._rebuild = False
+                # Changes from here on are re-read after the swap
+                self._pending.clear()
+                self._building = True
+            built_at = time.monotonic()
+            try:
+                boards, members = self._load_all()
+            except Exception:
+                with self._lock:
+                    self._rebuild = True
+                raise
+            with self._lock:
+                self._boards, self._members, self._built_at = boards, members, built_at
+        finally:
+            with self._lock:
+                self._building = False
+            self._build_lock.release()
+
+    def top(self, name, value, n):
+        """Ids and ratings of the ``n`` best rated movies whose ``name`` is ``value``.
+
+        ``n`` is capped at ``LEADERBOARD_SIZE``. Must be called inside an
+        application context.
+        """
+        n = min(n, self.size)
+        key = (name, value)
+        self._rebuild_if_needed()
+        with self._lock:
+            # During a rebuild, changes wait for the new boards
+            if self._pending and not self._building:
+                ids, self._pending = self._pending, set()
+                self._load_changed(ids)
+
+            board = self._boards.get(key)
+            if board is None:
+                return []
+            if len(board.entries) < n and not board.complete:
+                self._refill(key)
+            return [(movie_id, -negative_rating) for negative_rating, movie_id in board.entries[:n]]
@@ -0,0 +1,185 @@
+"""Likes, with batched per-movie counters.
+
+A like is one row in ``likes`` (``INSERT ... ON CONFLICT DO NOTHING``), so the
+per-user write never touches the movie row. ``Movie.like_count`` is not
+updated in the liking transaction: committed likes and unlikes are summed per
+movie in ``LikeCounter`` and written with one ``UPDATE`` for all pending
+movies every ``LIKE_FLUSH_INTERVAL`` seconds (or once ``LIKE_FLUSH_MAX_PENDING``
+movies are waiting). A burst of thousands of likes on one title becomes a
+single increment instead of thousands of writers queueing on its row lock.
+
+Flushes run on a background thread, started by the first like, with their
+own connection, and once more at interpreter exit; a failed flush is logged
+and its deltas are retried with the next one, so no request ever waits on or
+fails with it. Counts lag by up to the flush interval; deltas still pending
+when a process is killed are lost, and ``reconcile_like_counts()``
+recomputes the counters from the likes table.
+"""
+
+import atexit
+import threading
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import case, delete, event, func, insert, select, update
+from sqlalchemy.orm import Session
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Like, Movie, db
+from services import movie_events
+from services.upsert import supports_returning, upsert_insert
+
+
+_PENDING_KEY = "like_deltas"
+
+
+def _record(movie_id, delta):
+    db.session.info.setdefault(_PENDING_KEY, Counter())[movie_id] += delta
+
+
+def like_movie(user_id, movie_id):
+    """Like a movie; return ``False`` if the user already liked it"""
+    likes = Like.__table__
+    values = {"user_id": user_id, "movie_id": movie_id, "created_at": datetime.utcnow()}
+    dialect_insert = upsert_insert()
+    if dialect_insert is not None:
+        added = db.session.scalar(
+            dialect_insert(likes).values(**values)
+            .on_conflict_do_nothing(index_elements=["user_id", "movie_id"])
+            .returning(likes.c.id)
+        ) is not None
+    else:
+        added = db.session.scalar(
+            select(likes.c.id).where(likes.c.user_id == user_id, likes.c.movie_id == movie_id)
+        ) is None
+        if added:
+            db.session.execute(insert(likes).values(**values))
+    if added:
+        _record(movie_id, 1)
+    return added
+
+
+def unlike_movie(user_id, movie_id):
+    """Remove a like; return ``False`` if the user had not liked the movie"""
+    likes = Like.__table__
+    statement = delete(likes).where(likes.c.user_id == user_id, likes.c.movie_id == movie_id)
+    if supports_returning():
+        removed = db.session.scalar(statement.returning(likes.c.id)) is not None
+    else:
+        removed = db.session.execute(statement).rowcount > 0
+    if removed:
+        _record(movie_id, -1)
+    return removed
+
+
+def reconcile_like_counts():
+    """Recompute every drifted ``Movie.like_count``; return how many changed.
+
+    Does not commit.
+    """
+    movies = Movie.__table__
+    likes = Like.__table__
+    actual = select(func.count(likes.c.id)).where(likes.c.movie_id == movies.c.id).scalar_subquery()
+    result = db.session.execute(update(movies).where(movies.c.like_count != actual).values(like_count=actual))
+    movie_events.mark_changed(db.session, None, {"like_count"})
+    return result.rowcount
+
+
+class LikeCounter:
+    """Accumulates committed like deltas and flushes them in batches"""
+
+    def __init__(self, app=None):
+        self.flush_interval = 1.0
+        self.max_pending = 1000
+        self._app = None
+        self._pending = Counter()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        # Set to flush before the interval is up
+        self._wake = threading.Event()
+        self._thread = None
+        self.flushes = 0
+        self.failures = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("LIKE_FLUSH_INTERVAL", 1.0)
+        app.config.setdefault("LIKE_FLUSH_MAX_PENDING", 1000)
+        self.flush_interval = app.config["LIKE_FLUSH_INTERVAL"]
+        self.max_pending = app.config["LIKE_FLUSH_MAX_PENDING"]
+        self._app = app
+
+        event.listen(Session, "after_commit", self._after_commit)
+        event.listen(Session, "after_soft_rollback", self._after_rollback)
+        atexit.register(self._flush_logged)
+        app.extensions["like_counter"] = self
+
+    def _after_commit(self, session):
+        deltas = session.info.pop(_PENDING_KEY, None)
+        if not deltas:
+            return
+        with self._lock:
+            self._pending.update(deltas)
+            if self._thread is None:
+                # Started on the first like, so only processes that take likes run one
+                self._thread = threading.Thread(target=self._run, name="like-counter", daemon=True)
+                self._thread.start()
+            if len(self._pending) >= self.max_pending:
+                self._wake.set()
+
+    def _after_rollback(self, session, previous_transaction):
+        session.info.pop(_PENDING_KEY, None)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._flush_logged()
+
+    def _flush_logged(self):
+        """Flush from the timer thread or at exit, logging instead of raising"""
+        if not self._pending:
+            return
+        with self._app.app_context():
+            try:
+                self.flush()
+            except Exception as exc:
+                self.failures += 1
+                self._app.logger.error("Could not flush like counts, will retry: %s", exc)
+
+    def flush(self):
+        """Write every pending delta with one UPDATE; return the movies updated.
+
+        On a database error the deltas are kept for the next flush and the
+        error is raised.
+        """
+        if not self._flush_lock.acquire(blocking=False):
+            return 0  # another thread is flushing
+        try:
+            with self._lock:
+                deltas = {movie_id: delta for movie_id, delta in self._pending.items() if delta}
+                self._pending = Counter()
+            if not deltas:
+                return 0
+
+            movies = Movie.__table__
+            try:
+                with db.engine.begin() as connection:
+                    connection.execute(
+                        update(movies)
+                        .where(movies.c.id.in_(sorted(deltas)))
+                        .values(like_count=movies.c.like_count + case(deltas, value=movies.c.id, else_=0))
+                    )
+            except Exception:
+                with self._lock:
+                    self._pending.update(deltas)
+                raise
+            self.flushes += 1
+            movie_events.publish(set(deltas), {"like_count"})
+            return len(deltas)
+        finally:
+            self._flush_lock.release()
@@ -0,0 +1,161 @@
+"""Per-user watchlist membership for ``GET /watchlist/status``.
+
+The first status check for a user loads the ids of every movie on their
+watchlist into a set; later checks are set lookups. The sets are kept current
+from ``services.watchlist_ops`` commits, so the add, remove and batch routes
+update them instead of dropping them. The sets are frozensets replaced on
+every change, so a caller can keep iterating the one it was handed.
+
+Users are kept in LRU order and the coldest are evicted once the estimated
+size of all sets exceeds ``WATCHLIST_MEMBERSHIP_MAX_BYTES``. Entries are
+reloaded after ``WATCHLIST_MEMBERSHIP_TTL`` seconds to bound staleness from
+writes made by other processes.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Watchlist, db
+from services import watchlist_ops
+
+
+# Approximate size of one int object referenced from a set
+_ID_BYTES = sys.getsizeof(10 ** 6)
+
+
+def _estimate_size(movie_ids):
+    return sys.getsizeof(movie_ids) + _ID_BYTES * len(movie_ids)
+
+
+class _Entry:
+    __slots__ = ("movie_ids", "loaded_at", "size")
+
+    def __init__(self, movie_ids, loaded_at):
+        self.movie_ids = movie_ids
+        self.loaded_at = loaded_at
+        self.size = _estimate_size(movie_ids)
+
+
+class WatchlistMembership:
+    """LRU cache of ``user_id -> frozenset of watchlisted movie ids``"""
+
+    def __init__(self, app=None):
+        self.ttl = 300
+        self.max_bytes = 16 * 1024 * 1024
+        self._entries = OrderedDict()
+        self._bytes = 0
+        # Users with loads in flight -> count, and those written to meanwhile
+        self._loading = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("WATCHLIST_MEMBERSHIP_TTL", 300)
+        app.config.setdefault("WATCHLIST_MEMBERSHIP_MAX_BYTES", 16 * 1024 * 1024)
+        self.ttl = app.config["WATCHLIST_MEMBERSHIP_TTL"]
+        self.max_bytes = app.config["WATCHLIST_MEMBERSHIP_MAX_BYTES"]
+
+        watchlist_ops.subscribe(self._on_watchlist_changed)
+        app.extensions["watchlist_membership"] = self
+
+    def _on_watchlist_changed(self, user_id, added, removed, version):
+        with self._lock:
+            if user_id in self._loading:
+                self._dirty.add(user_id)
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return
+            entry.movie_ids = (entry.movie_ids | added) - removed
+            self._resize(entry)
+
+    def _resize(self, entry):
+        size = _estimate_size(entry.movie_ids)
+        self._bytes += size - entry.size
+        entry.size = size
+        self._evict_over_budget()
+
+    def _evict_over_budget(self):
+        while self._bytes > self.max_bytes and self._entries:
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
+            self.evictions += 1
+
+    def invalidate(self, user_id=None):
+        """Forget one user's set, or every set when ``user_id`` is None"""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+                self._bytes = 0
+                self._dirty.update(self._loading)
+            else:
+                entry = self._entries.pop(user_id, None)
+                if entry is not None:
+                    self._bytes -= entry.size
+                if user_id in self._loading:
+                    self._dirty.add(user_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "users": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def movie_ids(self, user_id):
+        """Frozenset of the movie ids on the user's watchlist.
+
+        Must be called inside an application context.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and now - entry.loaded_at <= self.ttl:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry.movie_ids
+            self.misses += 1
+            self._loading[user_id] = self._loading.get(user_id, 0) + 1
+
+        try:
+            movie_ids = frozenset(db.session.scalars(
+                db.select(Watchlist.movie_id).where(Watchlist.user_id == user_id)
+            ))
+        finally:
+            with self._lock:
+                stale = user_id in self._dirty
+                self._loading[user_id] -= 1
+                if not self._loading[user_id]:
+                    del self._loading[user_id]
+                    self._dirty.discard(user_id)
+
+        with self._lock:
+            # Don't keep a set that a concurrent commit may have made stale
+            if not stale:
+                old = self._entries.pop(user_id, None)
+                if old is not None:
+                    self._bytes -= old.size
+                entry = _Entry(movie_ids, now)
+                if entry.size <= self.max_bytes:
+                    self._entries[user_id] = entry
+                    self._bytes += entry.size
+                    self._evict_over_budget()
+        return movie_ids
+
+    def status(self, user_id, movie_ids):
+        """``{movie_id: in watchlist}`` for each of ``movie_ids``"""
+        members = self.movie_ids(user_id)
+        return {movie_id: movie_id in members for movie_id in movie_ids}
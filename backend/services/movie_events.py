@@ -0,0 +1,135 @@
+"""Change notifications for the movies table.
+
+In-process caches built from ``Movie`` rows subscribe here and are told about
+every committed change. A subscriber is called with two arguments:
+
+- ``ids``: the set of changed movie ids, or ``None`` when the change cannot be
+  attributed to individual rows (bulk ``Movie.query.delete()``, raw updates).
+- ``fields``: the set of changed column names, or ``None`` for inserts,
+  deletes and bulk statements (treat as "anything may have changed").
+
+Notifications are only sent after a successful commit; rolled back changes
+are discarded.
+
+``sequence()`` counts the notifications published so far. A reader that takes
+it before loading movie rows can later tell whether a movie changed after the
+load (its notification came later) and so may have been read stale.
+"""
+
+import threading
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Movie
+
+
+_PENDING_KEY = "movie_changes"
+_subscribers = []
+_installed = False
+_sequence = 0
+_sequence_lock = threading.Lock()
+
+
+def subscribe(callback):
+    """Register ``callback(ids, fields)`` to run after Movie changes commit"""
+    _subscribers.append(callback)
+    return callback
+
+
+def sequence():
+    """Number of changes published so far"""
+    return _sequence
+
+
+def publish(ids=None, fields=None):
+    """Notify every subscriber immediately"""
+    global _sequence
+    with _sequence_lock:
+        _sequence += 1
+    for callback in list(_subscribers):
+        callback(ids, fields)
+
+
+def mark_changed(session, ids=None, fields=None):
+    """Queue a change on ``session`` to be published when it commits.
+
+    Used by code that updates the movies table with Core statements, which
+    the ORM mapper events below do not see.
+    """
+    pending = session.info.get(_PENDING_KEY)
+    if pending is None:
+        session.info[_PENDING_KEY] = {
+            "ids": set(ids) if ids is not None else None,
+            "fields": set(fields) if fields is not None else None,
+        }
+        return
+
+    if ids is None or pending["ids"] is None:
+        pending["ids"] = None
+    else:
+        pending["ids"].update(ids)
+
+    if fields is None or pending["fields"] is None:
+        pending["fields"] = None
+    else:
+        pending["fields"].update(fields)
+
+
+def _changed_columns(target):
+    state = inspect(target)
+    return {attr.key for attr in state.attrs if attr.history.has_changes()}
+
+
+def _after_insert(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        mark_changed(session, [target.id], None)
+
+
+def _after_update(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        mark_changed(session, [target.id], _changed_columns(target))
+
+
+def _after_delete(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        mark_changed(session, [target.id], None)
+
+
+def _do_orm_execute(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ is Movie:
+        mark_changed(orm_execute_state.session, None, None)
+
+
+def _after_commit(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending is not None:
+        publish(pending["ids"], pending["fields"])
+
+
+def _after_rollback(session, previous_transaction):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def install():
+    """Attach the SQLAlchemy listeners (idempotent)"""
+    global _installed
+    if _installed:
+        return
+    event.listen(Movie, "after_insert", _after_insert)
+    event.listen(Movie, "after_update", _after_update)
+    event.listen(Movie, "after_delete", _after_delete)
+    event.listen(Session, "do_orm_execute", _do_orm_execute)
+    event.listen(Session, "after_commit", _after_commit)
+    event.listen(Session, "after_soft_rollback", _after_rollback)
+    _installed = True
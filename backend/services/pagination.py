@@ -0,0 +1,86 @@
+"""Keyset (cursor) pagination helpers.
+
+A page is requested with an opaque ``cursor`` token that records the sort key
+and id of the last row the client saw. The next page seeks past that row with
+a ``WHERE`` on the sort column instead of an OFFSET, so deep pages cost the
+same as the first one.
+
+Rows are ordered by ``(sort column, id)``. NULL sort values are ordered as
+larger than any other value, which is PostgreSQL's default (NULLS LAST for
+ascending, NULLS FIRST for descending sorts); the ORDER BY produced here
+spells that out so other databases agree.
+"""
+
+import base64
+import json
+import math
+
+from sqlalchemy import and_, or_
+
+
+def _is_integer(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_number_or_null(value):
+    if value is None or _is_integer(value):
+        return True
+    return isinstance(value, float) and math.isfinite(value)
+
+
+def _is_text_or_null(value):
+    return value is None or isinstance(value, str)
+
+
+# Sort -> check on a cursor's value; sorts not listed are on numeric columns
+_VALUE_CHECKS = {
+    # Relevance pages carry an offset into the ranked results
+    "relevance": lambda value: _is_integer(value) and value >= 0,
+    "title_asc": _is_text_or_null,
+    # ISO timestamps, parsed by the watchlist route
+    "added_desc": _is_text_or_null,
+    "added_asc": _is_text_or_null,
+}
+
+
+def encode_cursor(sort, value, row_id):
+    """Opaque token for the row ``(value, row_id)`` under ``sort``"""
+    payload = json.dumps([sort, value, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token, sort):
+    """Return ``(value, row_id)`` from a token; raise ``ValueError`` if invalid"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        cursor_sort, value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (TypeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+    if cursor_sort != sort or not _is_integer(row_id):
+        raise ValueError("Cursor does not match the requested sort")
+    if not _VALUE_CHECKS.get(sort, _is_number_or_null)(value):
+        raise ValueError("Invalid cursor")
+    return value, row_id
+
+
+def keyset_order(column, id_column, descending=False):
+    """ORDER BY clauses for ``(column, id)`` with PostgreSQL NULL placement"""
+    if descending:
+        return [column.desc().nulls_first(), id_column.asc()]
+    return [column.asc().nulls_last(), id_column.asc()]
+
+
+def keyset_after(column, id_column, value, row_id, descending=False):
+    """WHERE criterion selecting rows after ``(value, row_id)`` in ``keyset_order``"""
+    if value is None:
+        after_null = and_(column.is_(None), id_column > row_id)
+        if descending:
+            return or_(after_null, column.isnot(None))
+        return after_null
+
+    past_value = column < value if descending else column > value
+    criterion = or_(past_value, and_(column == value, id_column > row_id))
+    if not descending:
+        criterion = or_(criterion, column.is_(None))
+    return criterion
@@ -0,0 +1,176 @@
+"""Bcrypt hashing on a bounded worker pool with admission control.
+
+Hashing and verifying a password costs tens to hundreds of milliseconds of
+CPU. Running it on the request thread lets a burst of logins occupy every
+worker and stall the catalog endpoints behind it. ``PasswordHasher`` runs it
+on ``PASSWORD_HASH_WORKERS`` threads (the bcrypt backend releases the GIL)
+instead, and admits at most ``PASSWORD_HASH_QUEUE_DEPTH`` operations at a
+time, counting running and queued ones, and none whose estimated wait
+exceeds ``PASSWORD_HASH_TIMEOUT``. Beyond that ``hash()`` and ``verify()``
+raise ``HasherBusy`` at once so the route can answer 503 with a
+``Retry-After`` estimate.
+
+The request thread still waits for its own result, for at most
+``PASSWORD_HASH_TIMEOUT`` seconds. Keep the queue depth below the number of
+request threads the server runs, so a login storm cannot hold all of them.
+
+New hashes use ``BCRYPT_ROUNDS``. ``verify()`` also reports a replacement hash
+when a correct password was stored with a different number of rounds, so
+raising the cost factor upgrades users as they log in.
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from passlib.hash import bcrypt
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing queue is full; ``retry_after`` is in seconds"""
+
+    def __init__(self, retry_after):
+        super().__init__("Password hashing queue is full")
+        self.retry_after = retry_after
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _milliseconds(seconds):
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+class PasswordHasher:
+    """Bounded executor for bcrypt hash and verify operations"""
+
+    def __init__(self, app=None):
+        self.rounds = 12
+        self.workers = 2
+        self.queue_depth = 8
+        self.timeout = 2.0
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.rehashed = 0
+        # Recent (queue wait, run time) pairs in seconds
+        self._latencies = deque(maxlen=1000)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("BCRYPT_ROUNDS", 12)
+        app.config.setdefault("PASSWORD_HASH_WORKERS", 2)
+        # Running plus queued operations admitted before failing fast; below
+        # the server's request thread count
+        app.config.setdefault("PASSWORD_HASH_QUEUE_DEPTH", 8)
+        # Longest a request waits for its result
+        app.config.setdefault("PASSWORD_HASH_TIMEOUT", 2.0)
+        self.rounds = app.config["BCRYPT_ROUNDS"]
+        self.workers = app.config["PASSWORD_HASH_WORKERS"]
+        self.queue_depth = app.config["PASSWORD_HASH_QUEUE_DEPTH"]
+        self.timeout = app.config["PASSWORD_HASH_TIMEOUT"]
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        app.extensions["password_hasher"] = self
+
+    def _backlog_seconds(self, operations):
+        """Estimated time for the workers to finish ``operations``"""
+        runs = [run for _, run in self._latencies]
+        average = sum(runs) / len(runs) if runs else 0.25
+        return operations * average / self.workers
+
+    def _retry_after(self):
+        """Seconds until the current backlog should have drained"""
+        return max(1, math.ceil(self._backlog_seconds(self._in_flight)))
+
+    def _run(self, function, *args):
+        with self._lock:
+            # Turn away work that would only time out after holding the request thread
+            if self._in_flight >= self.queue_depth or self._backlog_seconds(self._in_flight + 1) > self.timeout:
+                self.rejected += 1
+                raise HasherBusy(self._retry_after())
+            self._in_flight += 1
+
+        submitted = time.perf_counter()
+
+        def task():
+            started = time.perf_counter()
+            try:
+                return function(*args)
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    self._in_flight -= 1
+                    self.completed += 1
+                    self._latencies.append((started - submitted, finished - started))
+
+        future = self._executor.submit(task)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            # The task still runs to completion and releases its slot
+            with self._lock:
+                self.timeouts += 1
+                raise HasherBusy(self._retry_after())
+
+    def _hash(self, password):
+        return bcrypt.using(rounds=self.rounds).hash(password)
+
+    def _verify(self, password, password_hash):
+        try:
+            valid = bcrypt.verify(password, password_hash)
+        except ValueError:
+            # Not a bcrypt hash
+            return False, None
+        if valid and bcrypt.from_string(password_hash).rounds != self.rounds:
+            return True, self._hash(password)
+        return valid, None
+
+    def hash(self, password):
+        """Bcrypt hash of ``password`` with ``BCRYPT_ROUNDS`` rounds"""
+        return self._run(self._hash, password)
+
+    def verify(self, password, password_hash):
+        """Return ``(valid, new_hash)``.
+
+        ``new_hash`` is a replacement for ``password_hash`` when the password
+        is valid but was hashed with different rounds, otherwise ``None``.
+        """
+        valid, new_hash = self._run(self._verify, password, password_hash)
+        if new_hash is not None:
+            with self._lock:
+                self.rehashed += 1
+        return valid, new_hash
+
+    def stats(self):
+        with self._lock:
+            waits = [wait for wait, _ in self._latencies]
+            runs = [run for _, run in self._latencies]
+            return {
+                "rounds": self.rounds,
+                "workers": self.workers,
+                "queue_depth": self.queue_depth,
+                "in_flight": self._in_flight,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "rehashed": self.rehashed,
+                "wait_ms": {
+                    "p50": _milliseconds(_percentile(waits, 0.5)),
+                    "p95": _milliseconds(_percentile(waits, 0.95)),
+                },
+                "hash_ms": {
+                    "p50": _milliseconds(_percentile(runs, 0.5)),
+                    "p95": _milliseconds(_percentile(runs, 0.95)),
+                },
+            }
+
@@ -0,0 +1,224 @@
+"""Token-bucket rate limiting for CPU-heavy endpoints.
+
+Limits are configured per blueprint or endpoint in ``RATE_LIMITS``::
+
+    app.config["RATE_LIMITS"] = {
+        "auth.login": [{"by": "ip", "limit": 10, "period": 60}],
+        "movies.list_movies": [{"by": "user", "limit": 60, "period": 60, "burst": 20, "when": "search"}],
+        "auth": [{"by": "ip", "limit": 100, "period": 60}],   # every auth route
+    }
+
+Each rule is a bucket of ``burst`` tokens (default ``limit``) refilled at
+``limit`` per ``period`` seconds, kept per client IP (``by: ip``) or per JWT
+identity (``by: user``, falling back to the IP for anonymous requests). A
+rule with ``when`` only applies to requests carrying that query parameter.
+A request over any matching rule gets 429 with ``Retry-After`` and
+``RateLimit-Limit``/``RateLimit-Remaining``/``RateLimit-Reset`` headers; the
+body's message is under the key the blueprint's own errors use.
+Admitted requests carry the headers of their tightest rule.
+
+Buckets are stored GCRA style: one float per key, the time at which the
+bucket will be full again. A check is one dictionary read and one write,
+with no lock; two concurrent requests on the same key may occasionally
+both take the last token. A key whose bucket has refilled carries no state,
+so idle keys are swept every ``RATE_LIMIT_SWEEP_INTERVAL`` seconds, and the
+table is capped at ``RATE_LIMIT_MAX_KEYS``.
+
+Set ``RATE_LIMIT_STORAGE_URL`` to a ``redis://`` URL to share buckets between
+processes; this needs the ``redis`` package and applies the same algorithm
+atomically in a Lua script.
+"""
+
+import math
+import time
+
+from flask import g, jsonify, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - optional shared backend
+    redis = None
+
+
+# Blueprints whose error bodies use "message" rather than "error"
+_MESSAGE_KEYS = {"auth": "message", "user": "message"}
+
+DEFAULT_RATE_LIMITS = {
+    "auth.login": [{"by": "ip", "limit": 10, "period": 60}],
+    "auth.register": [{"by": "ip", "limit": 5, "period": 60}],
+    "movies.list_movies": [{"by": "user", "limit": 60, "period": 60, "burst": 20, "when": "search"}],
+}
+
+
+class _Rule:
+    __slots__ = ("name", "by", "limit", "burst", "interval", "when")
+
+    def __init__(self, name, index, by="ip", limit=60, period=60, burst=None, when=None):
+        if by not in ("ip", "user"):
+            raise ValueError(f"RATE_LIMITS[{name!r}]: by must be ip or user")
+        self.name = f"{name}:{index}"
+        self.by = by
+        self.limit = limit
+        self.burst = burst or limit
+        # Seconds to earn one token
+        self.interval = period / limit
+        self.when = when
+
+
+class MemoryBackend:
+    """Bucket state in a process-local dict of ``key -> time when full``"""
+
+    def __init__(self, max_keys, sweep_interval):
+        self.max_keys = max_keys
+        self.sweep_interval = sweep_interval
+        self._full_at = {}
+        self._swept_at = time.monotonic()
+        self.evictions = 0
+
+    def hit(self, key, interval, burst, now):
+        """Take a token; return ``(allowed, remaining, full_in, retry_after)``"""
+        full_at = max(self._full_at.get(key, now), now) + interval
+        allowed_at = full_at - interval * burst
+        if now < allowed_at:
+            return False, 0, full_at - interval - now, allowed_at - now
+        self._full_at[key] = full_at
+        if len(self._full_at) > self.max_keys or now - self._swept_at > self.sweep_interval:
+            self.sweep(now)
+        return True, int((now - allowed_at) / interval), full_at - now, 0.0
+
+    def sweep(self, now):
+        """Drop keys whose bucket has refilled, then the fullest beyond ``max_keys``"""
+        self._swept_at = now
+        for key, full_at in list(self._full_at.items()):
+            if full_at <= now:
+                self._full_at.pop(key, None)
+                self.evictions += 1
+        # Leave headroom so a flood of new keys doesn't sweep on every hit
+        if len(self._full_at) > self.max_keys:
+            excess = len(self._full_at) - self.max_keys * 3 // 4
+            for key, _ in sorted(self._full_at.items(), key=lambda item: item[1])[:excess]:
+                self._full_at.pop(key, None)
+                self.evictions += 1
+
+
+class RedisBackend:
+    """Bucket state shared between processes in Redis"""
+
+    _SCRIPT = """
+    local now = tonumber(ARGV[1])
+    local interval = tonumber(ARGV[2])
+    local burst = tonumber(ARGV[3])
+    local full_at = math.max(tonumber(redis.call("GET", KEYS[1]) or now), now) + interval
+    local allowed_at = full_at - interval * burst
+    if now < allowed_at then
+        return {0, tostring(full_at - interval - now), tostring(allowed_at - now)}
+    end
+    redis.call("SET", KEYS[1], tostring(full_at), "PX", math.ceil((full_at - now) * 1000))
+    return {1, tostring(full_at - now), tostring(now - allowed_at)}
+    """
+
+    def __init__(self, url):
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(self._SCRIPT)
+
+    def hit(self, key, interval, burst, now):
+        # Redis server time keeps processes with skewed clocks consistent
+        seconds, microseconds = self._client.time()
+        now = seconds + microseconds / 1e6
+        allowed, full_in, other = self._script(keys=[f"rate_limit:{key}"], args=[now, interval, burst])
+        if allowed:
+            return True, int(float(other) / interval), float(full_in), 0.0
+        return False, 0, float(full_in), float(other)
+
+
+class RateLimiter:
+    """Applies ``RATE_LIMITS`` to matching requests before they are dispatched"""
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self._rules = {}
+        self._backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("RATE_LIMIT_ENABLED", True)
+        app.config.setdefault("RATE_LIMITS", DEFAULT_RATE_LIMITS)
+        # Shared backend, e.g. redis://localhost:6379/0; in-process when unset
+        app.config.setdefault("RATE_LIMIT_STORAGE_URL", None)
+        app.config.setdefault("RATE_LIMIT_MAX_KEYS", 100000)
+        app.config.setdefault("RATE_LIMIT_SWEEP_INTERVAL", 60)
+        self.enabled = app.config["RATE_LIMIT_ENABLED"]
+        self._rules = {
+            name: [_Rule(name, index, **rule) for index, rule in enumerate(rules)]
+            for name, rules in app.config["RATE_LIMITS"].items()
+        }
+
+        url = app.config["RATE_LIMIT_STORAGE_URL"]
+        if url and redis is not None:
+            self._backend = RedisBackend(url)
+        else:
+            if url:
+                app.logger.warning("redis is not installed; rate limits are kept per process")
+            self._backend = MemoryBackend(app.config["RATE_LIMIT_MAX_KEYS"], app.config["RATE_LIMIT_SWEEP_INTERVAL"])
+
+        app.before_request(self._check)
+        app.after_request(self._add_headers)
+        app.extensions["rate_limiter"] = self
+
+    def _rules_for_request(self):
+        rules = self._rules.get(request.endpoint, []) + self._rules.get(request.blueprint, [])
+        return [rule for rule in rules if rule.when is None or request.args.get(rule.when)]
+
+    @staticmethod
+    def _client_key(rule):
+        if rule.by == "user":
+            try:
+                verify_jwt_in_request(optional=True)
+                identity = get_jwt_identity()
+            except Exception:
+                # Invalid tokens are rejected by the route itself
+                identity = None
+            if identity is not None:
+                return f"user:{identity}"
+        return f"ip:{request.remote_addr}"
+
+    @staticmethod
+    def _headers(rule, remaining, full_in):
+        return {
+            "RateLimit-Limit": str(rule.burst),
+            "RateLimit-Remaining": str(remaining),
+            "RateLimit-Reset": str(math.ceil(full_in)),
+        }
+
+    def _check(self):
+        if not self.enabled or request.method == "OPTIONS":
+            return None
+        rules = self._rules_for_request()
+        if not rules:
+            return None
+
+        now = time.monotonic()
+        tightest = None
+        for rule in rules:
+            allowed, remaining, full_in, retry_after = self._backend.hit(
+                f"{rule.name}:{self._client_key(rule)}", rule.interval, rule.burst, now
+            )
+            if not allowed:
+                message_key = _MESSAGE_KEYS.get(request.blueprint, "error")
+                response = jsonify({message_key: "Too many requests", "retry_after": math.ceil(retry_after)})
+                response.status_code = 429
+                response.headers.update(self._headers(rule, 0, full_in))
+                response.headers["Retry-After"] = str(math.ceil(retry_after))
+                return response
+            if tightest is None or remaining < tightest[1]:
+                tightest = (rule, remaining, full_in)
+        g.rate_limit_headers = self._headers(*tightest)
+        return None
+
+    def _add_headers(self, response):
+        headers = g.pop("rate_limit_headers", None)
+        if headers:
+            response.headers.update(headers)
+        return response
@@ -0,0 +1,138 @@
+"""User ratings and the per-movie aggregates kept alongside them.
+
+``Movie.rating_count``, ``rating_sum``, ``rating_mean`` and
+``community_score`` are adjusted in the same transaction as each rating
+write, with one ``UPDATE`` of the movie row. Reads never aggregate the
+ratings table.
+
+``community_score`` is a Bayesian average: the movie's ratings plus
+``RATING_PRIOR_WEIGHT`` imaginary votes of ``RATING_PRIOR_MEAN``. A movie with
+a handful of perfect scores doesn't outrank one with hundreds of good ones,
+and the score is a plain indexed column, so ``community_rating_desc`` is a
+keyset sort like ``rating_desc``.
+
+The functions here do not commit. ``reconcile_rating_aggregates()``
+recomputes the aggregates from the ratings table to correct drift (e.g.
+ratings removed by deleting a user).
+"""
+
+from datetime import datetime
+
+from sqlalchemy import case, delete, func, insert, select, update
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Movie, Rating, RATING_PRIOR_MEAN, RATING_PRIOR_WEIGHT, db
+from services import movie_events
+from services.upsert import supports_returning, upsert_insert
+
+
+MIN_SCORE = 1
+MAX_SCORE = 10
+
+AGGREGATE_FIELDS = frozenset({"rating_count", "rating_sum", "rating_mean", "community_score"})
+
+
+def _aggregate_values(count, total):
+    """Column values for a movie with ``count`` ratings summing to ``total``"""
+    return {
+        "rating_count": count,
+        "rating_sum": total,
+        "rating_mean": case((count > 0, total / func.nullif(count, 0)), else_=None),
+        "community_score": (RATING_PRIOR_WEIGHT * RATING_PRIOR_MEAN + total) / (RATING_PRIOR_WEIGHT + count),
+    }
+
+
+def _adjust_aggregates(movie_id, count_delta, sum_delta):
+    movies = Movie.__table__
+    count = movies.c.rating_count + count_delta
+    total = movies.c.rating_sum + sum_delta
+    db.session.execute(update(movies).where(movies.c.id == movie_id).values(**_aggregate_values(count, total)))
+    movie_events.mark_changed(db.session, [movie_id], AGGREGATE_FIELDS)
+
+
+def validate_score(value):
+    """The score as a float; raises ``ValueError`` unless it is 1-10"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError("score must be a number")
+    if not MIN_SCORE <= value <= MAX_SCORE:
+        raise ValueError(f"score must be between {MIN_SCORE} and {MAX_SCORE}")
+    return float(value)
+
+
+def rate_movie(user_id, movie_id, score):
+    """Insert or update the user's rating; return the previous score or ``None``"""
+    ratings = Rating.__table__
+    now = datetime.utcnow()
+    previous = db.session.scalar(
+        select(ratings.c.score)
+        .where(ratings.c.user_id == user_id, ratings.c.movie_id == movie_id)
+        .with_for_update()
+    )
+
+    if previous is None:
+        values = {"user_id": user_id, "movie_id": movie_id, "score": score, "created_at": now, "updated_at": now}
+        dialect_insert = upsert_insert()
+        if dialect_insert is None:
+            db.session.execute(insert(ratings).values(**values))
+            _adjust_aggregates(movie_id, 1, score)
+            return None
+        inserted = db.session.scalar(
+            dialect_insert(ratings).values(**values)
+            .on_conflict_do_nothing(index_elements=["user_id", "movie_id"])
+            .returning(ratings.c.id)
+        )
+        if inserted is not None:
+            _adjust_aggregates(movie_id, 1, score)
+            return None
+        # A concurrent request inserted it first; update that row instead
+        previous = db.session.scalar(
+            select(ratings.c.score)
+            .where(ratings.c.user_id == user_id, ratings.c.movie_id == movie_id)
+            .with_for_update()
+        )
+
+    db.session.execute(
+        update(ratings)
+        .where(ratings.c.user_id == user_id, ratings.c.movie_id == movie_id)
+        .values(score=score, updated_at=now)
+    )
+    if score != previous:
+        _adjust_aggregates(movie_id, 0, score - previous)
+    return previous
+
+
+def remove_rating(user_id, movie_id):
+    """Delete the user's rating; return the removed score or ``None``"""
+    ratings = Rating.__table__
+    statement = delete(ratings).where(ratings.c.user_id == user_id, ratings.c.movie_id == movie_id)
+    if supports_returning():
+        previous = db.session.scalar(statement.returning(ratings.c.score))
+    else:
+        previous = db.session.scalar(
+            select(ratings.c.score).where(ratings.c.user_id == user_id, ratings.c.movie_id == movie_id)
+        )
+        db.session.execute(statement)
+    if previous is not None:
+        _adjust_aggregates(movie_id, -1, -previous)
+    return previous
+
+
+def reconcile_rating_aggregates():
+    """Recompute every movie's rating aggregates from the ratings table.
+
+    Does not commit.
+    """
+    movies = Movie.__table__
+    ratings = Rating.__table__
+    count = func.coalesce(
+        select(func.count(ratings.c.id)).where(ratings.c.movie_id == movies.c.id).scalar_subquery(), 0
+    )
+    total = func.coalesce(
+        select(func.sum(ratings.c.score)).where(ratings.c.movie_id == movies.c.id).scalar_subquery(), 0.0
+    )
+    result = db.session.execute(update(movies).values(**_aggregate_values(count, total)))
+    movie_events.mark_changed(db.session, None, AGGREGATE_FIELDS)
+    return result.rowcount
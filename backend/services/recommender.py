@@ -0,0 +1,570 @@
+"""Item-to-item recommendations from the watchlist table.
+
+Every ``(user, movie)`` watchlist row is a 1 in a sparse user x movie matrix
+``X``. ``X.T @ X`` gives, for each pair of movies, how many users saved both;
+dividing by the movies' save counts turns that into cosine
+(``co / sqrt(n_i * n_j)``) or Jaccard (``co / (n_i + n_j - co)``) similarity.
+Only the ``RECOMMENDER_NEIGHBORS`` most similar movies are kept per movie,
+as two dense ``(movies, K)`` arrays.
+
+Recommending for a user gathers the neighbor rows of the movies on their
+watchlist, sums the similarities per candidate with one ``np.bincount``,
+drops what they already saved and takes the top N: a few thousand array
+operations regardless of catalog size. Users without a watchlist (or whose
+movies have no neighbors) get the most saved movies instead.
+
+The model is updated incrementally. It keeps the watchlist it has counted
+for every user together with that watchlist's version. Committed watchlist
+writes (``services.watchlist_ops``) are queued as deltas with the user's
+version after the write; the next reader replays each add/remove against the
+co-occurrence and save counts without a query, which costs O(watchlist size)
+per movie. Neighbor rows touched by an update are recomputed lazily, from
+that movie's own counts, when a recommendation needs them.
+
+Writes at or below a user's counted version are skipped. A write that does
+not follow on from it (an earlier one was committed by another process, or
+its notification has not arrived yet) is held, and that user's watchlist and
+version are reloaded in one statement and counted as a diff. A rebuild reads
+every watchlist together with each user's version the same way. Writes
+replayed into the old model while a rebuild runs are queued again for the
+new one, so the result matches an exact rebuild at any interleaving.
+
+The counts are saved to ``RECOMMENDER_STATE_PATH`` (at most every
+``RECOMMENDER_SAVE_INTERVAL`` seconds) and reloaded on startup. An exact
+rebuild from the full table runs every ``RECOMMENDER_MAX_AGE`` seconds to
+correct drift from writes made by other processes or while the server was
+down. NumPy and SciPy are optional; without them only the popularity fallback
+is served.
+"""
+
+import tempfile
+import threading
+import time
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+    sparse = None
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Movie, User, Watchlist, db
+from services import watchlist_ops
+
+
+SIMILARITIES = ("cosine", "jaccard")
+
+# Strategies reported with recommendations
+ITEM_SIMILARITY = "item_similarity"
+POPULAR = "popular"
+
+
+def _popular_movie_ids(limit):
+    """Most saved movies, then best rated"""
+    return [
+        movie_id for (movie_id,) in db.session.query(Movie.id)
+        .order_by(Movie.watchlist_count.desc(), Movie.imdb_rating.desc().nulls_last(), Movie.id)
+        .limit(limit)
+    ]
+
+
+def _scan_watchlists(user_ids=None):
+    """``(user_id, movie_id)`` watchlist pairs and ``{user_id: watchlist_version}``.
+
+    Every user's, or only those of ``user_ids``. Read in one statement, so the
+    versions describe exactly the pairs.
+    """
+    rows = (
+        db.session.query(User.id, User.watchlist_version, Watchlist.movie_id)
+        .outerjoin(Watchlist, Watchlist.user_id == User.id)
+    )
+    if user_ids is not None:
+        rows = rows.filter(User.id.in_(sorted(user_ids)))
+    pairs = []
+    versions = {}
+    for user_id, version, movie_id in rows:
+        versions[user_id] = version
+        if movie_id is not None:
+            pairs.append((user_id, movie_id))
+    return pairs, versions
+
+
+def _group_pairs(pairs):
+    """``{user_id: frozenset of movie ids}`` from ``(user_id, movie_id)`` pairs"""
+    watchlists = {}
+    for user_id, movie_id in pairs:
+        watchlists.setdefault(user_id, set()).add(movie_id)
+    return {user_id: frozenset(movie_ids) for user_id, movie_ids in watchlists.items()}
+
+
+def _write_state(path, state):
+    """Write ``ItemSimilarityModel.state()`` arrays to ``path`` atomically"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # A private temporary file, so processes and threads saving at once don't collide
+    with tempfile.NamedTemporaryFile(dir=directory or ".", suffix=".tmp.npz", delete=False) as temporary:
+        try:
+            np.savez(temporary, **state)
+        except BaseException:
+            os.remove(temporary.name)
+            raise
+    os.replace(temporary.name, path)
+
+
+def _similarity(counts, degrees, other_degrees, similarity):
+    if similarity == "jaccard":
+        return counts / (degrees + other_degrees - counts)
+    return counts / np.sqrt(degrees * other_degrees)
+
+
+def top_k_neighbors(co, degrees, k, similarity="cosine"):
+    """Top-``k`` neighbor indices and similarities per item.
+
+    ``co`` is the sparse item x item co-occurrence matrix and ``degrees`` the
+    number of users per item. Returns ``(indices, scores)``, both of shape
+    ``(items, k)``; unused slots hold index -1 and score 0.
+    """
+    co = sparse.coo_matrix(co)
+    keep = co.row != co.col
+    rows, cols, counts = co.row[keep], co.col[keep], co.data[keep].astype(np.float64)
+    scores = _similarity(counts, degrees[rows], degrees[cols], similarity)
+
+    # Sort by row, best score first (ties by lower index), then rank within row
+    order = np.lexsort((cols, -scores, rows))
+    rows, cols, scores = rows[order], cols[order], scores[order]
+    n_items = len(degrees)
+    starts = np.searchsorted(rows, np.arange(n_items))
+    ranks = np.arange(len(rows)) - starts[rows]
+    keep = ranks < k
+
+    indices = np.full((n_items, k), -1, dtype=np.int32)
+    neighbor_scores = np.zeros((n_items, k), dtype=np.float32)
+    indices[rows[keep], ranks[keep]] = cols[keep]
+    neighbor_scores[rows[keep], ranks[keep]] = scores[keep]
+    return indices, neighbor_scores
+
+
+class ItemSimilarityModel:
+    """Co-occurrence counts and top-K neighbor lists, updatable in place.
+
+    Not thread safe; ``Recommender`` serializes access.
+    """
+
+    def __init__(self, movie_ids, co, degrees, k, similarity, popular, built_at=None,
+                 versions=None, watchlists=None):
+        self.k = k
+        self.similarity = similarity
+        self.popular = popular
+        self.built_at = time.time() if built_at is None else built_at
+        # user_id -> watchlist_version and frozenset of movie ids in the counts
+        self.versions = dict(versions or {})
+        self.watchlists = dict(watchlists or {})
+
+        self.movie_ids = [int(movie_id) for movie_id in movie_ids]
+        self.column = {movie_id: index for index, movie_id in enumerate(self.movie_ids)}
+        self.degrees = np.asarray(degrees, dtype=np.float64)
+
+        co = sparse.csr_matrix(co)
+        co.setdiag(0)
+        co.eliminate_zeros()
+        # Per movie column: {other column: users who saved both}
+        self.co = [
+            dict(zip(co.indices[start:end].tolist(), co.data[start:end].astype(int).tolist()))
+            for start, end in zip(co.indptr[:-1], co.indptr[1:])
+        ]
+        self.neighbors, self.scores = top_k_neighbors(co, self.degrees, k, similarity)
+        self._dirty = set()
+
+    @classmethod
+    def from_pairs(cls, pairs, k, similarity, popular, versions=None):
+        """Exact model from ``(user_id, movie_id)`` watchlist pairs at ``versions``"""
+        user_ids = np.fromiter((user_id for user_id, _ in pairs), dtype=np.int64, count=len(pairs))
+        movie_ids = np.fromiter((movie_id for _, movie_id in pairs), dtype=np.int64, count=len(pairs))
+        movie_ids, columns = np.unique(movie_ids, return_inverse=True)
+        _, rows = np.unique(user_ids, return_inverse=True)
+
+        matrix = sparse.csr_matrix(
+            (np.ones(len(pairs), dtype=np.float32), (rows, columns)),
+            shape=(rows.max() + 1 if len(pairs) else 0, len(movie_ids)),
+        )
+        matrix.data[:] = 1  # duplicate pairs count once
+        degrees = np.asarray(matrix.sum(axis=0)).ravel()
+        return cls(movie_ids, matrix.T @ matrix, degrees, k, similarity, popular,
+                   versions=versions, watchlists=_group_pairs(pairs))
+
+    @classmethod
+    def load(cls, path, k, similarity, popular):
+        """Model from counts written by ``save()``; ``None`` for an older file format"""
+        with np.load(path) as state:
+            if "watchlist_users" not in state:
+                return None
+            movie_ids = state["movie_ids"]
+            co = sparse.coo_matrix(
+                (state["co_counts"], (state["co_rows"], state["co_cols"])),
+                shape=(len(movie_ids), len(movie_ids)),
+            )
+            versions = dict(zip(state["version_users"].tolist(), state["version_values"].tolist()))
+            watchlists = _group_pairs(zip(state["watchlist_users"].tolist(), state["watchlist_movies"].tolist()))
+            return cls(movie_ids, co, state["degrees"], k, similarity, popular, float(state["built_at"]),
+                       versions, watchlists)
+
+    def state(self):
+        """Copies of the counts as arrays, for ``save()``"""
+        rows = [row for row, others in enumerate(self.co) for _ in others]
+        cols = [col for others in self.co for col in others]
+        counts = [count for others in self.co for count in others.values()]
+        return {
+            "movie_ids": np.array(self.movie_ids, dtype=np.int64),
+            "degrees": self.degrees[:len(self.movie_ids)].copy(),
+            "co_rows": np.array(rows, dtype=np.int32),
+            "co_cols": np.array(cols, dtype=np.int32),
+            "co_counts": np.array(counts, dtype=np.int32),
+            "built_at": np.float64(self.built_at),
+            "version_users": np.fromiter(self.versions.keys(), dtype=np.int64, count=len(self.versions)),
+            "version_values": np.fromiter(self.versions.values(), dtype=np.int64, count=len(self.versions)),
+            "watchlist_users": np.array(
+                [user_id for user_id, movie_ids in self.watchlists.items() for _ in movie_ids], dtype=np.int64
+            ),
+            "watchlist_movies": np.array(
+                [movie_id for movie_ids in self.watchlists.values() for movie_id in movie_ids], dtype=np.int64
+            ),
+        }
+
+    def save(self, path):
+        """Write the counts to ``path`` (an ``.npz`` file) atomically"""
+        _write_state(path, self.state())
+
+    def _column_for(self, movie_id):
+        column = self.column.get(movie_id)
+        if column is not None:
+            return column
+        column = len(self.movie_ids)
+        self.movie_ids.append(movie_id)
+        self.column[movie_id] = column
+        self.co.append({})
+        if column >= len(self.degrees):
+            # Grow the arrays geometrically
+            capacity = max(16, 2 * len(self.degrees))
+            degrees = np.zeros(capacity)
+            neighbors = np.full((capacity, self.k), -1, dtype=np.int32)
+            scores = np.zeros((capacity, self.k), dtype=np.float32)
+            degrees[:len(self.degrees)] = self.degrees
+            neighbors[:len(self.neighbors)] = self.neighbors
+            scores[:len(self.scores)] = self.scores
+            self.degrees, self.neighbors, self.scores = degrees, neighbors, scores
+        return column
+
+    def _count_pairs(self, column, others, delta):
+        for other in others:
+            for a, b in ((column, other), (other, column)):
+                count = self.co[a].get(b, 0) + delta
+                if count > 0:
+                    self.co[a][b] = count
+                else:
+                    self.co[a].pop(b, None)
+        self.degrees[column] += delta
+        # Every similarity involving this movie changed with its save count
+        self._dirty.add(column)
+        self._dirty.update(self.co[column])
+        self._dirty.update(others)
+
+    def apply(self, saved_before, added, removed):
+        """Replay one user's write given their watchlist before it"""
+        saved = {self._column_for(movie_id) for movie_id in saved_before}
+        for movie_id in removed:
+            column = self._column_for(movie_id)
+            if column in saved:
+                saved.discard(column)
+                self._count_pairs(column, saved, -1)
+        for movie_id in added:
+            column = self._column_for(movie_id)
+            if column not in saved:
+                self._count_pairs(column, saved, 1)
+                saved.add(column)
+
+    def sync(self, user_id, saved, version):
+        """Count the user's watchlist as ``saved`` at ``version``"""
+        before = self.watchlists.get(user_id, frozenset())
+        self.apply(before, saved - before, before - saved)
+        if saved:
+            self.watchlists[user_id] = frozenset(saved)
+        else:
+            self.watchlists.pop(user_id, None)
+        self.versions[user_id] = version
+
+    def apply_write(self, user_id, version, added, removed):
+        """Replay a committed write; ``False`` if it does not follow the counted version.
+
+        Writes the counts already include are skipped.
+        """
+        counted = self.versions.get(user_id, 0)
+        if version <= counted:
+            return True
+        if version - len(added) - len(removed) != counted:
+            return False
+        self.sync(user_id, (self.watchlists.get(user_id, frozenset()) | added) - removed, version)
+        return True
+
+    def _refresh(self, columns):
+        for column in columns:
+            others = self.co[column]
+            self.neighbors[column] = -1
+            self.scores[column] = 0
+            if others:
+                cols = np.fromiter(others.keys(), dtype=np.int64, count=len(others))
+                counts = np.fromiter(others.values(), dtype=np.float64, count=len(others))
+                scores = _similarity(counts, self.degrees[column], self.degrees[cols], self.similarity)
+                top = np.lexsort((cols, -scores))[:self.k]
+                self.neighbors[column, :len(top)] = cols[top]
+                self.scores[column, :len(top)] = scores[top]
+            self._dirty.discard(column)
+
+    def similarity_matrix(self):
+        """Sparse movie x movie matrix of the kept neighbor similarities"""
+        self._refresh(list(self._dirty))
+        n_items = len(self.movie_ids)
+        neighbors, scores = self.neighbors[:n_items], self.scores[:n_items]
+        rows, slots = np.nonzero(neighbors >= 0)
+        return sparse.csr_matrix(
+            (scores[rows, slots], (rows, neighbors[rows, slots])), shape=(n_items, n_items)
+        )
+
+    def recommend_many(self, watchlists, limit, block_size=1024):
+        """``recommend()`` for many users at once with sparse matrix products.
+
+        ``watchlists`` is a list of saved movie id sets; returns one result
+        list per watchlist.
+        """
+        similarity = self.similarity_matrix()
+        n_items = len(self.movie_ids)
+        results = []
+        for start in range(0, len(watchlists), block_size):
+            block = watchlists[start:start + block_size]
+            rows, cols = [], []
+            for row, saved_ids in enumerate(block):
+                columns = [self.column[movie_id] for movie_id in saved_ids if movie_id in self.column]
+                rows.extend([row] * len(columns))
+                cols.extend(columns)
+            saved = sparse.csr_matrix(
+                (np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(len(block), n_items)
+            )
+            totals = (saved @ similarity).toarray()
+            totals[rows, cols] = 0
+
+            k = min(limit, n_items)
+            top = np.argpartition(-totals, k - 1, axis=1)[:, :k] if k else np.zeros((len(block), 0), dtype=int)
+            for row in range(len(block)):
+                candidates = top[row][totals[row, top[row]] > 0]
+                candidates = candidates[np.lexsort((candidates, -totals[row, candidates]))]
+                results.append([(self.movie_ids[index], float(totals[row, index])) for index in candidates])
+        return results
+
+    def recommend(self, saved_ids, limit):
+        """``[(movie_id, score)]`` best first for a user who saved ``saved_ids``"""
+        columns = [self.column[movie_id] for movie_id in saved_ids if movie_id in self.column]
+        if not columns:
+            return []
+        self._refresh(self._dirty.intersection(columns))
+
+        neighbors = self.neighbors[columns].ravel()
+        scores = self.scores[columns].ravel()
+        valid = neighbors >= 0
+        totals = np.bincount(neighbors[valid], weights=scores[valid], minlength=len(self.movie_ids))
+        totals[columns] = 0
+
+        candidates = np.flatnonzero(totals)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-totals[candidates], limit - 1)[:limit]]
+        candidates = candidates[np.lexsort((candidates, -totals[candidates]))]
+        return [(self.movie_ids[index], float(totals[index])) for index in candidates]
+
+
+class Recommender:
+    """Owns the ``ItemSimilarityModel``, keeps it current and serves recommendations"""
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.k = 50
+        self.similarity = "cosine"
+        self.max_age = 3600
+        self.state_path = None
+        self.save_interval = 60
+        self.max_pending = 10000
+        self._model = None
+        self._pending = []
+        # Writes drained while a rebuild reads the table, to replay into the new model
+        self._build_log = None
+        self._rebuild = False
+        self._saved_at = 0.0
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("RECOMMENDER_NEIGHBORS", 50)
+        app.config.setdefault("RECOMMENDER_SIMILARITY", "cosine")
+        # Seconds between exact rebuilds from the watchlist table
+        app.config.setdefault("RECOMMENDER_MAX_AGE", 3600)
+        app.config.setdefault("RECOMMENDER_STATE_PATH", os.path.join(app.instance_path, "recommender_state.npz"))
+        app.config.setdefault("RECOMMENDER_SAVE_INTERVAL", 60)
+        # More queued writes than this trigger a rebuild instead of a replay
+        app.config.setdefault("RECOMMENDER_MAX_PENDING", 10000)
+
+        if app.config["RECOMMENDER_SIMILARITY"] not in SIMILARITIES:
+            raise ValueError(f"RECOMMENDER_SIMILARITY must be one of {', '.join(SIMILARITIES)}")
+        self.enabled = np is not None
+        self.k = app.config["RECOMMENDER_NEIGHBORS"]
+        self.similarity = app.config["RECOMMENDER_SIMILARITY"]
+        self.max_age = app.config["RECOMMENDER_MAX_AGE"]
+        self.state_path = app.config["RECOMMENDER_STATE_PATH"]
+        self.save_interval = app.config["RECOMMENDER_SAVE_INTERVAL"]
+        self.max_pending = app.config["RECOMMENDER_MAX_PENDING"]
+
+        watchlist_ops.subscribe(self._on_watchlist_changed)
+        app.extensions["recommender"] = self
+
+    def _on_watchlist_changed(self, user_id, added, removed, version):
+        with self._lock:
+            if len(self._pending) < self.max_pending:
+                self._pending.append((user_id, version, added, removed))
+            else:
+                self._pending.clear()
+                self._rebuild = True
+
+    def invalidate(self):
+        """Rebuild from the watchlist table on the next read"""
+        with self._lock:
+            self._rebuild = True
+
+    def _needs_rebuild(self, model):
+        return self._rebuild or (self.max_age is not None and time.time() - model.built_at > self.max_age)
+
+    def _load_or_build(self, from_disk):
+        popular = _popular_movie_ids(self.k * 10)
+        if from_disk and self.state_path and os.path.exists(self.state_path):
+            model = ItemSimilarityModel.load(self.state_path, self.k, self.similarity, popular)
+            if model is not None and not self._needs_rebuild(model):
+                return model, False
+        pairs, versions = _scan_watchlists()
+        return ItemSimilarityModel.from_pairs(pairs, self.k, self.similarity, popular, versions), True
+
+    def _replace_model(self, blocking):
+        if not self._build_lock.acquire(blocking=blocking):
+            return  # another request is rebuilding; keep serving the old model
+        state = None
+        try:
+            with self._lock:
+                self._build_log = []
+            model, rebuilt = self._load_or_build(from_disk=self._model is None)
+            with self._lock:
+                # The new model skips whatever its version watermark already counts
+                self._pending = self._build_log + self._pending
+                self._build_log = None
+                if rebuilt:
+                    self._rebuild = False
+                self._model = model
+                if rebuilt:
+                    state = self._state_to_save(force=True)
+        finally:
+            with self._lock:
+                self._build_log = None
+            self._build_lock.release()
+        if state is not None:
+            _write_state(self.state_path, state)
+
+    def _drain(self):
+        """Replay queued writes; return the users whose writes are held.
+
+        Writes that don't follow on from the counted version stay queued.
+        The caller holds ``self._lock``.
+        """
+        events, self._pending = self._pending, []
+        if self._build_log is not None:
+            self._build_log.extend(events)
+        for event in sorted(events, key=lambda event: event[:2]):
+            if not self._model.apply_write(*event):
+                self._pending.append(event)
+        return {user_id for user_id, *_ in self._pending}
+
+    def _resync(self, user_ids):
+        """Recount the watchlists of ``user_ids`` from the table.
+
+        Must be called inside an application context, without ``self._lock``.
+        """
+        pairs, versions = _scan_watchlists(user_ids)
+        watchlists = _group_pairs(pairs)
+        with self._lock:
+            for user_id, version in versions.items():
+                if version > self._model.versions.get(user_id, 0):
+                    self._model.sync(user_id, watchlists.get(user_id, frozenset()), version)
+            # Writes of deleted users never follow on from anything
+            self._pending = [event for event in self._pending if event[0] in versions]
+            self._drain()
+
+    def _state_to_save(self, force=False):
+        """Model arrays to write when a save is due; the caller holds ``self._lock``"""
+        if not self.state_path or not (force or time.monotonic() - self._saved_at > self.save_interval):
+            return None
+        self._saved_at = time.monotonic()
+        return self._model.state()
+
+    def model(self):
+        """The current model with queued writes applied; ``None`` when disabled.
+
+        Must be called inside an application context.
+        """
+        if not self.enabled:
+            return None
+
+        model = self._model
+        if model is None or self._needs_rebuild(model):
+            self._replace_model(blocking=model is None)
+
+        state = None
+        held = None
+        with self._lock:
+            if self._pending:
+                held = self._drain()
+                state = self._state_to_save()
+            model = self._model
+        if held:
+            self._resync(held)
+        if state is not None:
+            # Written outside the lock; the arrays are copies
+            _write_state(self.state_path, state)
+        return model
+
+    def popular(self, limit):
+        model = self.model()
+        if model is not None and len(model.popular) >= limit:
+            return model.popular
+        return _popular_movie_ids(limit)
+
+    def exact_model(self):
+        """A fresh exact model built from the whole watchlist table.
+
+        Must be called inside an application context. ``None`` when disabled.
+        """
+        if not self.enabled:
+            return None
+        pairs, versions = _scan_watchlists()
+        return ItemSimilarityModel.from_pairs(pairs, self.k, self.similarity, _popular_movie_ids(self.k * 10), versions)
+
+    def recommend(self, saved_ids, limit):
+        """Return ``(strategy, [(movie_id, score)])`` for a user's saved movies"""
+        model = self.model()
+        results = []
+        if model is not None and saved_ids:
+            with self._lock:
+                results = model.recommend(saved_ids, limit)
+        if results:
+            return ITEM_SIMILARITY, results
+
+        popular = [movie_id for movie_id in self.popular(limit + len(saved_ids)) if movie_id not in saved_ids]
+        return POPULAR, [(movie_id, None) for movie_id in popular[:limit]]
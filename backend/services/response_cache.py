@@ -0,0 +1,243 @@
+"""Response cache for public GET endpoints.
+
+Registered on a blueprint, the cache stores successful GET response bodies
+under a key built from the endpoint, path and canonicalized query string, so
+``?sort=rating_desc&genre=Action`` and ``?genre=action&sort=rating_desc``
+share an entry. Entries expire after ``RESPONSE_CACHE_TTL`` seconds and the
+least recently used ones are evicted once the stored bodies exceed
+``RESPONSE_CACHE_MAX_BYTES``.
+
+Every cached response carries a strong ETag; a request whose If-None-Match
+matches gets a 304 without a body. All entries are dropped whenever a
+``Movie`` row is inserted, updated or deleted (``services.movie_events``),
+except for counter and rating aggregate updates: those drop only the
+responses of endpoints about a single movie (a ``movie_id`` URL argument,
+e.g. ``GET /movies/<id>``) for the changed ids. Lists and the
+``popular_desc``, ``likes_desc`` and ``community_rating_desc`` orders may lag
+by up to ``RESPONSE_CACHE_TTL`` rather than flushing the cache on every save,
+like or rating.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, g, request
+
+from services import movie_events
+
+
+# Query parameters the routes read case-insensitively (and strip); every
+# other name and value is part of the key exactly as sent, since e.g.
+# language=Telugu and language=telugu filter differently
+CASE_INSENSITIVE_ARGS = frozenset({"search", "genre", "genre_mode", "facets", "by"})
+
+# Movie columns whose changes alone keep cached responses other than those
+# of the changed movies
+_VOLATILE_FIELDS = frozenset({
+    "watchlist_count", "like_count", "rating_count", "rating_sum", "rating_mean", "community_score",
+})
+
+# Response headers replayed from the cache
+_STORED_HEADERS = ("Content-Type", "Cache-Control")
+
+
+def exempt(view):
+    """Mark a view on a cached blueprint as never cached"""
+    view._response_cache_exempt = True
+    return view
+
+
+def skip():
+    """Keep this request's response out of the cache, e.g. when it was
+    computed from data already known to be out of date"""
+    g.pop("response_cache_key", None)
+
+
+class _Entry:
+    __slots__ = ("body", "headers", "etag", "expires_at", "size", "movie_id")
+
+    def __init__(self, body, headers, etag, expires_at, key, movie_id):
+        self.body = body
+        self.headers = headers
+        self.etag = etag
+        self.expires_at = expires_at
+        self.size = len(body) + len(key)
+        self.movie_id = movie_id
+
+
+class ResponseCache:
+    """LRU + TTL cache of encoded responses with ETag revalidation"""
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.ttl = 60
+        self.max_bytes = 32 * 1024 * 1024
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._generation = 0
+        # Movie id -> keys of the cached single-movie responses
+        self._by_movie = {}
+        # Bumped when single-movie responses are dropped
+        self._movie_generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+        self.invalidations = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("RESPONSE_CACHE_ENABLED", True)
+        app.config.setdefault("RESPONSE_CACHE_TTL", 60)
+        app.config.setdefault("RESPONSE_CACHE_MAX_BYTES", 32 * 1024 * 1024)
+
+        self.enabled = bool(app.config["RESPONSE_CACHE_ENABLED"])
+        self.ttl = app.config["RESPONSE_CACHE_TTL"]
+        self.max_bytes = app.config["RESPONSE_CACHE_MAX_BYTES"]
+
+        movie_events.install()
+        movie_events.subscribe(self._on_movies_changed)
+        app.extensions["response_cache"] = self
+
+    def register(self, blueprint):
+        """Cache the GET endpoints of ``blueprint``"""
+        blueprint.before_request(self._serve)
+        blueprint.after_request(self._store)
+
+    def _on_movies_changed(self, ids, fields):
+        if fields is not None and fields <= _VOLATILE_FIELDS:
+            self.invalidate_movies(ids)
+            return
+        self.invalidate()
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_movie.clear()
+            self._bytes = 0
+            self._generation += 1
+            self.invalidations += 1
+
+    def invalidate_movies(self, ids=None):
+        """Drop the single-movie responses of ``ids``, or of every movie when None"""
+        with self._lock:
+            self._movie_generation += 1
+            movie_ids = list(self._by_movie) if ids is None else ids
+            for movie_id in movie_ids:
+                for key in list(self._by_movie.get(movie_id, ())):
+                    self._evict(key)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "not_modified": self.not_modified,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    @staticmethod
+    def cache_key():
+        """Endpoint, path and query args with parameter order normalized.
+
+        Only the values of ``CASE_INSENSITIVE_ARGS`` are case folded.
+        """
+        args = []
+        for key, value in request.args.items(multi=True):
+            if key in CASE_INSENSITIVE_ARGS:
+                value = value.strip().lower()
+            args.append((key, value))
+        query = "&".join(f"{key}={value}" for key, value in sorted(args))
+        return f"{request.endpoint}|{request.path}|{query}"
+
+    def _cacheable(self):
+        if not self.enabled or request.method != "GET":
+            return False
+        view = current_app.view_functions.get(request.endpoint)
+        return view is not None and not getattr(view, "_response_cache_exempt", False)
+
+    def _serve(self):
+        if not self._cacheable():
+            return None
+
+        key = self.cache_key()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= now:
+                self._evict(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                g.response_cache_key = (key, self._generation, self._movie_generation)
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        g.response_cache_hit = True
+        response = current_app.response_class(entry.body, headers=entry.headers)
+        response.set_etag(entry.etag)
+        response.headers["X-Cache"] = "HIT"
+        response = response.make_conditional(request)
+        if response.status_code == 304:
+            with self._lock:
+                self.not_modified += 1
+        return response
+
+    def _store(self, response):
+        if g.get("response_cache_hit"):
+            return response
+
+        pending = g.pop("response_cache_key", None)
+        if pending is None or response.status_code != 200 or response.direct_passthrough:
+            return response
+
+        key, generation, movie_generation = pending
+        movie_id = (request.view_args or {}).get("movie_id")
+        body = response.get_data()
+        etag, _ = response.get_etag()
+        if etag is None:
+            etag = hashlib.sha1(body).hexdigest()
+            response.set_etag(etag)
+        headers = [(name, response.headers[name]) for name in _STORED_HEADERS if name in response.headers]
+        entry = _Entry(body, headers, etag, time.monotonic() + self.ttl, key, movie_id)
+
+        with self._lock:
+            # Skip bodies computed from data that was invalidated meanwhile
+            current = generation == self._generation and (
+                movie_id is None or movie_generation == self._movie_generation
+            )
+            if current and entry.size <= self.max_bytes:
+                if key in self._entries:
+                    self._evict(key)
+                self._entries[key] = entry
+                self._bytes += entry.size
+                if movie_id is not None:
+                    self._by_movie.setdefault(movie_id, set()).add(key)
+                while self._bytes > self.max_bytes:
+                    self._evict(next(iter(self._entries)))
+                    self.evictions += 1
+
+        response.headers["X-Cache"] = "MISS"
+        return response.make_conditional(request)
+
+    def _evict(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        if entry.movie_id is not None:
+            keys = self._by_movie[entry.movie_id]
+            keys.discard(key)
+            if not keys:
+                del self._by_movie[entry.movie_id]
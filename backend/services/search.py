@@ -0,0 +1,181 @@
+"""Title search backed by a trigram index.
+
+``Movie.title.ilike('%term%')`` cannot use the btree index on ``title``, so
+every search used to be a sequential scan. Two indexed paths replace it:
+
+- In process, ``TitleIndex`` keeps a trigram -> row positions inverted index
+  as part of the catalog snapshot (``services.catalog``). A query only
+  touches the posting lists of its own trigrams; one or two character
+  queries, which have no interior trigram, use a second index of every one
+  and two character substring.
+- On PostgreSQL, ``TitleSearch.ensure_index()`` creates the ``pg_trgm``
+  extension and a GIN index on ``movies.title`` so both ILIKE and the
+  word-similarity operator are index scans.
+
+Both paths accept a title when it contains the search term or when enough of
+the term's trigrams appear in it (small typos), and rank prefix and exact
+matches first.
+"""
+
+import re
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+from flask import current_app
+from sqlalchemy import case, func, or_, text
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Movie
+
+
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+# Fraction of the search term's trigrams a title must contain to count as a
+# fuzzy match; pg_trgm's default word_similarity_threshold, which the SQL
+# path's %> operator uses
+DEFAULT_SIMILARITY_THRESHOLD = 0.6
+
+# Queries this short are matched by substring only
+_SHORT_QUERY = 2
+
+
+def normalize(value):
+    """Lowercase ``value`` and collapse punctuation and whitespace to single spaces"""
+    return _NON_WORD.sub(" ", (value or "").lower()).strip()
+
+
+def trigrams(value):
+    """pg_trgm-style trigrams of an already normalized string"""
+    grams = set()
+    for word in value.split():
+        padded = f"  {word} "
+        for start in range(len(padded) - 2):
+            grams.add(padded[start:start + 3])
+    return grams
+
+
+class TitleIndex:
+    """Inverted trigram index over a fixed list of titles"""
+
+    def __init__(self, titles, threshold=DEFAULT_SIMILARITY_THRESHOLD):
+        self.threshold = threshold
+        self.size = len(titles)
+        self.titles = np.array([normalize(title) for title in titles], dtype=str)
+
+        postings = {}
+        short_postings = {}
+        self.gram_counts = np.zeros(self.size, dtype=np.int32)
+        for row, title in enumerate(self.titles):
+            title = str(title)
+            grams = trigrams(title)
+            self.gram_counts[row] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(row)
+            substrings = {
+                title[start:start + length]
+                for length in range(1, _SHORT_QUERY + 1)
+                for start in range(len(title) - length + 1)
+            }
+            for substring in substrings:
+                short_postings.setdefault(substring, []).append(row)
+        self.postings = {gram: np.array(rows, dtype=np.int32) for gram, rows in postings.items()}
+        self.short_postings = {part: np.array(rows, dtype=np.int32) for part, rows in short_postings.items()}
+
+    def search(self, term):
+        """``(rows, scores)`` of the titles matching ``term``, rows ascending.
+
+        Higher scores are better. Returns ``None`` when ``term`` has no
+        searchable characters.
+        """
+        query = normalize(term)
+        if not query:
+            return None
+
+        grams = trigrams(query)
+        lists = [self.postings[gram] for gram in grams if gram in self.postings]
+        gram_rows, gram_found = np.unique(np.concatenate(lists), return_counts=True) if lists else (
+            np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int64))
+
+        if len(query) <= _SHORT_QUERY:
+            # No interior trigram; the substring index holds exactly the matches
+            candidates = self.short_postings.get(query, np.zeros(0, dtype=np.int32))
+            where = np.minimum(np.searchsorted(gram_rows, candidates), max(gram_rows.size - 1, 0))
+            found = np.zeros(candidates.size, dtype=np.int64)
+            if gram_rows.size:
+                hit = gram_rows[where] == candidates
+                found[hit] = gram_found[where[hit]]
+        else:
+            candidates, found = gram_rows, gram_found
+
+        if candidates.size == 0:
+            return candidates, np.zeros(0, dtype=np.float64)
+
+        titles = self.titles[candidates]
+        position = np.char.find(titles, query)
+        contains = position >= 0
+        similarity = found / len(grams)
+        matched = contains | (similarity >= self.threshold)
+
+        # Whole-title similarity breaks ties in favour of shorter titles
+        score = similarity + found / (len(grams) + self.gram_counts[candidates] - found)
+        score += contains
+        score += position == 0
+        score += titles == query
+        return candidates[matched], score[matched]
+
+
+class TitleSearch:
+    """Creates and uses the PostgreSQL trigram index for the SQL path"""
+
+    def __init__(self, app=None):
+        self.trigram_index = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("SEARCH_SIMILARITY_THRESHOLD", DEFAULT_SIMILARITY_THRESHOLD)
+        app.extensions["title_search"] = self
+
+    def ensure_index(self, db):
+        """Create ``pg_trgm`` and the title GIN index when running on PostgreSQL.
+
+        Must be called inside an application context after ``db.create_all()``.
+        """
+        if db.engine.dialect.name != "postgresql":
+            return False
+
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                connection.execute(text(
+                    "CREATE INDEX IF NOT EXISTS ix_movies_title_trgm "
+                    "ON movies USING gin (title gin_trgm_ops)"
+                ))
+        except Exception as exc:
+            current_app.logger.warning("pg_trgm title index unavailable: %s", exc)
+            self.trigram_index = False
+        else:
+            self.trigram_index = True
+        return self.trigram_index
+
+    def filter(self, term):
+        """SQL criterion for titles matching ``term``"""
+        if self.trigram_index:
+            return or_(
+                Movie.title.ilike(f"%{term}%"),
+                Movie.title.op("%>")(term),
+            )
+        return Movie.title.ilike(f"%{term}%")
+
+    def order_by(self, term):
+        """SQL ORDER BY clauses ranking matches for ``term`` by relevance"""
+        prefix_first = case((Movie.title.ilike(f"{term}%"), 0), else_=1)
+        if self.trigram_index:
+            return [prefix_first, func.word_similarity(term, Movie.title).desc(), Movie.id]
+        return [prefix_first, Movie.title, Movie.id]
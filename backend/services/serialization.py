@@ -0,0 +1,171 @@
+"""Pre-encoded JSON fragments for movie list responses.
+
+Building a dict per movie and running it through the stdlib encoder on every
+request dominated the browse and watchlist paths. Instead, each movie's
+``to_dict()`` is encoded once and the bytes are cached by movie id; list
+responses are assembled by joining those fragments, so a cached row costs one
+dict lookup.
+
+``services.movie_events`` drops a movie's fragment whenever it changes.
+Callers pass the ``movie_events.sequence()`` they read before loading the
+rows, and a fragment is only stored if its movie has not changed since, so a
+row read just before an update is never cached as current.
+``orjson`` is used for encoding when it is installed, otherwise the stdlib
+``json`` module with compact separators.
+"""
+
+import json
+import threading
+
+from flask import current_app
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Movie
+from services import movie_events
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+# Movie columns that appear in Movie.to_dict(); other changes keep fragments valid
+FRAGMENT_FIELDS = frozenset({
+    "id", "title", "release_year", "genre", "budget_crores", "gross_crores",
+    "imdb_rating", "film_image_url", "poster_url", "language",
+})
+
+
+if orjson is not None:
+    def dumps(value):
+        """Encode ``value`` as compact JSON bytes"""
+        return orjson.dumps(value)
+else:
+    def dumps(value):
+        """Encode ``value`` as compact JSON bytes"""
+        return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def parse_fields(value, allowed):
+    """Requested ``fields=`` names in order, or ``None`` when not given.
+
+    Raises ``ValueError`` naming any field outside ``allowed``.
+    """
+    fields = [field.strip() for field in (value or "").split(",") if field.strip()]
+    if not fields:
+        return None
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return list(dict.fromkeys(fields))
+
+
+def extend_fragment(fragment, extra):
+    """Splice the keys of ``extra`` into an encoded JSON object"""
+    if not extra:
+        return fragment
+    return fragment[:-1] + b"," + dumps(extra)[1:]
+
+
+def list_body(key, fragments, extra):
+    """Encode ``{key: [fragments...], **extra}`` without re-encoding fragments"""
+    body = b'{"' + key.encode() + b'":[' + b",".join(fragments) + b"]"
+    if extra:
+        body += b"," + dumps(extra)[1:]
+    else:
+        body += b"}"
+    return body
+
+
+def json_response(body, status=200):
+    """Flask response for an already encoded JSON body"""
+    return current_app.response_class(body, status=status, mimetype="application/json")
+
+
+class FragmentCache:
+    """Encoded ``Movie.to_dict()`` bytes keyed by movie id"""
+
+    def __init__(self, app=None):
+        self._fragments = {}
+        # movie id -> movie_events.sequence() of its last change
+        self._changed_at = {}
+        self._cleared_at = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        movie_events.install()
+        movie_events.subscribe(self._on_movies_changed)
+        app.extensions["fragments"] = self
+
+    def _on_movies_changed(self, ids, fields):
+        if fields is not None and not (fields & FRAGMENT_FIELDS):
+            return
+        sequence = movie_events.sequence()
+        with self._lock:
+            if ids is None:
+                self._cleared_at = sequence
+                self._changed_at.clear()
+                self._fragments.clear()
+                return
+            for movie_id in ids:
+                self._changed_at[movie_id] = sequence
+                self._fragments.pop(movie_id, None)
+
+    def peek(self, movie_id):
+        """Cached fragment for ``movie_id``, or ``None``"""
+        return self._fragments.get(movie_id)
+
+    def get(self, movie_id, build, sequence):
+        """Encoded fragment for ``movie_id``; ``build()`` returns its dict on a miss.
+
+        ``sequence`` is the ``movie_events.sequence()`` read before the data
+        behind ``build`` was loaded.
+        """
+        fragment = self._fragments.get(movie_id)
+        if fragment is not None:
+            return fragment
+
+        fragment = dumps(build())
+        with self._lock:
+            # Only keep it if the movie has not changed since it was read
+            if max(self._changed_at.get(movie_id, 0), self._cleared_at) <= sequence:
+                self._fragments[movie_id] = fragment
+        return fragment
+
+    def for_movies(self, movies, sequence):
+        """Fragments for ORM ``Movie`` objects loaded after ``sequence``"""
+        return [self.get(movie.id, movie.to_dict, sequence) for movie in movies]
+
+    def for_rows(self, rows, sequence):
+        """Fragments for ``Movie.to_dict()`` rows loaded after ``sequence``"""
+        return [self.get(row["id"], lambda row=row: row, sequence) for row in rows]
+
+    def for_ids(self, movie_ids, snapshot=None):
+        """``{movie_id: fragment}`` for the ids that exist.
+
+        Cached fragments first, then the rows of a catalog ``snapshot`` when
+        one is given, then one ``IN`` query for the rest.
+        """
+        found = {}
+        remaining = []
+        for movie_id in movie_ids:
+            fragment = self.peek(movie_id)
+            if fragment is not None:
+                found[movie_id] = fragment
+            else:
+                remaining.append(movie_id)
+
+        if snapshot is not None:
+            rows = [snapshot.rows[snapshot.position[movie_id]] for movie_id in remaining
+                    if movie_id in snapshot.position]
+            found.update(zip((row["id"] for row in rows), self.for_rows(rows, snapshot.sequence)))
+        elif remaining:
+            sequence = movie_events.sequence()
+            movies = Movie.query.filter(Movie.id.in_(remaining)).all()
+            found.update(zip((movie.id for movie in movies), self.for_movies(movies, sequence)))
+        return found
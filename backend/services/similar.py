@@ -0,0 +1,288 @@
+"""Content-based "similar movies" from per-movie feature vectors.
+
+Each movie becomes one fixed-size vector made of weighted blocks:
+
+- genre tokens (``models.parse_genres``) and language, one-hot,
+- release year, IMDb rating, log budget and log gross, standardized,
+- TF-IDF of the synopsis words.
+
+Genres, languages and synopsis terms are feature-hashed into fixed bucket
+counts, so the dimension (``VECTOR_DIMENSIONS``) doesn't depend on the
+catalog. Vectors are L2 normalized; cosine similarity is a dot product.
+
+Neighbors come from ``VectorIndex``, an exact NumPy index: one
+``vectors @ query`` per lookup. That is sub-millisecond for catalogs of tens
+of thousands of movies, so no approximate graph is needed here.
+
+When PostgreSQL has the ``vector`` extension installed (it is never created
+here), ``SimilarMovies.ensure_index()`` creates ``movie_vectors`` with an HNSW
+index and lookups become ``ORDER BY embedding <=> <source embedding>``
+queries the index can answer. Requests never write that table:
+``build_movie_vectors.py`` fills it offline with ``store_vectors()``. The
+numeric block and the IDF weights depend on the whole catalog, so every
+stored vector comes from one computation, written in one transaction. Movies
+it has not stored yet are answered from the in-memory index. Without NumPy,
+``similar()`` returns ``None`` and callers fall back to SQL.
+"""
+
+import re
+import threading
+import zlib
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+from flask import current_app
+from sqlalchemy import text
+from sqlalchemy.orm import undefer
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Movie, db, parse_genres
+from services import movie_events
+
+
+GENRE_BUCKETS = 32
+LANGUAGE_BUCKETS = 16
+NUMERIC_FEATURES = 4
+TERM_BUCKETS = 256
+VECTOR_DIMENSIONS = GENRE_BUCKETS + LANGUAGE_BUCKETS + NUMERIC_FEATURES + TERM_BUCKETS
+
+# Relative weight of each block in the final vector
+BLOCK_WEIGHTS = {"genre": 1.0, "language": 0.5, "numeric": 0.5, "synopsis": 1.0}
+
+# Movie columns the vectors are built from
+FEATURE_FIELDS = frozenset({
+    "genre", "language", "release_year", "imdb_rating", "budget_crores", "gross_crores", "synopsis",
+})
+
+_WORD = re.compile(r"[a-z][a-z']+")
+_STOP_WORDS = frozenset(
+    "a an and are as at be by for from has he her his in is it its of on or she that the their "
+    "they this to was were who will with".split()
+)
+
+
+def _bucket(token, buckets):
+    return zlib.crc32(token.encode()) % buckets
+
+
+def _normalize_rows(block):
+    norms = np.linalg.norm(block, axis=1, keepdims=True)
+    return np.divide(block, norms, out=np.zeros_like(block), where=norms > 0)
+
+
+def _standardize(values):
+    column = np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+    present = ~np.isnan(column)
+    if not present.any():
+        return np.zeros(len(column))
+    mean = column[present].mean()
+    std = column[present].std() or 1.0
+    column[~present] = mean
+    return np.clip((column - mean) / std, -3, 3) / 3
+
+
+def feature_vectors(movies):
+    """``(len(movies), VECTOR_DIMENSIONS)`` float32 unit vectors for Movie rows"""
+    n = len(movies)
+    genres = np.zeros((n, GENRE_BUCKETS))
+    languages = np.zeros((n, LANGUAGE_BUCKETS))
+    terms = np.zeros((n, TERM_BUCKETS))
+    for row, movie in enumerate(movies):
+        for genre in parse_genres(movie.genre):
+            genres[row, _bucket(genre, GENRE_BUCKETS)] = 1
+        if movie.language:
+            languages[row, _bucket(movie.language.strip().lower(), LANGUAGE_BUCKETS)] = 1
+        for word in _WORD.findall((movie.synopsis or "").lower()):
+            if word not in _STOP_WORDS:
+                terms[row, _bucket(word, TERM_BUCKETS)] += 1
+
+    # Sublinear term frequency times smoothed inverse document frequency
+    document_frequency = np.count_nonzero(terms, axis=0)
+    idf = np.log((1 + n) / (1 + document_frequency)) + 1
+    terms = np.log1p(terms) * idf
+
+    numeric = np.column_stack([
+        _standardize([movie.release_year for movie in movies]),
+        _standardize([movie.imdb_rating for movie in movies]),
+        _standardize([np.log1p(movie.budget_crores) if movie.budget_crores else None for movie in movies]),
+        _standardize([np.log1p(movie.gross_crores) if movie.gross_crores else None for movie in movies]),
+    ]) if n else np.zeros((0, NUMERIC_FEATURES))
+
+    vectors = np.hstack([
+        _normalize_rows(genres) * BLOCK_WEIGHTS["genre"],
+        _normalize_rows(languages) * BLOCK_WEIGHTS["language"],
+        numeric / 2 * BLOCK_WEIGHTS["numeric"],
+        _normalize_rows(terms) * BLOCK_WEIGHTS["synopsis"],
+    ])
+    return _normalize_rows(vectors).astype(np.float32)
+
+
+class VectorIndex:
+    """Exact cosine top-k over unit vectors"""
+
+    def __init__(self, ids, vectors, version=0):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.vectors = vectors
+        self.version = version
+        self.position = {int(movie_id): index for index, movie_id in enumerate(self.ids)}
+
+    def _top_k(self, scores, k):
+        k = min(k, scores.shape[-1])
+        if k <= 0:
+            return np.zeros(scores.shape[:-1] + (0,), dtype=np.int64)
+        top = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+        order = np.argsort(-np.take_along_axis(scores, top, axis=-1), axis=-1, kind="stable")
+        return np.take_along_axis(top, order, axis=-1)
+
+    def similar(self, movie_id, k):
+        """``[(movie_id, score)]`` for the ``k`` nearest other movies"""
+        row = self.position.get(movie_id)
+        if row is None:
+            return []
+        scores = self.vectors @ self.vectors[row]
+        scores[row] = -np.inf
+        top = self._top_k(scores, min(k, len(scores) - 1))
+        return [(int(self.ids[index]), float(scores[index])) for index in top]
+
+
+class SimilarMovies:
+    """Keeps the vector index current and answers similar-movie lookups"""
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.pgvector = False
+        self._version = 0
+        self._index = None
+        self._lock = threading.Lock()
+        # Held by the one request rebuilding the index
+        self._build_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = np is not None
+        movie_events.install()
+        movie_events.subscribe(self._on_movies_changed)
+        app.extensions["similar_movies"] = self
+
+    def _on_movies_changed(self, ids, fields):
+        if fields is not None and not (fields & FEATURE_FIELDS):
+            return
+        with self._lock:
+            self._version += 1
+
+    def ensure_index(self, db):
+        """Use pgvector for lookups when the ``vector`` extension is installed.
+
+        Must be called inside an application context after ``db.create_all()``.
+        """
+        if not self.enabled or db.engine.dialect.name != "postgresql":
+            return False
+
+        try:
+            with db.engine.begin() as connection:
+                installed = connection.execute(
+                    text("SELECT 1 FROM pg_extension WHERE extname = 'vector'")
+                ).first()
+                if installed:
+                    connection.execute(text(
+                        "CREATE TABLE IF NOT EXISTS movie_vectors ("
+                        "movie_id INTEGER PRIMARY KEY REFERENCES movies (id) ON DELETE CASCADE, "
+                        f"embedding vector({VECTOR_DIMENSIONS}) NOT NULL)"
+                    ))
+                    connection.execute(text(
+                        "CREATE INDEX IF NOT EXISTS ix_movie_vectors_embedding "
+                        "ON movie_vectors USING hnsw (embedding vector_cosine_ops)"
+                    ))
+        except Exception as exc:
+            current_app.logger.warning("pgvector similarity index unavailable: %s", exc)
+            self.pgvector = False
+        else:
+            self.pgvector = bool(installed)
+        return self.pgvector
+
+    def index(self):
+        """The current ``VectorIndex``, rebuilt first if movies changed.
+
+        One request rebuilds at a time; the others keep using the previous
+        index until it is replaced, and only wait when there is none yet.
+        Must be called inside an application context. Returns ``None`` when
+        NumPy is not installed.
+        """
+        if not self.enabled:
+            return None
+
+        index = self._index
+        if index is not None and index.version == self._version:
+            return index
+
+        if not self._build_lock.acquire(blocking=index is None):
+            return index  # another request is rebuilding
+        try:
+            with self._lock:
+                index = self._index
+                if index is not None and index.version == self._version:
+                    return index
+                version = self._version
+
+            movies = Movie.query.options(undefer(Movie.synopsis)).order_by(Movie.id).all()
+            index = VectorIndex([movie.id for movie in movies], feature_vectors(movies), version)
+
+            with self._lock:
+                self._index = index
+            return index
+        finally:
+            self._build_lock.release()
+
+    def store_vectors(self):
+        """Write the current vectors to ``movie_vectors``; return the rows written.
+
+        Every movie's vector is written in one transaction from the same
+        ``feature_vectors()`` call, so all stored vectors share its scaling.
+        Rows whose embedding already equals the new one are left alone, so the
+        HNSW index is only updated for movies that moved. Deleted movies' rows
+        go with them (``ON DELETE CASCADE``). Meant for
+        ``build_movie_vectors.py``, not for request handlers.
+        """
+        index = self.index()
+        if index is None or not self.pgvector or not len(index.ids):
+            return 0
+        with db.engine.begin() as connection:
+            result = connection.execute(
+                text(
+                    "INSERT INTO movie_vectors (movie_id, embedding) VALUES (:movie_id, CAST(:embedding AS vector)) "
+                    "ON CONFLICT (movie_id) DO UPDATE SET embedding = EXCLUDED.embedding "
+                    "WHERE movie_vectors.embedding IS DISTINCT FROM EXCLUDED.embedding"
+                ),
+                [
+                    {"movie_id": int(movie_id), "embedding": "[" + ",".join(map(str, vector.tolist())) + "]"}
+                    for movie_id, vector in zip(index.ids, index.vectors)
+                ],
+            )
+        return result.rowcount
+
+    def similar(self, movie_id, k):
+        """``[(movie_id, score)]`` most similar first, or ``None`` without NumPy"""
+        if not self.enabled:
+            return None
+        if self.pgvector:
+            # Distance to a constant (the uncorrelated subquery runs once), so
+            # the HNSW index answers the ORDER BY ... LIMIT; the source movie
+            # is its own nearest neighbor and is dropped here
+            rows = db.session.execute(text(
+                "SELECT movie_id, 1 - (embedding <=> ("
+                "SELECT embedding FROM movie_vectors WHERE movie_id = :movie_id)) AS score "
+                "FROM movie_vectors "
+                "ORDER BY embedding <=> (SELECT embedding FROM movie_vectors WHERE movie_id = :movie_id) "
+                "LIMIT :limit"
+            ), {"movie_id": movie_id, "limit": k + 1}).all()
+            if rows and rows[0].score is not None:
+                return [(row.movie_id, float(row.score)) for row in rows if row.movie_id != movie_id][:k]
+            # Not stored yet by build_movie_vectors.py
+        return self.index().similar(movie_id, k)
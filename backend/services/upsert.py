@@ -0,0 +1,37 @@
+"""Dialect-specific upserts shared by the write services.
+
+PostgreSQL and SQLite both support ``INSERT ... ON CONFLICT`` and
+``RETURNING``. ``upsert_insert()`` returns their ``insert()`` construct, which
+adds ``on_conflict_do_nothing()`` and ``on_conflict_do_update()``; on other
+databases it returns ``None`` and callers fall back to a SELECT before the
+write.
+"""
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import db
+
+
+UPSERT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+def dialect():
+    """Name of the dialect the session is bound to"""
+    return db.session.get_bind().dialect.name
+
+
+def upsert_insert():
+    """The dialect's ``insert()`` with ON CONFLICT support, or ``None``"""
+    return UPSERT_INSERTS.get(dialect())
+
+
+def supports_returning():
+    """Whether UPDATE and DELETE statements may use RETURNING"""
+    return dialect() in UPSERT_INSERTS
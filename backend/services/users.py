@@ -0,0 +1,174 @@
+"""Process-local cache of user profiles for JWT-protected routes.
+
+``UserCache.get()`` returns a detached, read-only ``CachedUser`` for a user id,
+loading it with one primary key query on a miss. Routes that need the
+profile of the token's user call ``current_cached_user()``, which costs a
+dictionary lookup on the hot path instead of a users table round trip. It is
+not registered as the flask-jwt-extended user lookup loader, since that would
+run for every ``@jwt_required`` route, including the many that only need the
+user id from the token.
+
+Entries expire after ``USER_CACHE_TTL`` seconds, which bounds staleness from
+writes made by other processes, and the least recently used are evicted
+beyond ``USER_CACHE_MAX_ENTRIES``. ORM updates and deletes of a ``User``
+(profile or password changes) invalidate its entry when they are flushed and
+again after commit.
+
+``admin_required`` restricts operational endpoints (cache and queue
+metrics) to the usernames listed in ``ADMIN_USERNAMES``.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, jsonify
+from flask_jwt_extended import get_jwt_identity, jwt_required
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import User, db
+
+
+_PENDING_KEY = "user_cache_invalidations"
+
+
+def current_cached_user():
+    """The ``CachedUser`` of the request's JWT, or ``None`` if it was deleted.
+
+    Must be called from a ``@jwt_required`` route.
+    """
+    return current_app.extensions["user_cache"].get(int(get_jwt_identity()))
+
+
+def admin_required(view):
+    """Require a JWT whose user is in ``ADMIN_USERNAMES``; others get 403"""
+    @wraps(view)
+    @jwt_required()
+    def wrapper(*args, **kwargs):
+        user = current_cached_user()
+        if user is None or user.username not in current_app.config["ADMIN_USERNAMES"]:
+            return jsonify({"message": "Admin access required"}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+
+class CachedUser:
+    """The profile columns of a ``User``, safe to share between requests"""
+
+    __slots__ = ("id", "username", "email", "created_at", "last_login")
+
+    def __init__(self, user):
+        self.id = user.id
+        self.username = user.username
+        self.email = user.email
+        self.created_at = user.created_at
+        self.last_login = user.last_login
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'username': self.username,
+            'email': self.email,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'last_login': self.last_login.isoformat() if self.last_login else None
+        }
+
+
+class UserCache:
+    """TTL'd LRU cache of ``user_id -> CachedUser``"""
+
+    def __init__(self, app=None):
+        self.ttl = 60
+        self.max_entries = 10000
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation; loads that overlap one are not kept
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("USER_CACHE_TTL", 60)
+        app.config.setdefault("USER_CACHE_MAX_ENTRIES", 10000)
+        # Users allowed on admin_required endpoints; none by default
+        app.config.setdefault("ADMIN_USERNAMES", ())
+        self.ttl = app.config["USER_CACHE_TTL"]
+        self.max_entries = app.config["USER_CACHE_MAX_ENTRIES"]
+
+        event.listen(User, "after_update", self._on_user_written)
+        event.listen(User, "after_delete", self._on_user_written)
+        event.listen(Session, "after_commit", self._after_commit)
+        event.listen(Session, "after_soft_rollback", self._after_rollback)
+        app.extensions["user_cache"] = self
+
+    def _on_user_written(self, mapper, connection, target):
+        self.invalidate(target.id)
+        session = object_session(target)
+        if session is not None:
+            session.info.setdefault(_PENDING_KEY, set()).add(target.id)
+
+    def _after_commit(self, session):
+        # A request may have cached the old row between flush and commit
+        for user_id in session.info.pop(_PENDING_KEY, ()):
+            self.invalidate(user_id)
+
+    def _after_rollback(self, session, previous_transaction):
+        session.info.pop(_PENDING_KEY, None)
+
+    def invalidate(self, user_id=None):
+        """Forget one user, or every user when ``user_id`` is None"""
+        with self._lock:
+            self._generation += 1
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "users": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def get(self, user_id):
+        """The ``CachedUser`` for ``user_id``, or ``None`` if there is no such user.
+
+        Must be called inside an application context.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and now - entry[1] <= self.ttl:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            generation = self._generation
+
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        cached = CachedUser(user)
+
+        with self._lock:
+            if generation == self._generation:
+                self._entries[user_id] = (cached, now)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return cached
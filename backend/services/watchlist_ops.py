@@ -0,0 +1,238 @@
+"""Set-based watchlist writes.
+
+Adding or removing any number of movies costs a constant number of
+statements: one lookup of which movie ids exist, one
+``INSERT ... ON CONFLICT DO NOTHING RETURNING`` against the ``uq_user_movie``
+constraint and one ``DELETE ... RETURNING``. PostgreSQL and SQLite use their
+native upsert; other databases fall back to a SELECT before the INSERT.
+
+``Movie.watchlist_count`` is adjusted in the same transaction with one
+``UPDATE ... SET watchlist_count = watchlist_count +/- 1`` over the ids that
+actually changed. Writes that bypass this module (e.g. deleting a user)
+can make it drift; ``reconcile_watchlist_counts()`` recomputes it.
+
+Every add or remove also bumps ``User.watchlist_version`` and appends one
+``WatchlistChange`` row per movie, so clients can sync deltas. The log is
+compacted to the last ``CHANGE_LOG_LIMIT`` versions per user every
+``COMPACT_INTERVAL`` versions.
+
+The functions here do not commit; callers commit once so a batch is a single
+transaction. Subscribers registered with ``subscribe()`` are told about the
+committed changes as ``callback(user_id, added_ids, removed_ids, version)``:
+``version`` is the user's ``watchlist_version`` after the write, which bumped
+it by one per changed movie, so ``version - len(added_ids | removed_ids)`` is
+the version the write was applied to.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import delete, event, func, insert, select, update
+from sqlalchemy.orm import Session
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Movie, User, Watchlist, WatchlistChange, db
+from services import movie_events
+from services.upsert import supports_returning, upsert_insert
+
+
+# Per-id outcomes reported to clients
+ADDED = "added"
+ALREADY_IN_WATCHLIST = "already_in_watchlist"
+REMOVED = "removed"
+NOT_IN_WATCHLIST = "not_in_watchlist"
+NOT_FOUND = "not_found"
+
+# Change log entries kept per user, and how often older ones are deleted
+CHANGE_LOG_LIMIT = 500
+COMPACT_INTERVAL = 50
+
+_PENDING_KEY = "watchlist_changes"
+_subscribers = []
+_installed = False
+
+
+def subscribe(callback):
+    """Register ``callback(user_id, added_ids, removed_ids, version)`` for committed changes"""
+    _install()
+    _subscribers.append(callback)
+    return callback
+
+
+def _record(user_id, version, added=(), removed=()):
+    if added or removed:
+        db.session.info.setdefault(_PENDING_KEY, []).append((user_id, set(added), set(removed), version))
+
+
+def _after_commit(session):
+    for user_id, added, removed, version in session.info.pop(_PENDING_KEY, []):
+        for callback in list(_subscribers):
+            callback(user_id, added, removed, version)
+
+
+def _after_rollback(session, previous_transaction):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def _install():
+    global _installed
+    if not _installed:
+        event.listen(Session, "after_commit", _after_commit)
+        event.listen(Session, "after_soft_rollback", _after_rollback)
+        _installed = True
+
+
+def _adjust_counts(movie_ids, delta):
+    """Add ``delta`` to the watchlist_count of ``movie_ids``"""
+    if not movie_ids:
+        return
+    movies = Movie.__table__
+    db.session.execute(
+        update(movies)
+        .where(movies.c.id.in_(sorted(movie_ids)))
+        .values(watchlist_count=movies.c.watchlist_count + delta)
+    )
+    movie_events.mark_changed(db.session, movie_ids, {"watchlist_count"})
+
+
+def _log_changes(user_id, movie_ids, action):
+    """Bump the user's watchlist_version, log one change per movie and return the new version"""
+    if not movie_ids:
+        return None
+    users = User.__table__
+    statement = (
+        update(users)
+        .where(users.c.id == user_id)
+        .values(watchlist_version=users.c.watchlist_version + len(movie_ids))
+    )
+    if supports_returning():
+        version = db.session.scalar(statement.returning(users.c.watchlist_version))
+    else:
+        db.session.execute(statement)
+        version = db.session.scalar(select(users.c.watchlist_version).where(users.c.id == user_id))
+
+    first = version - len(movie_ids) + 1
+    now = datetime.utcnow()
+    db.session.execute(insert(WatchlistChange.__table__), [
+        {"user_id": user_id, "version": first + offset, "movie_id": movie_id, "action": action, "created_at": now}
+        for offset, movie_id in enumerate(sorted(movie_ids))
+    ])
+
+    # Compaction: drop entries older than the retained window
+    if version // COMPACT_INTERVAL != (first - 1) // COMPACT_INTERVAL:
+        changes = WatchlistChange.__table__
+        db.session.execute(delete(changes).where(
+            changes.c.user_id == user_id,
+            changes.c.version <= version - CHANGE_LOG_LIMIT,
+        ))
+    return version
+
+
+def reconcile_watchlist_counts():
+    """Recompute every drifted ``Movie.watchlist_count``; return how many changed.
+
+    Does not commit.
+    """
+    movies = Movie.__table__
+    actual = (
+        select(func.count(Watchlist.__table__.c.id))
+        .where(Watchlist.__table__.c.movie_id == movies.c.id)
+        .scalar_subquery()
+    )
+    statement = update(movies).where(movies.c.watchlist_count != actual).values(watchlist_count=actual)
+    if supports_returning():
+        changed = set(db.session.scalars(statement.returning(movies.c.id)))
+        if changed:
+            movie_events.mark_changed(db.session, changed, {"watchlist_count"})
+        return len(changed)
+    result = db.session.execute(statement)
+    movie_events.mark_changed(db.session, None, {"watchlist_count"})
+    return result.rowcount
+
+
+def existing_movie_ids(movie_ids):
+    """The subset of ``movie_ids`` that exist in the movies table"""
+    if not movie_ids:
+        return set()
+    return set(db.session.scalars(select(Movie.id).where(Movie.id.in_(movie_ids))))
+
+
+def add_movies(user_id, movie_ids, known_movie_ids=None):
+    """Add ``movie_ids`` to the user's watchlist; return ``{movie_id: outcome}``.
+
+    ``known_movie_ids`` skips the existence lookup when the caller already
+    knows which movies exist.
+    """
+    movie_ids = list(dict.fromkeys(movie_ids))
+    if not movie_ids:
+        return {}
+
+    if known_movie_ids is None:
+        known_movie_ids = existing_movie_ids(movie_ids)
+    valid_ids = [movie_id for movie_id in movie_ids if movie_id in known_movie_ids]
+
+    added = set()
+    if valid_ids:
+        now = datetime.utcnow()
+        rows = [{"user_id": user_id, "movie_id": movie_id, "created_at": now} for movie_id in valid_ids]
+        dialect_insert = upsert_insert()
+        if dialect_insert is not None:
+            statement = (
+                dialect_insert(Watchlist.__table__)
+                .values(rows)
+                .on_conflict_do_nothing(index_elements=["user_id", "movie_id"])
+                .returning(Watchlist.__table__.c.movie_id)
+            )
+            added = set(db.session.scalars(statement))
+        else:
+            present = set(db.session.scalars(
+                select(Watchlist.movie_id)
+                .where(Watchlist.user_id == user_id, Watchlist.movie_id.in_(valid_ids))
+            ))
+            new_rows = [row for row in rows if row["movie_id"] not in present]
+            if new_rows:
+                db.session.execute(insert(Watchlist.__table__), new_rows)
+            added = {row["movie_id"] for row in new_rows}
+    _adjust_counts(added, 1)
+    version = _log_changes(user_id, added, "add")
+    _record(user_id, version, added=added)
+
+    outcomes = {}
+    for movie_id in movie_ids:
+        if movie_id not in known_movie_ids:
+            outcomes[movie_id] = NOT_FOUND
+        elif movie_id in added:
+            outcomes[movie_id] = ADDED
+        else:
+            outcomes[movie_id] = ALREADY_IN_WATCHLIST
+    return outcomes
+
+
+def remove_movies(user_id, movie_ids):
+    """Remove ``movie_ids`` from the user's watchlist; return ``{movie_id: outcome}``"""
+    movie_ids = list(dict.fromkeys(movie_ids))
+    if not movie_ids:
+        return {}
+
+    statement = delete(Watchlist.__table__).where(
+        Watchlist.__table__.c.user_id == user_id,
+        Watchlist.__table__.c.movie_id.in_(movie_ids),
+    )
+    if supports_returning():
+        removed = set(db.session.scalars(statement.returning(Watchlist.__table__.c.movie_id)))
+    else:
+        removed = set(db.session.scalars(
+            select(Watchlist.movie_id)
+            .where(Watchlist.user_id == user_id, Watchlist.movie_id.in_(movie_ids))
+        ))
+        db.session.execute(statement)
+    _adjust_counts(removed, -1)
+    version = _log_changes(user_id, removed, "remove")
+    _record(user_id, version, removed=removed)
+
+    return {
+        movie_id: REMOVED if movie_id in removed else NOT_IN_WATCHLIST
+        for movie_id in movie_ids
+    }
@@ -0,0 +1,30 @@
+"""GET /movies/batch"""
+
+from routes.movies import MAX_BATCH_IDS
+
+
+def _ids(values):
+    return ",".join(str(value) for value in values)
+
+
+def test_movies_come_back_in_request_order(client, add_movies):
+    first, second = add_movies({"imdb_rating": 7.0}, {"imdb_rating": 8.0})
+    body = client.get(f"/movies/batch?ids={_ids([second, 999999, first, second])}").get_json()
+    assert [movie["id"] for movie in body["movies"]] == [second, first]
+    assert body["missing"] == [999999]
+    assert body["total_count"] == 2
+
+
+def test_too_many_ids_is_a_400(client):
+    response = client.get(f"/movies/batch?ids={_ids(range(1, MAX_BATCH_IDS + 2))}")
+    assert response.status_code == 400
+    assert response.get_json()["error"] == f"At most {MAX_BATCH_IDS} ids per request"
+
+
+def test_repeated_ids_count_once_toward_the_limit(client):
+    ids = list(range(1, MAX_BATCH_IDS + 1)) * 2
+    assert client.get(f"/movies/batch?ids={_ids(ids)}").status_code == 200
+
+
+def test_malformed_ids_are_a_400(client):
+    assert client.get("/movies/batch?ids=1,two").status_code == 400
@@ -0,0 +1,46 @@
+"""Facet counts from the catalog snapshot and the SQL path"""
+
+import pytest
+
+from extensions import catalog
+from models import Movie, db
+from services.facets import sql_facet_counts
+
+
+RATINGS = [None, 6.0, 6.4, 6.5, 6.9, 7.0, 7.5, 7.6, 8.99, 9.0]
+
+
+@pytest.fixture
+def rated_movies(add_movies):
+    return add_movies(*(
+        {"imdb_rating": rating, "genre": "Action/Drama" if index % 2 else "Comedy", "release_year": 2020 + index % 3}
+        for index, rating in enumerate(RATINGS)
+    ))
+
+
+def _facets(client, query):
+    return client.get(f"/movies?facets=genre,year,rating_bucket&{query}").get_json()["facets"]
+
+
+def test_rating_buckets_round_down(app, rated_movies):
+    with app.app_context():
+        counts = sql_facet_counts(Movie.query, ["rating_bucket"])["rating_bucket"]
+    assert counts == {6: 4, 7: 3, 8: 1, 9: 1}
+
+
+def test_snapshot_and_sql_agree(client, rated_movies, monkeypatch):
+    from_snapshot = _facets(client, "sort=rating_desc")
+    monkeypatch.setattr(catalog, "enabled", False)
+    from_sql = _facets(client, "sort=rating_desc&from=sql")
+    assert from_snapshot == from_sql
+    assert from_snapshot["rating_bucket"][0] == {"value": 9, "count": 1}
+
+
+def test_counts_follow_updates(app, client, rated_movies):
+    _facets(client, "sort=rating_desc")
+    with app.app_context():
+        movie = db.session.get(Movie, rated_movies[1])
+        movie.imdb_rating = 8.2
+        db.session.commit()
+    buckets = {item["value"]: item["count"] for item in _facets(client, "sort=rating_desc")["rating_bucket"]}
+    assert buckets == {6: 3, 7: 3, 8: 2, 9: 1}
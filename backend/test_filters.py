@@ -0,0 +1,40 @@
+"""ETag revalidation of GET /movies/filters"""
+
+from models import Movie, db
+
+
+def test_matching_etag_gets_304(client, add_movies):
+    add_movies({"genre": "Action", "language": "Hindi", "release_year": 2010, "imdb_rating": 7.5})
+    first = client.get("/movies/filters")
+    assert first.status_code == 200
+    assert first.get_json()["genres"] == ["Action"]
+
+    etag = first.headers["ETag"]
+    revalidated = client.get("/movies/filters", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b""
+
+
+def test_faceted_change_gets_a_new_body_and_etag(app, client, add_movies):
+    movie_id = add_movies({"genre": "Action", "imdb_rating": 7.5})[0]
+    etag = client.get("/movies/filters").headers["ETag"]
+
+    with app.app_context():
+        db.session.get(Movie, movie_id).genre = "Drama"
+        db.session.commit()
+
+    response = client.get("/movies/filters", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.get_json()["genres"] == ["Drama"]
+
+
+def test_other_changes_keep_the_etag(app, client, add_movies):
+    movie_id = add_movies({"genre": "Action", "imdb_rating": 7.5})[0]
+    etag = client.get("/movies/filters").headers["ETag"]
+
+    with app.app_context():
+        db.session.get(Movie, movie_id).synopsis = "A new synopsis"
+        db.session.commit()
+
+    assert client.get("/movies/filters", headers={"If-None-Match": etag}).status_code == 304
@@ -0,0 +1,37 @@
+"""Genre parsing and multi-genre filtering"""
+
+import pytest
+
+from extensions import catalog
+from models import parse_genres
+
+
+@pytest.mark.parametrize("value, genres", [
+    ("Action/Drama", ["Action", "Drama"]),
+    ("sci-fi, ACTION | drama", ["Sci-Fi", "Action", "Drama"]),
+    ("  romantic   comedy ", ["Romantic Comedy"]),
+    ("Action/action", ["Action"]),
+    ("Children's", ["Children's"]),
+    ("", []),
+    (None, []),
+])
+def test_parse_genres_splits_and_normalizes_case(value, genres):
+    assert parse_genres(value) == genres
+
+
+@pytest.mark.parametrize("snapshot", [True, False])
+@pytest.mark.parametrize("query, titles", [
+    ("genre=action", ["Both", "Action only"]),
+    ("genre=Action,Drama", ["Both"]),
+    ("genre=action/drama&genre_mode=any", ["Both", "Action only", "Drama only"]),
+    ("genre=Horror", []),
+])
+def test_genre_filters(client, add_movies, monkeypatch, snapshot, query, titles):
+    monkeypatch.setattr(catalog, "enabled", snapshot)
+    add_movies(
+        {"title": "Both", "genre": "Action/Drama", "imdb_rating": 9.0},
+        {"title": "Action only", "genre": "Action", "imdb_rating": 8.0},
+        {"title": "Drama only", "genre": "drama", "imdb_rating": 7.0},
+    )
+    movies = client.get(f"/movies?{query}").get_json()["movies"]
+    assert [movie["title"] for movie in movies] == titles
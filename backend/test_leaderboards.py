@@ -0,0 +1,51 @@
+"""GET /movies/top bounds and board maintenance"""
+
+import pytest
+
+from extensions import leaderboards
+from models import Movie, db
+
+
+@pytest.fixture
+def action_movies(add_movies, monkeypatch):
+    monkeypatch.setattr(leaderboards, "size", 3)
+    return add_movies(*({"genre": "Action", "imdb_rating": 5.0 + row} for row in range(5)))
+
+
+def _top(client, query):
+    return client.get(f"/movies/top?{query}")
+
+
+def _ratings(response):
+    return [movie["imdb_rating"] for movie in response.get_json()["movies"]]
+
+
+def test_n_is_clamped_to_the_board_size(client, action_movies):
+    assert _ratings(_top(client, "by=genre&value=action&n=50")) == [9.0, 8.0, 7.0]
+    assert _ratings(_top(client, "by=genre&value=Action&n=0")) == [9.0]
+    assert _ratings(_top(client, "by=genre&value=Action&n=-5")) == [9.0]
+
+
+@pytest.mark.parametrize("query", [
+    "by=director&value=Nolan",
+    "by=genre",
+    "by=genre&value=Action/Drama",
+    "by=year&value=recent",
+])
+def test_bad_requests(client, query):
+    response = _top(client, query)
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_unknown_value_is_empty(client, action_movies):
+    assert _top(client, "by=language&value=Klingon").get_json()["total_count"] == 0
+
+
+def test_truncated_board_is_refilled_when_members_leave(app, client, action_movies):
+    assert _ratings(_top(client, "by=genre&value=Action&n=3")) == [9.0, 8.0, 7.0]
+    with app.app_context():
+        for movie_id in action_movies[-2:]:
+            db.session.get(Movie, movie_id).genre = "Drama"
+        db.session.commit()
+    assert _ratings(_top(client, "by=genre&value=Action&n=3")) == [7.0, 6.0, 5.0]
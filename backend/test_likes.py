@@ -0,0 +1,61 @@
+"""Batched like counters and their failure handling"""
+
+import pytest
+
+from extensions import like_counter
+from models import Movie, db
+
+
+@pytest.fixture
+def liked_movie(add_movies):
+    return add_movies({"imdb_rating": 7.0})[0]
+
+
+def _like_count(app, movie_id):
+    with app.app_context():
+        return db.session.get(Movie, movie_id).like_count
+
+
+def _break_database(monkeypatch):
+    def fail():
+        raise RuntimeError("database unavailable")
+
+    with like_counter._app.app_context():
+        monkeypatch.setattr(db.engine, "begin", fail)
+
+
+def test_likes_are_counted_on_flush(app, client, login, liked_movie):
+    for username in ("a", "b"):
+        client.post("/user/likes", headers=login(username), json={"movie_id": liked_movie})
+    with app.app_context():
+        like_counter.flush()
+    assert _like_count(app, liked_movie) == 2
+
+
+def test_failed_flush_keeps_deltas_for_the_next_one(app, client, login, liked_movie, monkeypatch):
+    client.post("/user/likes", headers=login("fan"), json={"movie_id": liked_movie})
+
+    _break_database(monkeypatch)
+    with app.app_context(), pytest.raises(RuntimeError):
+        like_counter.flush()
+    assert like_counter._pending[liked_movie] == 1
+
+    monkeypatch.undo()
+    with app.app_context():
+        assert like_counter.flush() == 1
+    assert _like_count(app, liked_movie) == 1
+
+
+def test_background_flush_failure_is_logged_not_raised(app, client, login, liked_movie, monkeypatch):
+    client.post("/user/likes", headers=login("fan"), json={"movie_id": liked_movie})
+    failures = like_counter.failures
+
+    _break_database(monkeypatch)
+    like_counter._flush_logged()
+    assert like_counter.failures == failures + 1
+    # Requests never run the flush, so they are unaffected
+    assert client.get("/movies/filters").status_code == 200
+
+    monkeypatch.undo()
+    like_counter._flush_logged()
+    assert _like_count(app, liked_movie) == 1
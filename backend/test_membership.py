@@ -0,0 +1,19 @@
+"""Watchlist membership sets handed to callers"""
+
+from extensions import membership
+
+
+def test_writes_replace_the_set_instead_of_mutating_it(app, client, add_movies, login):
+    first, second = add_movies({"imdb_rating": 7.0}, {"imdb_rating": 8.0})
+    headers = login("saver")
+    client.post(f"/watchlist/{first}", headers=headers)
+    with app.app_context():
+        user_id = client.get("/auth/me", headers=headers).get_json()["id"]
+        before = membership.movie_ids(user_id)
+
+        # A write while a caller is still iterating the set it was handed
+        for _ in before:
+            client.post(f"/watchlist/{second}", headers=headers)
+
+        assert before == {first}
+        assert membership.movie_ids(user_id) == {first, second}
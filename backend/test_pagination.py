@@ -0,0 +1,68 @@
+"""Cursor validation for the paginated list endpoints"""
+
+import base64
+
+import pytest
+
+from services.pagination import decode_cursor, encode_cursor
+
+
+def _raw_cursor(payload):
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def test_cursor_round_trip():
+    token = encode_cursor("rating_desc", 7.5, 12)
+    assert decode_cursor(token, "rating_desc") == (7.5, 12)
+
+
+@pytest.mark.parametrize("sort, value", [
+    ("rating_desc", None),
+    ("year_asc", 2020),
+    ("title_asc", "Dangal"),
+    ("relevance", 40),
+    ("added_desc", "2024-01-01T10:00:00"),
+])
+def test_valid_values_are_accepted(sort, value):
+    assert decode_cursor(encode_cursor(sort, value, 1), sort) == (value, 1)
+
+
+@pytest.mark.parametrize("sort, value", [
+    ("relevance", "abc"),
+    ("relevance", -1),
+    ("relevance", 1.5),
+    ("rating_desc", "abc"),
+    ("rating_desc", True),
+    ("rating_desc", [1]),
+    ("title_asc", 3),
+    ("added_desc", 5),
+])
+def test_wrong_value_types_are_rejected(sort, value):
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor(sort, value, 1), sort)
+
+
+@pytest.mark.parametrize("token", [
+    "not base64!",
+    _raw_cursor('["rating_desc",NaN,1]'),
+    _raw_cursor('["rating_desc",7.0,"1"]'),
+    _raw_cursor('["rating_desc",7.0]'),
+    encode_cursor("rating_asc", 7.0, 1),
+])
+def test_malformed_or_mismatched_tokens_are_rejected(token):
+    with pytest.raises(ValueError):
+        decode_cursor(token, "rating_desc")
+
+
+@pytest.mark.parametrize("snapshot", [True, False])
+@pytest.mark.parametrize("query", [
+    "sort=rating_desc&cursor=" + encode_cursor("rating_desc", "abc", 1),
+    "sort=relevance&search=dark&cursor=" + encode_cursor("relevance", "abc", 1),
+    "sort=title_asc&cursor=" + encode_cursor("title_asc", 3, 1),
+])
+def test_movies_rejects_bad_cursor_values(app, client, add_movies, monkeypatch, snapshot, query):
+    from extensions import catalog
+    monkeypatch.setattr(catalog, "enabled", snapshot)
+    add_movies({"title": "Dark", "imdb_rating": 7.0}, {"title": "Dark Knight", "imdb_rating": 8.0})
+    response = client.get(f"/movies?{query}")
+    assert response.status_code == 400
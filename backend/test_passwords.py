@@ -0,0 +1,64 @@
+"""Admission control of the password hashing pool"""
+
+import threading
+
+import pytest
+from flask import Flask
+
+from extensions import password_hasher
+from services.passwords import HasherBusy, PasswordHasher
+
+
+@pytest.fixture
+def hasher():
+    app = Flask(__name__)
+    app.config.update(BCRYPT_ROUNDS=4, PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_QUEUE_DEPTH=1,
+                      PASSWORD_HASH_TIMEOUT=0.5)
+    hasher = PasswordHasher(app)
+    yield hasher
+    hasher._executor.shutdown(wait=True)
+
+
+def _occupy(hasher):
+    """Hold the only worker until the returned event is set"""
+    release = threading.Event()
+    started = threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    thread = threading.Thread(target=hasher._run, args=(block,))
+    thread.start()
+    started.wait(5)
+    return release, thread
+
+
+def test_full_queue_is_rejected_at_once(hasher):
+    release, thread = _occupy(hasher)
+    try:
+        with pytest.raises(HasherBusy) as busy:
+            hasher.hash("secret")
+        assert busy.value.retry_after >= 1
+        assert hasher.stats()["rejected"] == 1
+    finally:
+        release.set()
+        thread.join()
+    assert hasher.verify("secret", hasher.hash("secret")) == (True, None)
+
+
+def test_slow_operation_times_out(hasher):
+    release = threading.Event()
+    with pytest.raises(HasherBusy):
+        hasher._run(release.wait, 5)
+    assert hasher.stats()["timeouts"] == 1
+    release.set()
+
+
+def test_login_is_turned_away_with_retry_after(client, login, monkeypatch):
+    login("member")
+    monkeypatch.setattr(password_hasher, "queue_depth", 0)
+    response = client.post("/auth/login", json={"email": "member@example.com", "password": "secret"})
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+    assert "message" in response.get_json()
@@ -0,0 +1,70 @@
+"""Token-bucket rate limits: 429 bodies, headers and refills"""
+
+import pytest
+
+from extensions import rate_limiter
+from services.rate_limit import MemoryBackend, _Rule
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    """Enable the limiter with fresh buckets and the given rules"""
+    def configure(rules):
+        monkeypatch.setattr(rate_limiter, "enabled", True)
+        monkeypatch.setattr(rate_limiter, "_backend", MemoryBackend(1000, 60))
+        monkeypatch.setattr(rate_limiter, "_rules", {
+            name: [_Rule(name, index, **rule) for index, rule in enumerate(specs)]
+            for name, specs in rules.items()
+        })
+    return configure
+
+
+def test_bucket_allows_a_burst_then_refills():
+    backend = MemoryBackend(1000, 60)
+    results = [backend.hit("key", 1.0, 3, 100.0) for _ in range(4)]
+    assert [allowed for allowed, *_ in results] == [True, True, True, False]
+    assert [remaining for _, remaining, *_ in results[:3]] == [2, 1, 0]
+    assert results[3][3] == pytest.approx(1.0)
+    assert backend.hit("key", 1.0, 3, 101.0)[0] is True
+
+
+def test_auth_429_uses_message(client, limits):
+    limits({"auth.login": [{"by": "ip", "limit": 2, "period": 60}]})
+    credentials = {"email": "nobody@example.com", "password": "wrong"}
+    first = client.post("/auth/login", json=credentials)
+    assert first.headers["RateLimit-Limit"] == "2"
+    assert first.headers["RateLimit-Remaining"] == "1"
+    client.post("/auth/login", json=credentials)
+
+    response = client.post("/auth/login", json=credentials)
+    assert response.status_code == 429
+    body = response.get_json()
+    assert body["message"] == "Too many requests"
+    assert body["retry_after"] == int(response.headers["Retry-After"]) >= 1
+    assert response.headers["RateLimit-Remaining"] == "0"
+
+
+def test_movies_429_uses_error_and_only_limits_searches(client, limits):
+    limits({"movies.list_movies": [{"by": "user", "limit": 1, "period": 60, "when": "search"}]})
+    assert client.get("/movies?search=dark").status_code == 200
+    response = client.get("/movies?search=knight")
+    assert response.status_code == 429
+    assert response.get_json()["error"] == "Too many requests"
+    assert client.get("/movies").status_code == 200
+
+
+def test_users_have_their_own_buckets(client, limits, login):
+    first, second = login("first"), login("second")
+    limits({"movies.list_movies": [{"by": "user", "limit": 1, "period": 60, "when": "search"}]})
+    assert client.get("/movies?search=a", headers=first).status_code == 200
+    assert client.get("/movies?search=b", headers=first).status_code == 429
+    assert client.get("/movies?search=c", headers=second).status_code == 200
+
+
+def test_user_routes_429_uses_message(client, limits, login):
+    headers = login("liker")
+    limits({"user": [{"by": "user", "limit": 1, "period": 60}]})
+    assert client.get("/user/likes", headers=headers).status_code == 200
+    response = client.get("/user/likes", headers=headers)
+    assert response.status_code == 429
+    assert response.get_json()["message"] == "Too many requests"
@@ -0,0 +1,111 @@
+"""Incremental recommender updates against an exact rebuild"""
+
+import random
+
+import pytest
+
+from extensions import recommender
+from models import db
+from services import watchlist_ops
+from services.recommender import ItemSimilarityModel, _scan_watchlists
+
+
+def _counts(model):
+    """Co-occurrence and save counts keyed by movie id"""
+    return {
+        movie_id: (
+            int(model.degrees[column]),
+            {model.movie_ids[other]: count for other, count in model.co[column].items() if count},
+        )
+        for movie_id, column in model.column.items()
+        if model.degrees[column]
+    }
+
+
+def _exact(model):
+    pairs, versions = _scan_watchlists()
+    return ItemSimilarityModel.from_pairs(pairs, model.k, recommender.similarity, [], versions)
+
+
+@pytest.fixture
+def users(add_movies, login):
+    add_movies(*({"imdb_rating": 7.0} for _ in range(20)))
+    return [login(f"user{index}") for index in range(8)]
+
+
+def _random_writes(client, users, steps, rng):
+    for _ in range(steps):
+        headers = rng.choice(users)
+        action = "add" if rng.random() < 0.7 else "remove"
+        client.post("/watchlist/batch", headers=headers, json={action: rng.sample(range(1, 21), 3)})
+
+
+def test_replayed_writes_match_a_rebuild(app, client, users):
+    rng = random.Random(7)
+    for _ in range(5):
+        _random_writes(client, users, 20, rng)
+        # Recommendations drain the queued writes into the model
+        client.get("/user/recommendations", headers=users[0])
+
+    with app.app_context():
+        model = recommender.model()
+        assert _counts(model) == _counts(_exact(model))
+
+
+def test_rebuild_skips_writes_it_already_counts(app, client, users):
+    rng = random.Random(11)
+    _random_writes(client, users, 20, rng)
+    client.get("/user/recommendations", headers=users[0])
+
+    # Queued writes committed before the rebuild's scan must not count twice
+    _random_writes(client, users, 30, rng)
+    recommender.invalidate()
+    with app.app_context():
+        model = recommender.model()
+        assert _counts(model) == _counts(_exact(model))
+
+
+def test_writes_during_a_rebuild_reach_the_new_model(app, client, users, monkeypatch):
+    rng = random.Random(13)
+    _random_writes(client, users, 20, rng)
+    client.get("/user/recommendations", headers=users[0])
+
+    build = recommender._load_or_build
+
+    def build_with_concurrent_writes(from_disk):
+        built = build(from_disk)
+        # Committed after the scan and replayed into the old model meanwhile
+        _random_writes(client, users, 15, rng)
+        with recommender._lock:
+            recommender._drain()
+        return built
+
+    monkeypatch.setattr(recommender, "_load_or_build", build_with_concurrent_writes)
+    recommender.invalidate()
+    with app.app_context():
+        recommender._replace_model(blocking=True)
+    monkeypatch.undo()
+
+    with app.app_context():
+        model = recommender.model()
+        assert _counts(model) == _counts(_exact(model))
+
+
+def test_writes_from_another_process_are_resynced(app, client, users):
+    rng = random.Random(17)
+    _random_writes(client, users, 20, rng)
+    client.get("/user/recommendations", headers=users[0])
+
+    # Committed elsewhere: no notification reaches this process
+    with app.app_context():
+        user_id = client.get("/auth/me", headers=users[1]).get_json()["id"]
+        watchlist_ops.add_movies(user_id, [18, 19, 20])
+        db.session.info.pop("watchlist_changes")
+        db.session.commit()
+
+    # The next write doesn't follow on from the counted version
+    client.post("/watchlist/batch", headers=users[1], json={"remove": [19]})
+    with app.app_context():
+        model = recommender.model()
+        assert _counts(model) == _counts(_exact(model))
+        assert not recommender._pending
@@ -0,0 +1,83 @@
+"""Response cache keys and invalidation"""
+
+import pytest
+
+from extensions import catalog, like_counter
+from models import Movie, db
+from services.response_cache import ResponseCache
+
+
+def _key(app, query):
+    with app.test_request_context(f"/movies?{query}"):
+        return ResponseCache.cache_key()
+
+
+def test_parameter_order_does_not_matter(app):
+    assert _key(app, "sort=rating_desc&genre=Action") == _key(app, "genre=Action&sort=rating_desc")
+
+
+@pytest.mark.parametrize("a, b", [
+    ("genre=Action", "genre=action"),
+    ("search=Dark", "search= dark "),
+    ("genre_mode=ANY", "genre_mode=any"),
+])
+def test_case_insensitive_values_share_a_key(app, a, b):
+    assert _key(app, a) == _key(app, b)
+
+
+@pytest.mark.parametrize("a, b", [
+    ("language=Telugu", "language=telugu"),
+    ("cursor=AbC", "cursor=abc"),
+    ("sort=rating_desc", "SORT=rating_desc"),
+])
+def test_other_values_and_names_keep_their_case(app, a, b):
+    assert _key(app, a) != _key(app, b)
+
+
+def test_language_filter_is_not_served_from_another_case(client, add_movies):
+    add_movies({"language": "Telugu", "imdb_rating": 8.0})
+    assert client.get("/movies?language=telugu").get_json()["total_count"] == 0
+    assert client.get("/movies?language=Telugu").get_json()["total_count"] == 1
+
+
+def test_like_count_change_drops_the_cached_detail(app, client, add_movies, login):
+    liked, other = add_movies({"imdb_rating": 8.0}, {"imdb_rating": 7.0})
+    headers = login("liker")
+    assert client.get(f"/movies/{liked}").get_json()["like_count"] == 0
+    assert client.get(f"/movies/{other}").headers["X-Cache"] == "MISS"
+
+    client.post("/user/likes", headers=headers, json={"movie_id": liked})
+    with app.app_context():
+        like_counter.flush()
+
+    response = client.get(f"/movies/{liked}")
+    assert response.headers["X-Cache"] == "MISS"
+    assert response.get_json()["like_count"] == 1
+    assert client.get(f"/movies/{other}").headers["X-Cache"] == "HIT"
+
+
+def test_answers_from_a_stale_snapshot_are_not_cached(app, client, add_movies):
+    movie_id = add_movies({"title": "Old Title", "imdb_rating": 7.0})[0]
+    assert client.get("/movies?sort=title_asc").status_code == 200
+    with app.app_context():
+        db.session.get(Movie, movie_id).title = "New Title"
+        db.session.commit()
+
+    # Another request is rebuilding, so this one answers from the old snapshot
+    with catalog._build_lock:
+        stale = client.get("/movies?sort=title_asc")
+    assert stale.get_json()["movies"][0]["title"] == "Old Title"
+    assert stale.headers.get("ETag") is None
+
+    fresh = client.get("/movies?sort=title_asc")
+    assert fresh.headers["X-Cache"] == "MISS"
+    assert fresh.get_json()["movies"][0]["title"] == "New Title"
+
+
+def test_folded_filters_are_echoed_normalized(client, add_movies):
+    add_movies({"title": "Dark Knight", "genre": "Action", "imdb_rating": 8.0})
+    first = client.get("/movies?genre=ACTION&search=DARK").get_json()["filters_applied"]
+    response = client.get("/movies?genre=action&search=dark")
+    assert response.headers["X-Cache"] == "HIT"
+    assert response.get_json()["filters_applied"] == first
+    assert (first["genre"], first["search"]) == ("Action", "dark")
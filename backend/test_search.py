@@ -0,0 +1,45 @@
+"""Trigram title search: typo tolerance and ranking"""
+
+from services.search import TitleIndex
+
+
+TITLES = ["The Dark Knight", "Dark Knight Rises", "Dark", "Dangal", "3 Idiots", "Knightfall"]
+
+
+def _titles(index, term):
+    rows, scores = index.search(term)
+    ranked = sorted(zip(rows.tolist(), scores.tolist()), key=lambda pair: (-pair[1], pair[0]))
+    return [TITLES[row] for row, _ in ranked]
+
+
+def test_substring_matches():
+    assert set(_titles(TitleIndex(TITLES), "knight")) == {"The Dark Knight", "Dark Knight Rises", "Knightfall"}
+
+
+def test_small_typos_still_match():
+    index = TitleIndex(TITLES)
+    assert "The Dark Knight" in _titles(index, "dark knigt")
+    assert "Dangal" in _titles(index, "dangl")
+    assert "Dangal" not in _titles(index, "dark knigt")
+
+
+def test_exact_then_prefix_then_contains():
+    assert _titles(TitleIndex(TITLES), "dark")[:3] == ["Dark", "Dark Knight Rises", "The Dark Knight"]
+
+
+def test_short_queries_match_substrings():
+    index = TitleIndex(TITLES)
+    assert _titles(index, "3") == ["3 Idiots"]
+    assert set(_titles(index, "da")) == {"The Dark Knight", "Dark Knight Rises", "Dark", "Dangal"}
+
+
+def test_terms_without_searchable_characters():
+    assert TitleIndex(TITLES).search(" ?! ") is None
+
+
+def test_relevance_is_the_default_sort_for_searches(client, add_movies):
+    add_movies(*({"title": title, "imdb_rating": 9.0 - row} for row, title in enumerate(TITLES)))
+    movies = client.get("/movies?search=Dark").get_json()["movies"]
+    assert [movie["title"] for movie in movies] == ["Dark", "Dark Knight Rises", "The Dark Knight"]
+    typo = client.get("/movies?search=knigt").get_json()["movies"]
+    assert "The Dark Knight" in [movie["title"] for movie in typo]
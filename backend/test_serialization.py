@@ -0,0 +1,55 @@
+"""Cached movie fragments never outlive the rows they were read from"""
+
+import json
+
+from extensions import catalog, fragments
+from models import Movie, db
+from services import movie_events
+
+
+def _rename(movie_id, title):
+    movie = db.session.get(Movie, movie_id)
+    movie.title = title
+    db.session.commit()
+
+
+def test_rows_read_before_an_update_are_not_cached(app, add_movies):
+    movie_id = add_movies({"title": "Old Title", "imdb_rating": 7.0})[0]
+    with app.app_context():
+        snapshot = catalog.snapshot()
+        _rename(movie_id, "New Title")
+
+        # A request still answering from the old snapshot gets the old row...
+        fragment = fragments.for_rows(snapshot.rows, snapshot.sequence)[0]
+        assert json.loads(fragment)["title"] == "Old Title"
+        # ...but it is not cached for the requests after it
+        assert fragments.peek(movie_id) is None
+
+        snapshot = catalog.snapshot()
+        fragments.for_rows(snapshot.rows, snapshot.sequence)
+        assert json.loads(fragments.peek(movie_id))["title"] == "New Title"
+
+
+def test_movies_loaded_before_an_update_are_not_cached(app, add_movies):
+    movie_id = add_movies({"title": "Old Title", "imdb_rating": 7.0})[0]
+    with app.app_context():
+        sequence = movie_events.sequence()
+        movie = db.session.get(Movie, movie_id)
+        stale = movie.to_dict()
+        _rename(movie_id, "New Title")
+
+        fragments.get(movie_id, lambda: stale, sequence)
+        assert fragments.peek(movie_id) is None
+
+
+def test_stale_snapshot_response_is_not_served_after_the_rebuild(app, client, add_movies):
+    movie_id = add_movies({"title": "Old Title", "imdb_rating": 7.0})[0]
+    assert client.get("/movies?sort=title_asc").status_code == 200
+    with app.app_context():
+        _rename(movie_id, "New Title")
+
+    # Another request is rebuilding, so this one answers from the old snapshot
+    with catalog._build_lock:
+        client.get("/movies?sort=title_asc&limit=5")
+    titles = [movie["title"] for movie in client.get("/movies?sort=rating_desc").get_json()["movies"]]
+    assert titles == ["New Title"]
@@ -0,0 +1,36 @@
+"""User profile lookups for JWT-protected routes"""
+
+from extensions import user_cache
+from models import User, db
+
+
+def _lookups():
+    stats = user_cache.stats()
+    return stats["hits"] + stats["misses"]
+
+
+def test_routes_that_only_need_the_id_skip_the_lookup(client, add_movies, login):
+    movie_id = add_movies({"imdb_rating": 7.0})[0]
+    headers = login("viewer")
+    lookups = _lookups()
+    assert client.post(f"/watchlist/{movie_id}", headers=headers).status_code in (200, 201)
+    assert client.get("/watchlist", headers=headers).status_code == 200
+    assert _lookups() == lookups
+
+
+def test_me_is_served_from_the_cache(client, login):
+    headers = login("viewer")
+    assert client.get("/auth/me", headers=headers).get_json()["username"] == "viewer"
+    hits = user_cache.stats()["hits"]
+    assert client.get("/auth/me", headers=headers).get_json()["username"] == "viewer"
+    assert user_cache.stats()["hits"] == hits + 1
+
+
+def test_me_for_a_deleted_user_is_404(app, client, login):
+    headers = login("gone")
+    with app.app_context():
+        db.session.delete(User.query.filter_by(username="gone").one())
+        db.session.commit()
+    response = client.get("/auth/me", headers=headers)
+    assert response.status_code == 404
+    assert response.get_json()["message"] == "User not found"
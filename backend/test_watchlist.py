@@ -0,0 +1,75 @@
+"""Watchlist pages and batch writes"""
+
+from sqlalchemy import event
+
+from models import Movie, db
+from routes.watchlist import DEFAULT_PAGE_SIZE
+from services.pagination import encode_cursor
+
+
+def test_watchlist_rejects_bad_cursor_values(client, login):
+    headers = login("pager")
+    response = client.get("/watchlist?cursor=" + encode_cursor("added_desc", "yesterday", 1), headers=headers)
+    assert response.status_code == 400
+
+
+def test_watchlist_is_paged_by_default(client, add_movies, login):
+    headers = login("saver")
+    movie_ids = add_movies(*({"imdb_rating": 7.0} for _ in range(DEFAULT_PAGE_SIZE + 5)))
+    client.post("/watchlist/batch", headers=headers, json={"add": movie_ids})
+
+    first = client.get("/watchlist", headers=headers).get_json()
+    rest = client.get(f"/watchlist?cursor={first['next_cursor']}", headers=headers).get_json()
+    assert len(first["watchlist"]) == DEFAULT_PAGE_SIZE
+    assert first["total_count"] == DEFAULT_PAGE_SIZE + 5
+    assert len(rest["watchlist"]) == 5
+    assert rest["next_cursor"] is None
+    assert {movie["id"] for movie in first["watchlist"] + rest["watchlist"]} == set(movie_ids)
+
+
+def _watchlist_counts(app, movie_ids):
+    with app.app_context():
+        return [db.session.get(Movie, movie_id).watchlist_count for movie_id in movie_ids]
+
+
+def test_batch_outcomes_and_counts(app, client, add_movies, login):
+    first, second, third = add_movies(*({"imdb_rating": 7.0} for _ in range(3)))
+    headers = login("saver")
+    client.post(f"/watchlist/{first}", headers=headers)
+
+    body = client.post("/watchlist/batch", headers=headers,
+                       json={"add": [first, second, 999999], "remove": [third]}).get_json()
+    assert body["results"] == {
+        "add": {str(first): "already_in_watchlist", str(second): "added", "999999": "not_found"},
+        "remove": {str(third): "not_in_watchlist"},
+    }
+    assert (body["added"], body["removed"]) == (1, 0)
+    assert _watchlist_counts(app, [first, second, third]) == [1, 1, 0]
+
+    client.post("/watchlist/batch", headers=login("other"), json={"add": [first, third]})
+    client.post("/watchlist/batch", headers=headers, json={"remove": [first, second]})
+    assert _watchlist_counts(app, [first, second, third]) == [1, 0, 1]
+
+
+def test_batch_add_is_one_insert(app, client, add_movies, login):
+    movie_ids = add_movies(*({"imdb_rating": 7.0} for _ in range(5)))
+    headers = login("saver")
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        client.post("/watchlist/batch", headers=headers, json={"add": movie_ids})
+    finally:
+        with app.app_context():
+            event.remove(db.engine, "before_cursor_execute", record)
+
+    inserts = [statement for statement in statements if statement.startswith("INSERT INTO watchlist ")]
+    count_updates = [statement for statement in statements if "watchlist_count" in statement
+                     and statement.startswith("UPDATE movies")]
+    assert len(inserts) == 1
+    assert "ON CONFLICT" in inserts[0]
+    assert len(count_updates) == 1
@@ -0,0 +1,45 @@
+"""GET /watchlist/changes delta sync"""
+
+from services import watchlist_ops
+
+
+def _changes(client, headers, since):
+    return client.get(f"/watchlist/changes?since={since}", headers=headers).get_json()
+
+
+def test_net_change_per_movie_in_version_order(client, add_movies, login):
+    first, second = add_movies({"imdb_rating": 7.0}, {"imdb_rating": 8.0})
+    headers = login("syncer")
+    client.post(f"/watchlist/{first}", headers=headers)
+    client.post(f"/watchlist/{second}", headers=headers)
+    client.delete(f"/watchlist/{first}", headers=headers)
+
+    body = _changes(client, headers, 0)
+    assert (body["version"], body["reset"]) == (3, False)
+    assert [(change["movie_id"], change["action"], change["version"]) for change in body["changes"]] == [
+        (second, "add", 2), (first, "remove", 3),
+    ]
+    assert body["changes"][0]["movie"]["id"] == second
+    assert body["changes"][0]["movie"]["in_watchlist"] is True
+
+    up_to_date = _changes(client, headers, 3)
+    assert (up_to_date["changes"], up_to_date["reset"]) == ([], False)
+
+
+def test_compacted_or_future_versions_ask_for_a_full_resync(client, add_movies, login, monkeypatch):
+    monkeypatch.setattr(watchlist_ops, "CHANGE_LOG_LIMIT", 4)
+    monkeypatch.setattr(watchlist_ops, "COMPACT_INTERVAL", 2)
+    movie_ids = add_movies(*({"imdb_rating": 7.0} for _ in range(10)))
+    headers = login("syncer")
+    for movie_id in movie_ids:
+        client.post(f"/watchlist/{movie_id}", headers=headers)
+
+    # Versions up to 6 were compacted away at version 10
+    assert _changes(client, headers, 0) == {"changes": [], "version": 10, "reset": True}
+    assert _changes(client, headers, 5)["reset"] is True
+    recent = _changes(client, headers, 6)
+    assert recent["reset"] is False
+    assert [change["movie_id"] for change in recent["changes"]] == movie_ids[6:]
+
+    assert _changes(client, headers, 11)["reset"] is True
+    assert client.get("/watchlist/changes", headers=headers).status_code == 400
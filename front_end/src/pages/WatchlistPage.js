@@ -25,8 +25,17 @@ const WatchlistPage = () => {
       setLoading(true);
       setError('');
       
-      const response = await axios.get('/watchlist');
-      setWatchlist(response.data.watchlist || []);
+      // The API returns the watchlist in pages; follow next_cursor to the end
+      const movies = [];
+      let cursor = null;
+      do {
+        const response = await axios.get('/watchlist', {
+          params: { limit: 500, ...(cursor && { cursor }) }
+        });
+        movies.push(...(response.data.watchlist || []));
+        cursor = response.data.next_cursor;
+      } while (cursor);
+      setWatchlist(movies);
     } catch (err) {
       console.error('Failed to fetch watchlist:', err);
       setError(err.response?.data?.message || 'Failed to load your watchlist');